@@ -0,0 +1,186 @@
+"""
+JWT authentication without a user query on every request.
+
+CachedJWTAuthentication keeps snapshots of the users it authenticated in a
+bounded, per-process LRU whose entries expire AUTH_USER_CACHE['TIMEOUT']
+seconds after they were loaded. Saving or deleting a User drops its entry in
+this process (apps/signals.py); other processes, and QuerySet.update() calls,
+are picked up when the entry expires. Requests with an unsafe method always
+load the current row, so a view never saves a user from a stale snapshot.
+
+With AUTH_USER_CACHE['STATELESS'] safe requests build the user from the
+USER_CLAIMS that CustomTokenObtainPairSerializer writes into the token and
+make no lookup at all. The other fields are deferred: reading one loads them
+all (User.refresh_from_db).
+Claims are as old as the token, so a changed role applies on the next login.
+Tokens without the claims fall back to the cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import router
+from django.db.models.fields.files import FieldFile
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+USER_CLAIMS = ('phone_number', 'first_name', 'last_name', 'role', 'is_active', 'is_staff', 'is_superuser')
+
+DEFAULT_AUTH_USER_CACHE = {
+    'MAX_SIZE': 10000,
+    'TIMEOUT': 60,
+    'STATELESS': False,
+}
+
+
+def get_auth_user_cache_settings():
+    return {**DEFAULT_AUTH_USER_CACHE, **getattr(settings, 'AUTH_USER_CACHE', {})}
+
+
+class UserSnapshotCache:
+    """Thread-safe LRU of user rows (tuples of concrete field values) keyed by the user id as a string."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # bumped by every invalidation; a row loaded before one is not stored
+        self.generation = 0
+
+    def get(self, user_id):
+        key = str(user_id)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, values = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return values
+
+    def put(self, user_id, values, generation):
+        config = get_auth_user_cache_settings()
+        key = str(user_id)
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[key] = (time.monotonic() + config['TIMEOUT'], values)
+            self.entries.move_to_end(key)
+            while len(self.entries) > config['MAX_SIZE']:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        with self.lock:
+            self.generation += 1
+            if user_id is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(str(user_id), None)
+
+
+user_cache = UserSnapshotCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    fresh = False
+
+    def authenticate(self, request):
+        self.fresh = request.method not in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        user = None if self.fresh else self.remembered_user(user_id, validated_token)
+        if user is None:
+            generation = user_cache.generation
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            self.remember(user_id, user, generation)
+        return self.check_user(user, validated_token)
+
+    @staticmethod
+    def get_user_id(validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    def remembered_user(self, user_id, validated_token):
+        """The user from the token claims (stateless mode) or from the cache, None when neither has it."""
+        if get_auth_user_cache_settings()['STATELESS'] and not api_settings.CHECK_REVOKE_TOKEN:
+            known = {claim: validated_token[claim] for claim in USER_CLAIMS if claim in validated_token}
+            if len(known) == len(USER_CLAIMS):
+                id_field = self.user_model._meta.get_field(api_settings.USER_ID_FIELD)
+                return self.build_user({**known, id_field.attname: id_field.to_python(user_id)})
+        values = user_cache.get(user_id)
+        if values is None:
+            return None
+        return self.user_model.from_db(router.db_for_read(self.user_model), self.attnames(), values)
+
+    def remember(self, user_id, user, generation):
+        values = []
+        for attname in self.attnames():
+            value = getattr(user, attname)
+            values.append(value.name if isinstance(value, FieldFile) else value)
+        user_cache.put(user_id, tuple(values), generation)
+
+    def build_user(self, known):
+        attnames = [attname for attname in self.attnames() if attname in known]
+        user = self.user_model.from_db(router.db_for_read(self.user_model), attnames,
+                                       [known[attname] for attname in attnames])
+        user.from_token_claims = True
+        return user
+
+    def attnames(self):
+        return [field.attname for field in self.user_model._meta.concrete_fields]
+
+    @staticmethod
+    def check_user(user, validated_token):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    target_class = 'apps.authentication.CachedJWTAuthentication'
+
+
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    """CachedJWTAuthentication whose user lookup runs on the async ORM, for the views in apps/views/async_views.py."""
+
+    async def aauthenticate(self, request):
+        self.fresh = request.method not in SAFE_METHODS
+        header = self.get_header(request)
+        if header is None:
+            return AnonymousUser()
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return AnonymousUser()
+        return await self.aget_user(self.get_validated_token(raw_token))
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        user = None if self.fresh else self.remembered_user(user_id, validated_token)
+        if user is None:
+            generation = user_cache.generation
+            try:
+                user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            self.remember(user_id, user, generation)
+        return self.check_user(user, validated_token)
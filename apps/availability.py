@@ -0,0 +1,246 @@
+"""
+Free-slot computation for specialists.
+
+A specialist works the hours of each active WorkSchedule every day, except on
+the dates a TimeOff is recorded for that schedule. Bookings (appointments in a
+blocking status with a time interval) are subtracted from those hours and the
+remaining intervals are cut into slots of the sub service's duration.
+
+All calendars of a date range are loaded with a fixed number of queries
+(`load_calendars`), then every day is computed in memory with interval
+arithmetic on minutes since local midnight. `earliest_slots` searches many
+specialists at once with NumPy bitmaps of their free minutes.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from apps.models import Appointment, ServiceBySpecialist, TimeOff, WorkSchedule
+
+MINUTES_PER_DAY = 24 * 60
+DEFAULT_SLOT_STEP = 15
+
+
+def slot_step():
+    return getattr(settings, 'AVAILABILITY_SLOT_STEP', DEFAULT_SLOT_STEP)
+
+
+def merge(intervals):
+    """Sorts and merges overlapping or touching (start, end) intervals."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        elif start < end:
+            merged.append((start, end))
+    return merged
+
+
+def subtract(intervals, busy):
+    """Removes the `busy` intervals from the merged, sorted `intervals`."""
+    result = []
+    busy = merge(busy)
+    for start, end in intervals:
+        for busy_start, busy_end in busy:
+            if busy_end <= start:
+                continue
+            if busy_start >= end:
+                break
+            if busy_start > start:
+                result.append((start, busy_start))
+            start = max(start, busy_end)
+            if start >= end:
+                break
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _local_midnight(day, tz=None):
+    return timezone.make_aware(datetime.combine(day, time()), tz)
+
+
+class Calendar:
+    """Working hours, days off and bookings of one specialist over a date range."""
+
+    def __init__(self):
+        self.schedules = []  # (schedule_id, start minute, end minute)
+        self.days_off = defaultdict(set)  # date -> {schedule_id}
+        self.bookings = defaultdict(list)  # date -> [(start minute, end minute)]
+
+    def add_booking(self, start, end, first_day, last_day, tz=None):
+        start, end = timezone.localtime(start, tz), timezone.localtime(end, tz)
+        if start.date() == end.date():
+            if first_day <= start.date() <= last_day and _minutes(start) < _minutes(end):
+                self.bookings[start.date()].append((_minutes(start), _minutes(end)))
+            return
+        day = max(start.date(), first_day)
+        while day <= min(end.date(), last_day):
+            midnight = _local_midnight(day, tz)
+            day_start = max((start - midnight).total_seconds() // 60, 0)
+            day_end = min((end - midnight).total_seconds() // 60, MINUTES_PER_DAY)
+            if day_start < day_end:
+                self.bookings[day].append((int(day_start), int(day_end)))
+            day += timedelta(days=1)
+
+    def working_hours(self, day):
+        off = self.days_off.get(day, ())
+        return merge((start, end) for schedule_id, start, end in self.schedules if schedule_id not in off)
+
+    def free_intervals(self, day):
+        return subtract(self.working_hours(day), self.bookings.get(day, ()))
+
+
+def load_calendars(specialist_ids, first_day, last_day):
+    """Loads the calendars of all `specialist_ids` for the days in [first_day, last_day] with three queries."""
+    calendars = {specialist_id: Calendar() for specialist_id in specialist_ids}
+    tz = timezone.get_current_timezone()
+
+    schedules = (WorkSchedule.objects
+                 .filter(specialist_id__in=specialist_ids, is_active=True)
+                 .values_list('specialist_id', 'id', 'start_time', 'end_time'))
+    for specialist_id, schedule_id, start, end in schedules:
+        # a schedule ending at or before its start runs until midnight
+        end_minute = _minutes(end) if end > start else MINUTES_PER_DAY
+        calendars[specialist_id].schedules.append((schedule_id, _minutes(start), end_minute))
+
+    time_offs = (TimeOff.objects
+                 .filter(specialist_id__in=specialist_ids, date__gte=first_day, date__lte=last_day)
+                 .values_list('specialist_id', 'work_schedule_id', 'date'))
+    for specialist_id, schedule_id, day in time_offs:
+        calendars[specialist_id].days_off[day].add(schedule_id)
+
+    bookings = (Appointment.objects
+                .filter(specialist_id__in=specialist_ids, status__in=Appointment.BLOCKING_STATUSES,
+                        start_time__lt=_local_midnight(last_day + timedelta(days=1), tz),
+                        end_time__gt=_local_midnight(first_day, tz))
+                .values_list('specialist_id', 'start_time', 'end_time'))
+    for specialist_id, start, end in bookings:
+        calendars[specialist_id].add_booking(start, end, first_day, last_day, tz)
+
+    return calendars
+
+
+def slots_in(intervals, duration, step, not_before=0):
+    """Start minutes, aligned to `step`, of every `duration`-long slot that fits in `intervals`."""
+    for start, end in intervals:
+        start = max(start, not_before)
+        first = -(-start // step) * step
+        yield from range(first, end - duration + 1, step)
+
+
+def free_slots(specialist_id, sub_service_id, first_day, last_day, step=None, now=None):
+    """
+    Returns the free (start, end) datetimes in which `specialist_id` can perform
+    `sub_service_id` between `first_day` and `last_day` inclusive.
+    Raises ServiceBySpecialist.DoesNotExist if the specialist does not offer it.
+    """
+    duration = (ServiceBySpecialist.objects
+                .filter(specialist_id=specialist_id, sub_service_id=sub_service_id)
+                .values_list('duration', flat=True)
+                .first())
+    if duration is None:
+        raise ServiceBySpecialist.DoesNotExist
+    step = step or slot_step()
+    now = timezone.localtime(now)
+
+    calendar = load_calendars([specialist_id], first_day, last_day)[specialist_id]
+    result = []
+    day = first_day
+    while day <= last_day:
+        if day >= now.date():
+            not_before = _minutes(now) + 1 if day == now.date() else 0
+            midnight = _local_midnight(day)
+            for start in slots_in(calendar.free_intervals(day), duration, step, not_before):
+                slot_start = midnight + timedelta(minutes=start)
+                result.append((slot_start, slot_start + timedelta(minutes=duration)))
+        day += timedelta(days=1)
+    return duration, result
+
+
+def _bitmap(rows, shape):
+    """Boolean (rows x minutes) bitmap of the (row, start, end) intervals, built with a difference array."""
+    delta = np.zeros((shape[0], shape[1] + 1), dtype=np.int16)
+    if rows:
+        row, start, end = np.array(rows, dtype=np.int64).T
+        np.add.at(delta, (row, start), 1)
+        np.add.at(delta, (row, end), -1)
+    return np.cumsum(delta[:, :-1], axis=1) > 0
+
+
+def candidate_specialists(business_id, sub_service_id):
+    """(specialist_id, duration) of the active workers of `business_id` that offer `sub_service_id`."""
+    return list(ServiceBySpecialist.objects
+                .filter(sub_service_id=sub_service_id,
+                        sub_service_id__service_id__business_id=business_id,
+                        specialist_id__business_workers__service_id__business_id=business_id,
+                        specialist_id__business_workers__is_active=True)
+                .order_by('specialist_id')
+                .values_list('specialist_id', 'duration')
+                .distinct())
+
+
+def _fitting_starts(calendars, specialist_ids, durations, day, step, not_before):
+    """(specialists x step-aligned start minutes) mask of the slots that fit in the free minutes of `day`."""
+    working, busy = [], []
+    for row, specialist_id in enumerate(specialist_ids):
+        calendar = calendars[specialist_id]
+        working.extend((row, start, end) for start, end in calendar.working_hours(day))
+        busy.extend((row, start, end) for start, end in calendar.bookings.get(day, ()))
+    shape = (len(specialist_ids), MINUTES_PER_DAY)
+    free = _bitmap(working, shape) & ~_bitmap(busy, shape)
+
+    # a slot fits at `start` when all `duration` minutes after it are free
+    running = np.zeros((shape[0], MINUTES_PER_DAY + 1), dtype=np.int32)
+    np.cumsum(free, axis=1, out=running[:, 1:])
+    starts = np.arange(0, MINUTES_PER_DAY, step)
+    ends = starts[None, :] + durations[:, None]
+    rows = np.arange(shape[0])[:, None]
+    fits = (ends <= MINUTES_PER_DAY) & (durations[:, None] > 0) & (starts[None, :] >= not_before)
+    ends = np.minimum(ends, MINUTES_PER_DAY)
+    return fits & (running[rows, ends] - running[rows, starts[None, :]] == durations[:, None])
+
+
+def earliest_slots(business_id, sub_service_id, first_day, last_day, limit, step=None, now=None):
+    """
+    Returns up to `limit` of the earliest (specialist_id, start, end) slots in
+    which any active specialist of `business_id` can perform `sub_service_id`
+    between `first_day` and `last_day` inclusive, ordered by start and
+    specialist.
+
+    Calendars are loaded for all candidates at once, in chunks of 1, 2, 4, ...
+    days until enough slots are found, so the usual search costs four queries.
+    """
+    candidates = candidate_specialists(business_id, sub_service_id)
+    if not candidates:
+        return []
+    step = step or slot_step()
+    now = timezone.localtime(now)
+    specialist_ids = [specialist_id for specialist_id, duration in candidates]
+    durations = np.array([duration for specialist_id, duration in candidates], dtype=np.int64)
+
+    result = []
+    chunk_start, chunk_days = max(first_day, now.date()), 1
+    while chunk_start <= last_day and len(result) < limit:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), last_day)
+        calendars = load_calendars(specialist_ids, chunk_start, chunk_end)
+        day = chunk_start
+        while day <= chunk_end and len(result) < limit:
+            not_before = _minutes(now) + 1 if day == now.date() else 0
+            fits = _fitting_starts(calendars, specialist_ids, durations, day, step, not_before)
+            midnight = _local_midnight(day)
+            # argwhere on the transpose orders the hits by start, then specialist
+            for start_index, row in np.argwhere(fits.T)[:limit - len(result)].tolist():
+                slot_start = midnight + timedelta(minutes=start_index * step)
+                result.append((specialist_ids[row], slot_start,
+                               slot_start + timedelta(minutes=int(durations[row]))))
+            day += timedelta(days=1)
+        chunk_start, chunk_days = chunk_end + timedelta(days=1), chunk_days * 2
+    return result
@@ -0,0 +1,136 @@
+"""
+Avatar uploads and their thumbnails.
+
+Uploads are accepted by their first bytes, not their name: `sniff` recognises
+JPEG, PNG and WebP, and the serializers store the file under the extension of
+the format it really is.
+
+Saving a user whose avatar has no thumbnails yet enqueues an
+AVATAR_THUMBNAILS job (apps/signals.py), so the request never decodes more
+than the image header. The job workers render one square thumbnail per
+AVATARS['SIZES'] entry in AVATARS['FORMAT'] and record their names in
+`User.avatar_thumbnails`, next to the avatar they were made from. Until then,
+and for images that can't be decoded, `thumbnail_url` answers with the
+original.
+
+The handler renders outside any transaction, so SQLite's write lock is only
+held by the UPDATE that records the thumbnails. That UPDATE only applies while
+the user still has the avatar and no thumbnails of it; otherwise the files it
+rendered are deleted again.
+"""
+import logging
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from apps.authentication import user_cache
+from apps.jobs import handler
+from apps.models import User
+
+logger = logging.getLogger(__name__)
+
+AVATAR_THUMBNAILS = 'avatar_thumbnails'
+
+# format -> ((offset, magic bytes), ...), extension
+SIGNATURES = {
+    'JPEG': (((0, b'\xff\xd8\xff'),), 'jpg'),
+    'PNG': (((0, b'\x89PNG\r\n\x1a\n'),), 'png'),
+    'WEBP': (((0, b'RIFF'), (8, b'WEBP')), 'webp'),
+}
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+
+DEFAULT_AVATARS = {
+    'SIZES': {'small': 96, 'medium': 320},
+    'FORMAT': 'WEBP',
+    'QUALITY': 80,
+    'MAX_PIXELS': 40_000_000,
+}
+
+
+def get_avatar_settings():
+    return {**DEFAULT_AVATARS, **getattr(settings, 'AVATARS', {})}
+
+
+def sniff(file):
+    """The format of the image in `file` by its magic bytes, None when it isn't one we accept."""
+    position = file.tell()
+    head = file.read(16)
+    file.seek(position)
+    for image_format, (parts, _) in SIGNATURES.items():
+        if all(head[offset:offset + len(magic)] == magic for offset, magic in parts):
+            return image_format
+    return None
+
+
+def canonical_name(name, image_format):
+    return f"{posixpath.splitext(name)[0]}.{SIGNATURES[image_format][1]}"
+
+
+def needs_thumbnails(user):
+    return bool(user.avatar) and user.avatar_thumbnails.get('source') != user.avatar.name
+
+
+def thumbnail_url(user, variant):
+    if not user.avatar:
+        return None
+    thumbnails = user.avatar_thumbnails or {}
+    if thumbnails.get('source') == user.avatar.name and variant in thumbnails:
+        return default_storage.url(thumbnails[variant])
+    return user.avatar.url
+
+
+def render(name, config):
+    """Writes the thumbnails of the image stored as `name`; returns {variant: stored name}."""
+    image_format = config['FORMAT']
+    largest = max(config['SIZES'].values())
+    thumbnails = {}
+    with default_storage.open(name) as file, Image.open(file) as image:
+        if image.width * image.height > config['MAX_PIXELS']:
+            raise ValueError(f"{image.width}x{image.height} is too large")
+        # JPEGs decode at the smallest 1/2, 1/4 or 1/8 scale that is still large enough
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        keep_alpha = image_format == 'WEBP' and image.has_transparency_data
+        image = image.convert('RGBA' if keep_alpha else 'RGB')
+        for variant, size in config['SIZES'].items():
+            thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            thumbnail.save(buffer, image_format, quality=config['QUALITY'])
+            thumbnails[variant] = default_storage.save(
+                f"{posixpath.splitext(name)[0]}_{variant}.{EXTENSIONS[image_format]}", ContentFile(buffer.getvalue()))
+    return thumbnails
+
+
+def delete_files(names):
+    for name in names:
+        default_storage.delete(name)
+
+
+@handler(AVATAR_THUMBNAILS, atomic=False)
+def make_avatar_thumbnails(payloads):
+    config = get_avatar_settings()
+    requested = {payload['user']: payload['avatar'] for payload in payloads}
+    users = User.objects.filter(pk__in=requested).values_list('pk', 'avatar', 'avatar_thumbnails')
+    for user_id, avatar, previous in users:
+        # a newer avatar has its own job; thumbnails of this one were made already
+        if avatar != requested[user_id] or previous.get('source') == avatar:
+            continue
+        try:
+            thumbnails = render(avatar, config)
+        except (OSError, ValueError, Image.DecompressionBombError) as error:
+            logger.warning("No thumbnails for %s: %s", avatar, error)
+            thumbnails = {}
+        recorded = (User.objects.filter(pk=user_id, avatar=avatar, avatar_thumbnails=previous)
+                    .update(avatar_thumbnails={'source': avatar, **thumbnails}))
+        if not recorded:
+            # the avatar changed, or another worker recorded its thumbnails, while these were rendered
+            delete_files(thumbnails.values())
+            continue
+        stale = [name for variant, name in previous.items() if variant != 'source']
+        transaction.on_commit(lambda stale=stale: delete_files(stale))
+        transaction.on_commit(lambda user_id=user_id: user_cache.invalidate(user_id))
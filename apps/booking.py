@@ -0,0 +1,142 @@
+"""
+Overlap-safe appointment writes.
+
+A specialist can hold a single blocking appointment (Appointment.BLOCKING_STATUSES)
+at any moment. On PostgreSQL the `appointment_no_overlap` exclusion constraint
+of migration 0010 enforces it. Other databases take a lock and check for
+overlaps again under it before saving, so on every backend exactly the
+intervals that overlap are rejected, wherever they start:
+
+- SQLite has a single, database-wide write lock, so there is nothing finer to
+  take; per-slot or per-specialist locking would be moot. A booking writes
+  the specialist's BookingLock row to take it up front, waiting at most
+  BOOKING['LOCK_TIMEOUT_MS'] (PRAGMA busy_timeout) instead of the
+  connection's timeout.
+- Databases with row locks lock the specialist's BookingLock row with
+  SELECT ... FOR UPDATE NOWAIT, so only bookings of the same specialist
+  contend, and they fail at once instead of queueing.
+
+Visible overlaps are rejected before anything is written, and the constraint
+or the check under the lock catch the concurrent ones, raising SlotTaken. A
+booking that would have to wait for a concurrent, uncommitted booking of the
+same specialist (on PostgreSQL, of the same interval) longer than
+BOOKING['LOCK_TIMEOUT_MS'] gives up and is reported as a conflict as well.
+"""
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections, router, transaction, IntegrityError, OperationalError
+from django.db.models import F
+
+from apps.models import Appointment, BookingLock
+
+EXCLUSION_VIOLATION = '23P01'
+LOCK_NOT_AVAILABLE = '55P03'
+
+DEFAULT_BOOKING = {
+    'LOCK_TIMEOUT_MS': 200,
+}
+
+
+def get_booking_settings():
+    return {**DEFAULT_BOOKING, **getattr(settings, 'BOOKING', {})}
+
+
+class SlotTaken(Exception):
+    """The specialist already has a blocking appointment overlapping the interval."""
+
+
+def is_blocking(appointment):
+    return (appointment.status in Appointment.BLOCKING_STATUSES
+            and appointment.start_time is not None and appointment.end_time is not None)
+
+
+def _overlapping(using, specialist_id, start, end, exclude_pk=None):
+    return (Appointment.objects.using(using)
+            .filter(specialist_id=specialist_id, status__in=Appointment.BLOCKING_STATUSES,
+                    start_time__lt=end, end_time__gt=start)
+            .exclude(pk=exclude_pk)
+            .exists())
+
+
+def _pending(serializer):
+    """The appointment as it will be saved; None unless it blocks its specialist's calendar."""
+    appointment = Appointment(**{**{field: getattr(serializer.instance, field, None)
+                                    for field in ('specialist_id', 'status', 'start_time', 'end_time')},
+                                 **serializer.validated_data})
+    if appointment.status is None:
+        appointment.status = Appointment.Status.PENDING
+    return appointment if is_blocking(appointment) else None
+
+
+def _check_free(appointment, serializer, using):
+    """Raises SlotTaken when the interval of a blocking `appointment` overlaps another one."""
+    if appointment is not None and _overlapping(using, appointment.specialist_id_id, appointment.start_time,
+                                                appointment.end_time, getattr(serializer.instance, 'pk', None)):
+        raise SlotTaken
+
+
+@contextmanager
+def _busy_timeout(connection, milliseconds):
+    """Makes SQLite wait at most `milliseconds` for the write lock, instead of the connection's timeout."""
+    default = int(connection.settings_dict['OPTIONS'].get('timeout', 5) * 1000)
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA busy_timeout = {int(milliseconds)}")
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA busy_timeout = {default}")
+
+
+def _lock(specialist_id, using):
+    """
+    Holds off the specialist's other bookings until this transaction ends;
+    raises SlotTaken when one of them holds the lock already.
+    """
+    connection = connections[using]
+    locks = BookingLock.objects.using(using)
+    try:
+        if connection.vendor == 'sqlite':
+            with _busy_timeout(connection, get_booking_settings()['LOCK_TIMEOUT_MS']):
+                locks.bulk_create([BookingLock(specialist_id_id=specialist_id)], ignore_conflicts=True)
+                locks.filter(pk=specialist_id).update(writes=F('writes') + 1)
+            return
+        # a plain read, since inserting over a locked row would wait for it
+        if not locks.filter(pk=specialist_id).exists():
+            locks.bulk_create([BookingLock(specialist_id_id=specialist_id)], ignore_conflicts=True)
+        list(locks.select_for_update(nowait=True).filter(pk=specialist_id))
+        locks.filter(pk=specialist_id).update(writes=F('writes') + 1)
+    except OperationalError as error:
+        raise SlotTaken from error
+
+
+def _pgcode(error):
+    return getattr(error.__cause__, 'pgcode', None)
+
+
+def save(serializer, **kwargs):
+    """Saves an AppointmentModelSerializer, raising SlotTaken instead of double booking."""
+    using = router.db_for_write(Appointment)
+    postgres = connections[using].vendor == 'postgresql'
+    pending = _pending(serializer)
+    # fails fast, before anything is written, when the interval is visibly taken
+    _check_free(pending, serializer, using)
+    try:
+        with transaction.atomic(using=using):
+            if postgres:
+                with connections[using].cursor() as cursor:
+                    cursor.execute("SET LOCAL lock_timeout = %s", [f"{get_booking_settings()['LOCK_TIMEOUT_MS']}ms"])
+                return serializer.save(**kwargs)
+            if pending is not None:
+                _lock(pending.specialist_id_id, using)
+                _check_free(pending, serializer, using)
+            return serializer.save(**kwargs)
+    except IntegrityError as error:
+        if postgres and _pgcode(error) == EXCLUSION_VIOLATION:
+            raise SlotTaken from error
+        raise
+    except OperationalError as error:
+        if postgres and _pgcode(error) == LOCK_NOT_AVAILABLE:
+            raise SlotTaken from error
+        raise
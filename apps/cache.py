@@ -0,0 +1,136 @@
+"""
+Versioned result cache with stale-while-revalidate for the statistics views.
+
+Entries are keyed by view, query parameters and a data version that is bumped
+whenever the appointment rollups change. The version is the time of the last
+bump in nanoseconds, written with set() and no timeout, so it never expires;
+incr() would reset the timeout on the backends that implement it as get() and
+set(). A bump never goes below the stored version plus one, so a worker whose
+clock is behind still moves it forward. Two bumps racing between their get()
+and set() can still write an older value, which assumes the workers' clocks
+agree to well within the cache TIMEOUT. When an entry is stale (expired, or
+written for an older data version) one worker takes a short lock and
+recomputes it while the others keep answering with the last known result.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+VERSION_KEY = 'statistics:version'
+
+DEFAULT_STATISTICS_CACHE = {
+    'TIMEOUT': 60,
+    'STALE_TIMEOUT': 600,
+    'LOCK_TIMEOUT': 30,
+}
+
+
+def get_statistics_cache_settings():
+    return {**DEFAULT_STATISTICS_CACHE, **getattr(settings, 'STATISTICS_CACHE', {})}
+
+
+def data_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(VERSION_KEY, version, timeout=None)
+        version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def bump_data_version():
+    cache.set(VERSION_KEY, max(time.time_ns(), cache.get(VERSION_KEY, 0) + 1), timeout=None)
+
+
+def _params_digest(params):
+    encoded = '&'.join(f"{key}={value}" for key, value in sorted(params.lists()))
+    return hashlib.md5(encoded.encode()).hexdigest()
+
+
+def get_or_compute(name, params, compute):
+    """
+    Returns the cached result of `compute()` for `name` and `params`, refreshing
+    it when needed. A `None` result is returned as is and not cached.
+    """
+    config = get_statistics_cache_settings()
+    base_key = f"statistics:{name}:{_params_digest(params)}"
+    key = f"{base_key}:v{data_version()}"
+    now = time.time()
+
+    entry = cache.get(key)
+    if entry is not None and entry['fresh_until'] > now:
+        return entry['data']
+
+    stale = entry or cache.get(f"{base_key}:latest")
+    lock_key = f"{key}:lock"
+    if stale is not None and not cache.add(lock_key, 1, timeout=config['LOCK_TIMEOUT']):
+        return stale['data']
+
+    try:
+        data = compute()
+        if data is not None:
+            entry = {'data': data, 'fresh_until': now + config['TIMEOUT']}
+            timeout = config['TIMEOUT'] + config['STALE_TIMEOUT']
+            cache.set_many({key: entry, f"{base_key}:latest": entry}, timeout=timeout)
+    finally:
+        cache.delete(lock_key)
+    return data
+
+
+async def adata_version():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        await cache.aadd(VERSION_KEY, version, timeout=None)
+        version = await cache.aget(VERSION_KEY, version)
+    return version
+
+
+async def aget_or_compute(name, params, compute):
+    """Async `get_or_compute`, sharing its entries, for an awaitable `compute()`."""
+    config = get_statistics_cache_settings()
+    base_key = f"statistics:{name}:{_params_digest(params)}"
+    key = f"{base_key}:v{await adata_version()}"
+    now = time.time()
+
+    entry = await cache.aget(key)
+    if entry is not None and entry['fresh_until'] > now:
+        return entry['data']
+
+    stale = entry or await cache.aget(f"{base_key}:latest")
+    lock_key = f"{key}:lock"
+    if stale is not None and not await cache.aadd(lock_key, 1, timeout=config['LOCK_TIMEOUT']):
+        return stale['data']
+
+    try:
+        data = await compute()
+        if data is not None:
+            entry = {'data': data, 'fresh_until': now + config['TIMEOUT']}
+            timeout = config['TIMEOUT'] + config['STALE_TIMEOUT']
+            await cache.aset_many({key: entry, f"{base_key}:latest": entry}, timeout=timeout)
+    finally:
+        await cache.adelete(lock_key)
+    return data
+
+
+def versioned_cache(get):
+    """Caches the data of successful responses of an APIView `get` method."""
+
+    @wraps(get)
+    def wrapper(view, request, *args, **kwargs):
+        computed = {}
+
+        def compute():
+            computed['response'] = get(view, request, *args, **kwargs)
+            if computed['response'].status_code != 200:
+                return None
+            return computed['response'].data
+
+        data = get_or_compute(type(view).__name__, request.query_params, compute)
+        return computed.get('response') or Response(data)
+
+    return wrapper
@@ -0,0 +1,133 @@
+"""
+Sparse fieldsets: ?fields=, ?exclude= and ?expand= on the model endpoints.
+
+- `fields=id,name` keeps only the named fields;
+- `exclude=description` drops the named fields;
+- `expand=services,services.appointments` picks the nested relations (the
+  serializer's `Meta.expandable`) to include, dotted names reaching into the
+  nested serializers. Without `expand` every relation is included, unless
+  `fields` is given: then only those it names, or `expand` adds, are.
+
+Without any of them a response is exactly what it was before. With them,
+SparseFieldsViewMixin rebuilds the view's queryset for the fields that are
+left: `.only()` their columns and the prefetches and joins of the relations
+they read, through the serializer's `setup_eager_loading(queryset, fieldset)`.
+The parameters apply to GET, HEAD and OPTIONS requests only.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDSET_PARAMETERS = [
+    OpenApiParameter('fields', OpenApiTypes.STR, description='comma-separated fields to return'),
+    OpenApiParameter('exclude', OpenApiTypes.STR, description='comma-separated fields to leave out'),
+    OpenApiParameter('expand', OpenApiTypes.STR,
+                     description='comma-separated nested relations to include, e.g. services.appointments'),
+]
+
+fieldset_schema = extend_schema_view(list=extend_schema(parameters=FIELDSET_PARAMETERS),
+                                     retrieve=extend_schema(parameters=FIELDSET_PARAMETERS))
+
+
+def _names(value):
+    return None if value is None else {name.strip() for name in value.split(',') if name.strip()}
+
+
+class Fieldset:
+    def __init__(self, fields=None, exclude=(), expand=None):
+        self.fields = fields
+        self.exclude = set(exclude)
+        self.expand = expand
+
+    @classmethod
+    def from_request(cls, request):
+        """The request's fieldset, None when it asks for none."""
+        params = request.GET
+        if request.method not in SAFE_METHODS or not {'fields', 'exclude', 'expand'} & params.keys():
+            return None
+        return cls(_names(params.get('fields')), _names(params.get('exclude')) or (), _names(params.get('expand')))
+
+    @property
+    def narrows(self):
+        return self.fields is not None or bool(self.exclude)
+
+    def includes(self, name):
+        return (self.fields is None or name in self.fields) and name not in self.exclude
+
+    def expands(self, name):
+        if name in self.exclude:
+            return False
+        if self.fields is not None and name in self.fields:
+            return True
+        if self.expand is None:
+            return self.fields is None
+        return any(path.split('.', 1)[0] == name for path in self.expand)
+
+    def nested(self, name):
+        """The fieldset of the nested relation `name`: everything, or what `expand` names under it."""
+        if self.expand is None:
+            return Fieldset()
+        return Fieldset(expand={path.split('.', 1)[1] for path in self.expand if path.startswith(f'{name}.')})
+
+
+class SparseFieldsMixin:
+    """
+    ModelSerializer mixin serializing the fields of its `fieldset` argument,
+    or else of the request's. `Meta.expandable` lists the nested relations,
+    `Meta.field_sources` the model fields read by fields whose source is the
+    whole object (like SerializerMethodFields), and `Meta.always_load` the
+    model fields `.only()` must never leave out.
+    """
+
+    def __init__(self, *args, fieldset=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if fieldset is None and request is not None:
+            fieldset = Fieldset.from_request(request)
+        self.fieldset = fieldset or Fieldset()
+        if not (self.fieldset.narrows or self.fieldset.expand is not None):
+            return
+        expandable = getattr(self.Meta, 'expandable', ())
+        for name in list(self.fields):
+            if not (self.fieldset.expands(name) if name in expandable else self.fieldset.includes(name)):
+                self.fields.pop(name)
+
+    @classmethod
+    def only_fields(cls, fieldset):
+        """The model fields `.only()` has to load for the fields `fieldset` keeps."""
+        meta = cls.Meta.model._meta
+        names = {meta.pk.name, *getattr(cls.Meta, 'always_load', ())}
+        field_sources = getattr(cls.Meta, 'field_sources', {})
+        for name, field in cls(fieldset=fieldset).fields.items():
+            paths = field_sources.get(name, ['__'.join(field.source_attrs[:2])] if field.source_attrs else [])
+            for path in paths:
+                try:
+                    model_field = meta.get_field(path.split('__', 1)[0])
+                except FieldDoesNotExist:
+                    continue
+                if model_field.concrete:
+                    names.add(model_field.name)
+                    if '__' in path and model_field.is_relation:
+                        names.add(path)
+        return names
+
+    @classmethod
+    def sparse(cls, queryset, fieldset):
+        return queryset.only(*cls.only_fields(fieldset)) if fieldset is not None and fieldset.narrows else queryset
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fieldset=None):
+        return cls.sparse(queryset, fieldset)
+
+
+class SparseFieldsViewMixin:
+    """Loads what the serializer's fieldset needs when the request has one; the view's queryset otherwise."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fieldset = Fieldset.from_request(self.request)
+        if fieldset is None:
+            return queryset
+        return self.get_serializer_class().setup_eager_loading(
+            queryset.select_related(None).prefetch_related(None), fieldset)
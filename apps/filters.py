@@ -0,0 +1,32 @@
+from django.utils import timezone
+from django_filters import BooleanFilter, IsoDateTimeFilter
+from django_filters.rest_framework import FilterSet
+
+from apps.models import Business, OpeningInterval
+from apps.opening_hours import minute_of_week
+
+
+def open_business_ids(moment):
+    """Ids of the businesses open at `moment`, an index range lookup on the compiled opening hours."""
+    minute = minute_of_week(moment)
+    return (OpeningInterval.objects
+            .filter(start_minute__lte=minute, end_minute__gt=minute)
+            .values('business_id'))
+
+
+class BusinessFilter(FilterSet):
+    open_at = IsoDateTimeFilter(method='filter_open_at',
+                                help_text='Only businesses open at this moment (ISO 8601, local time if naive)')
+    open_now = BooleanFilter(method='filter_open_now', help_text='Only businesses open (true) or closed (false) now')
+
+    class Meta:
+        model = Business
+        fields = ('type', 'is_active')
+
+    def filter_open_at(self, queryset, name, value):
+        return queryset.filter(pk__in=open_business_ids(value))
+
+    def filter_open_now(self, queryset, name, value):
+        if value:
+            return queryset.filter(pk__in=open_business_ids(timezone.now()))
+        return queryset.exclude(pk__in=open_business_ids(timezone.now()))
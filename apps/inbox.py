@@ -0,0 +1,109 @@
+"""
+The notification inbox.
+
+Every user's number of unread notifications is kept in their
+NotificationCounter row, so the badge is a single primary-key read instead of
+a count over their whole history. The counters move with F() expressions in
+the transaction that changes the notifications:
+
+- `create` inserts notifications with bulk_create and adds them to their
+  users' counters, with one UPDATE per distinct number added;
+- `mark_read` marks notifications read with one UPDATE and subtracts the
+  number of rows it changed, which only counts rows that were still unread,
+  so concurrent requests never subtract the same notification twice;
+- `compact` deletes read notifications older than INBOX['RETENTION_DAYS'] in
+  chunks of INBOX['BATCH_SIZE'], which leaves the counters alone.
+
+Writes that go around this module, like bulk loads, are followed by
+`recount`, which rebuilds the counters from the Notification table.
+"""
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from apps.models import Notification, NotificationCounter
+
+DEFAULT_INBOX = {
+    'RETENTION_DAYS': 90,
+    'BATCH_SIZE': 1000,
+}
+
+
+def get_inbox_settings():
+    return {**DEFAULT_INBOX, **getattr(settings, 'INBOX', {})}
+
+
+def unread_count(user_id):
+    return NotificationCounter.objects.filter(pk=user_id).values_list('unread', flat=True).first() or 0
+
+
+def add_unread(counts):
+    """Adds {user id: number} to the users' counters."""
+    counts = {user_id: delta for user_id, delta in counts.items() if delta}
+    if not counts:
+        return
+    # the rows exist before they are updated, so no increment is lost to a concurrent insert
+    NotificationCounter.objects.bulk_create((NotificationCounter(user_id_id=user_id) for user_id in counts),
+                                            ignore_conflicts=True)
+    by_delta = {}
+    for user_id, delta in counts.items():
+        by_delta.setdefault(delta, []).append(user_id)
+    for delta, user_ids in by_delta.items():
+        NotificationCounter.objects.filter(pk__in=user_ids).update(unread=F('unread') + delta)
+
+
+def create(notifications, batch_size=500):
+    notifications = list(notifications)
+    with transaction.atomic():
+        Notification.objects.bulk_create(notifications, batch_size=batch_size)
+        add_unread(Counter(notification.user_id_id for notification in notifications if not notification.is_read))
+    return notifications
+
+
+def mark_read(user_id, ids=None):
+    """Marks the user's notifications with `ids`, or all of them, read; returns how many were unread."""
+    unread = Notification.objects.filter(user_id=user_id, is_read=False)
+    if ids is not None:
+        unread = unread.filter(id__in=ids)
+    with transaction.atomic():
+        updated = unread.update(is_read=True)
+        if updated:
+            NotificationCounter.objects.filter(pk=user_id).update(unread=F('unread') - updated)
+    return updated
+
+
+def compact(retention_days=None, batch_size=None, pause=0.0):
+    """
+    Deletes notifications read and older than `retention_days`, `batch_size`
+    per transaction, oldest first. Returns the number deleted.
+    """
+    config = get_inbox_settings()
+    cutoff = timezone.now() - timedelta(days=config['RETENTION_DAYS'] if retention_days is None else retention_days)
+    batch_size = batch_size or config['BATCH_SIZE']
+    old = Notification.objects.filter(is_read=True, created_at__lt=cutoff).order_by('created_at', 'id')
+    deleted = 0
+    while True:
+        ids = list(old.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            deleted += Notification.objects.filter(id__in=ids).delete()[0]
+        if pause:
+            time.sleep(pause)
+
+
+def recount(batch_size=5000):
+    """Recomputes every counter from the Notification table."""
+    unread = Notification.objects.filter(is_read=False).order_by().values('user_id').annotate(unread=Count('id'))
+    with transaction.atomic():
+        NotificationCounter.objects.all().delete()
+        NotificationCounter.objects.bulk_create(
+            (NotificationCounter(user_id_id=row['user_id'], unread=row['unread'])
+             for row in unread.iterator(chunk_size=batch_size)),
+            batch_size=batch_size,
+        )
@@ -0,0 +1,138 @@
+"""
+A database-backed job queue.
+
+`enqueue` inserts one Job row in the caller's transaction, so a job exists
+exactly when the change that asked for it was committed. `manage.py run_jobs`
+starts workers that claim due jobs in batches and call each job's handler once
+with the payloads of all its jobs in the batch, so handlers can write with
+bulk_create. A handler's writes and the deletion of its jobs commit together,
+unless it is registered with atomic=False: slow handlers, like image
+rendering, run outside the transaction and must be safe to run twice.
+
+Claiming moves `run_at` JOBS['LEASE'] seconds ahead and stamps the jobs with
+the worker's claim token; the jobs of a worker that died become due again when
+the lease runs out. On PostgreSQL workers select due rows FOR UPDATE SKIP
+LOCKED and never wait for each other. Other databases claim with an UPDATE
+that only takes jobs which are still due, which SQLite serializes with its
+database write lock; a handler's transaction takes that lock before it runs,
+so it is held for as long as the handler takes.
+
+When a handler raises, its jobs run again after RETRY_DELAY * attempts
+seconds; after MAX_ATTEMPTS they are kept with failed=True and the error.
+"""
+import logging
+import time
+import uuid
+from datetime import timedelta
+from itertools import groupby
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOBS = {
+    'BATCH_SIZE': 100,
+    'POLL_INTERVAL': 1.0,
+    'LEASE': 300,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY': 30,
+}
+
+HANDLERS = {}
+# handlers that run outside the transaction deleting their jobs
+NON_ATOMIC = set()
+
+
+def get_jobs_settings():
+    return {**DEFAULT_JOBS, **getattr(settings, 'JOBS', {})}
+
+
+def handler(name, atomic=True):
+    """Registers the decorated function as the handler of `name` jobs; it is called with a list of payloads."""
+    def register(function):
+        HANDLERS[name] = function
+        if not atomic:
+            NON_ATOMIC.add(name)
+        return function
+    return register
+
+
+def enqueue(name, payload, run_at=None):
+    return Job.objects.create(name=name, payload=payload, run_at=run_at or timezone.now())
+
+
+def claim(batch_size=None):
+    """Leases up to `batch_size` due jobs to the caller and returns them, oldest first."""
+    config = get_jobs_settings()
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    due = Job.objects.filter(failed=False, run_at__lte=now).order_by('run_at', 'id')
+    lease = {'run_at': now + timedelta(seconds=config['LEASE']), 'claimed_by': token,
+             'attempts': F('attempts') + 1}
+    using = router.db_for_write(Job)
+    if connections[using].vendor == 'postgresql':
+        with transaction.atomic(using=using):
+            ids = list(due.select_for_update(skip_locked=True)
+                       .values_list('id', flat=True)[:batch_size or config['BATCH_SIZE']])
+            Job.objects.filter(id__in=ids).update(**lease)
+    else:
+        ids = list(due.values_list('id', flat=True)[:batch_size or config['BATCH_SIZE']])
+        # jobs another worker claimed in the meantime are no longer due
+        Job.objects.filter(id__in=ids, failed=False, run_at__lte=now).update(**lease)
+    return list(Job.objects.filter(id__in=ids, claimed_by=token).order_by('run_at', 'id'))
+
+
+def run(jobs):
+    """Runs claimed jobs, one handler call per job name; returns the number of jobs that succeeded."""
+    succeeded = 0
+    for name, group in groupby(sorted(jobs, key=attrgetter('name')), key=attrgetter('name')):
+        group = list(group)
+        done = Job.objects.filter(id__in=[job.id for job in group])
+        try:
+            if name in NON_ATOMIC:
+                HANDLERS[name]([job.payload for job in group])
+                done.delete()
+            else:
+                with transaction.atomic():
+                    # writing first takes SQLite's write lock up front, where it waits for other writers;
+                    # upgrading a read transaction to a write one fails at once with "database is locked"
+                    done.delete()
+                    HANDLERS[name]([job.payload for job in group])
+        except Exception as error:
+            logger.exception("%s jobs failed", name)
+            retry(group, error)
+        else:
+            succeeded += len(group)
+    return succeeded
+
+
+def retry(jobs, error):
+    config = get_jobs_settings()
+    now = timezone.now()
+    for job in jobs:
+        job.claimed_by = None
+        job.last_error = repr(error)
+        if job.attempts >= config['MAX_ATTEMPTS']:
+            job.failed = True
+        else:
+            job.run_at = now + timedelta(seconds=config['RETRY_DELAY'] * job.attempts)
+    Job.objects.bulk_update(jobs, ['claimed_by', 'last_error', 'failed', 'run_at'])
+
+
+def work(once=False, should_stop=lambda: False):
+    """Claims and runs batches until `should_stop()`, or until no job is due when `once`."""
+    config = get_jobs_settings()
+    while not should_stop():
+        jobs = claim()
+        if jobs:
+            run(jobs)
+        elif once:
+            return
+        else:
+            time.sleep(config['POLL_INTERVAL'])
@@ -0,0 +1,222 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps import inbox
+from apps.middleware import QueryCounter
+from apps.models import User, Business, Service, Appointment, BusinessWorker, ServiceBySpecialist, Notification
+from utils.benchmark import summarize, stopwatch, peak_memory, environment, write_report, load_report, compare
+from utils.otp_service import get_otp_settings, get_otp_store
+
+BENCHMARK_PASSWORD = 'bench1234'
+
+
+class Endpoint:
+    """
+    One request to benchmark. `prepare`, when given, runs untimed before every
+    request and its result is passed to `request`. Responses other than
+    `expected_status` are counted as unexpected.
+    """
+
+    def __init__(self, request, expected_status=200, prepare=None):
+        self.request = request
+        self.expected_status = expected_status
+        self.prepare = prepare
+
+    def __call__(self):
+        return self.request(*(() if self.prepare is None else (self.prepare(),)))
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks every endpoint in apps/urls.py through the Django test client against the configured '
+            'database and writes p50/p95/p99 latency, query counts and peak memory as JSON. Rate limits and '
+            'the OTP resend interval are off while it runs, and it fails when an endpoint answers with a '
+            'status other than the expected one.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--only', nargs='*', default=None, help='benchmark only these endpoint names')
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--compare', default=None, help='previous JSON report to compare p95 latency with')
+
+    def handle(self, *args, **options):
+        if not Business.objects.exists() or not Appointment.objects.exists():
+            raise CommandError('The database is empty, run "manage.py seed_data" first.')
+
+        self.user = self.benchmark_user()
+        self.client = self.client_for(self.user)
+
+        # every iteration would otherwise be rejected with 429 after the first few, or told to wait for a new code
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}},
+                               OTP={**get_otp_settings(), 'RESEND_INTERVAL': 0}):
+            endpoints = self.endpoints()
+            if options['only']:
+                endpoints = {name: endpoint for name, endpoint in endpoints.items() if name in options['only']}
+
+            results = {}
+            for name, endpoint in endpoints.items():
+                results[name] = self.measure(endpoint, options['iterations'], options['warmup'])
+                line = (f"{name:<40} p50 {results[name]['p50_ms']:>9} ms  "
+                        f"p95 {results[name]['p95_ms']:>9} ms  "
+                        f"p99 {results[name]['p99_ms']:>9} ms  "
+                        f"queries {results[name]['queries']:>4}  "
+                        f"peak {results[name]['peak_kb']:>9} KiB")
+                if results[name]['unexpected']:
+                    line = self.style.ERROR(f"{line}  {results[name]['unexpected']} responses with status "
+                                            f"{results[name]['status']}, expected {endpoint.expected_status}")
+                self.stdout.write(line)
+
+        report = {
+            'environment': {**environment(), 'database': connection.vendor},
+            'dataset': {model.__name__: model.objects.count()
+                        for model in (User, Business, Service, BusinessWorker, Appointment)},
+            'iterations': options['iterations'],
+            'results': results,
+        }
+        write_report(options['output'], report)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['compare']:
+            for name, before, after, change in compare(load_report(options['compare']), report):
+                self.stdout.write(f"{name:<40} p95 {before:>9} -> {after:>9} ms ({change:+}%)")
+
+        failed = sorted(name for name, result in results.items() if result['unexpected'])
+        if failed:
+            raise CommandError(f"Unexpected response statuses, their timings are not comparable: {', '.join(failed)}")
+
+    def benchmark_user(self):
+        user, created = User.objects.get_or_create(
+            phone_number='+998000000000',
+            defaults={'role': User.RoleType.ADMIN, 'first_name': 'Benchmark', 'last_name': 'Admin'},
+        )
+        if created:
+            user.set_password(BENCHMARK_PASSWORD)
+            user.save()
+        return user
+
+    @staticmethod
+    def client_for(user):
+        return Client(raise_request_exception=False,
+                      HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+
+    def endpoints(self):
+        """Maps endpoint names to the Endpoints performing one request with the test client."""
+        business = Business.objects.order_by('id').first()
+        service = Service.objects.order_by('id').first()
+        appointment = Appointment.objects.order_by('id').first()
+        worker = BusinessWorker.objects.order_by('id').first()
+        offer = ServiceBySpecialist.objects.order_by('id').first()
+        end = timezone.localdate()
+        start = end - timedelta(days=30)
+        # the inbox polled is the largest one
+        reader = (User.objects.annotate(notification_count=Count('notifications'))
+                  .order_by('-notification_count', 'id').first())
+        reader_client = self.client_for(reader)
+
+        def get(url, client=None):
+            return Endpoint(lambda: (client or self.client).get(url))
+
+        def post(url, data):
+            return Endpoint(lambda: self.client.post(url, data))
+
+        def new_unread():
+            created = inbox.create(Notification(user_id=reader, type=Notification.Status.BOOKING,
+                                                message='Benchmark') for _ in range(10))
+            return [notification.id for notification in created]
+
+        def new_refresh_token():
+            return str(RefreshToken.for_user(self.user))
+
+        def new_code():
+            return get_otp_store().issue(self.user.pk, self.user.phone_number)[0]
+
+        availability = (f'specialist={offer.specialist_id_id}&sub_service={offer.sub_service_id_id}&start={end}'
+                        f'&end={end + timedelta(days=6)}')
+        earliest_availability = f'business={business.pk}&sub_service={offer.sub_service_id_id}'
+
+        return {
+            'users-list': get('/api/v1/admin/users/'),
+            'users-detail': get(f'/api/v1/admin/users/{self.user.pk}/'),
+            'business-list': get('/api/v1/admin/business/'),
+            'business-detail': get(f'/api/v1/admin/business/{business.pk}/'),
+            'business-search': get('/api/v1/admin/business/?search=Business 1'),
+            'appointments-list': get('/api/v1/admin/appointments/'),
+            'appointments-deep-page': get('/api/v1/admin/appointments/?page=1000'),
+            'appointments-cursor': get('/api/v1/admin/appointments/?pagination=cursor'),
+            'appointments-detail': get(f'/api/v1/admin/appointments/{appointment.pk}/'),
+            'services-list': get('/api/v1/admin/services/'),
+            'services-detail': get(f'/api/v1/admin/services/{service.pk}/'),
+            'business-workers-list': get('/api/v1/admin/business-workers/'),
+            'business-workers-detail': get(f'/api/v1/admin/business-workers/{worker.pk}/'),
+            'statistics': get(f'/api/v1/statistics/?start={start}&end={end}'),
+            'top-services': get('/api/v1/top-services/'),
+            'top-clients': get('/api/v1/top-clients/'),
+            'top-businesses': get('/api/v1/top-businesses/'),
+            'top-specialists': get('/api/v1/top-specialists/'),
+            'availability-week': get(f'/api/v1/availability/?{availability}'),
+            'earliest-availability': get(f'/api/v1/earliest-availability/?{earliest_availability}'),
+            'nearby': get('/api/v1/nearby/?latitude=41.3111&longitude=69.2797&radius=5'),
+            'get-me': get('/api/v1/get-me/'),
+            'token': post('/api/v1/token/', {'phone_number': self.user.phone_number, 'password': BENCHMARK_PASSWORD}),
+            'token-refresh': Endpoint(lambda refresh: self.client.post('/api/v1/token/refresh/', {'refresh': refresh}),
+                                      prepare=new_refresh_token),
+            'token-blacklist': Endpoint(lambda refresh: self.client.post('/api/v1/token/blacklist/',
+                                                                         {'refresh': refresh}),
+                                        prepare=new_refresh_token),
+            'user-update': Endpoint(lambda: self.client.patch('/api/v1/user-update/', {'first_name': 'Benchmark'},
+                                                              content_type='application/json')),
+            'change-phone': post('/api/v1/change-phone/', {'new_phone_number': '+998990000000'}),
+            # the benchmark user "changes" to their own number
+            'verify-phone': Endpoint(lambda code: self.client.post('/api/v1/verify-phone/', {'code': code}),
+                                     prepare=new_code),
+            'notifications-list': get('/api/v1/notifications/', reader_client),
+            'notifications-unread-count': get('/api/v1/notifications/unread-count/', reader_client),
+            'notifications-read': Endpoint(lambda ids: reader_client.post('/api/v1/notifications/read/', {'ids': ids},
+                                                                          content_type='application/json'),
+                                           prepare=new_unread),
+            'async-business-list': get('/api/v1/async/business/'),
+            'async-business-detail': get(f'/api/v1/async/business/{business.pk}/'),
+            'async-services-list': get('/api/v1/async/services/'),
+            'async-services-detail': get(f'/api/v1/async/services/{service.pk}/'),
+            'async-statistics': get(f'/api/v1/async/statistics/?start={start}&end={end}'),
+            'async-top-services': get('/api/v1/async/top-services/'),
+            'async-top-clients': get('/api/v1/async/top-clients/'),
+            'async-top-businesses': get('/api/v1/async/top-businesses/'),
+            'async-top-specialists': get('/api/v1/async/top-specialists/'),
+            'async-availability-week': get(f'/api/v1/async/availability/?{availability}'),
+            'async-earliest-availability': get(f'/api/v1/async/earliest-availability/?{earliest_availability}'),
+            'async-get-me': get('/api/v1/async/get-me/'),
+        }
+
+    def measure(self, endpoint, iterations, warmup):
+        for _ in range(warmup):
+            endpoint()
+
+        durations = []
+        statuses = []
+        queries = QueryCounter()
+        for _ in range(iterations):
+            argument = () if endpoint.prepare is None else (endpoint.prepare(),)
+            with connection.execute_wrapper(queries), stopwatch() as elapsed:
+                response = endpoint.request(*argument)
+            durations.append(elapsed['seconds'])
+            statuses.append(response.status_code)
+
+        with peak_memory() as memory:
+            endpoint()
+
+        unexpected = [status for status in statuses if status != endpoint.expected_status]
+        return {
+            **summarize(durations),
+            'status': unexpected[0] if unexpected else endpoint.expected_status,
+            'unexpected': len(unexpected),
+            'queries': round(queries.count / iterations, 1) if iterations else 0,
+            'peak_kb': memory['peak_kb'],
+        }
@@ -0,0 +1,73 @@
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from apps.availability import free_slots, earliest_slots
+from apps.middleware import QueryCounter
+from apps.models import ServiceBySpecialist
+from utils.benchmark import summarize, stopwatch, environment, write_report
+
+
+class Command(BaseCommand):
+    help = ('Micro-benchmarks the free-slot engine for random specialists over date ranges of several lengths, '
+            'and the earliest-slot search over whole businesses.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ranges', type=int, nargs='*', default=[1, 7, 31, 62], help='range lengths in days')
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--limit', type=int, default=5, help='slots returned by the earliest-slot search')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--output', default='benchmark_availability.json')
+
+    def handle(self, *args, **options):
+        offers = list(ServiceBySpecialist.objects
+                      .values_list('specialist_id', 'sub_service_id', 'sub_service_id__service_id__business_id')[:1000])
+        if not offers:
+            raise CommandError('No ServiceBySpecialist rows, run "manage.py seed_data" first.')
+        rng = random.Random(options['seed'])
+        today = timezone.localdate()
+
+        results = {}
+        for days in options['ranges']:
+            last_day = today + timedelta(days=days - 1)
+
+            def one_specialist():
+                specialist_id, sub_service_id, business_id = rng.choice(offers)
+                return free_slots(specialist_id, sub_service_id, today, last_day)[1]
+
+            def whole_business():
+                specialist_id, sub_service_id, business_id = rng.choice(offers)
+                return earliest_slots(business_id, sub_service_id, today, last_day, options['limit'])
+
+            for name, search in ((f'free-slots-{days}d', one_specialist), (f'earliest-slots-{days}d', whole_business)):
+                results[name] = self.measure(search, options['iterations'])
+                self.stdout.write(f"{name:<20} p50 {results[name]['p50_ms']:>8} ms  "
+                                  f"p95 {results[name]['p95_ms']:>8} ms  p99 {results[name]['p99_ms']:>8} ms  "
+                                  f"queries {results[name]['queries']}  slots {results[name]['slots']}")
+
+        write_report(options['output'], {
+            'environment': {**environment(), 'database': connection.vendor},
+            'iterations': options['iterations'],
+            'results': results,
+        })
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    @staticmethod
+    def measure(search, iterations):
+        durations = []
+        slots = 0
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            for _ in range(iterations):
+                with stopwatch() as elapsed:
+                    found = search()
+                durations.append(elapsed['seconds'])
+                slots += len(found)
+        return {
+            **summarize(durations),
+            'queries': round(queries.count / iterations, 1),
+            'slots': round(slots / iterations, 1),
+        }
@@ -0,0 +1,101 @@
+import random
+import threading
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.models import User, Appointment, ServiceBySpecialist
+from utils.benchmark import summarize, stopwatch, environment, write_report
+
+
+class Command(BaseCommand):
+    help = ('Stress-tests the booking endpoint: several threads book overlapping slots of one specialist at once. '
+            'Reports bookings per second, conflicts and latency, and checks that nothing was double booked.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--attempts', type=int, default=50, help='booking attempts per thread')
+        parser.add_argument('--slots', type=int, default=40, help='distinct start times competed for')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--keep', action='store_true', help='keep the booked appointments')
+        parser.add_argument('--output', default='benchmark_booking.json')
+
+    def handle(self, *args, **options):
+        offer = ServiceBySpecialist.objects.select_related('sub_service_id').order_by('id').first()
+        if offer is None:
+            raise CommandError('No ServiceBySpecialist rows, run "manage.py seed_data" first.')
+        client_user, _ = User.objects.get_or_create(phone_number='+998000000001',
+                                                    defaults={'first_name': 'Benchmark', 'last_name': 'Client'})
+        token = str(RefreshToken.for_user(client_user).access_token)
+
+        # a day far enough ahead to have no bookings; slots start every half duration so neighbours overlap
+        day = timezone.localdate() + timedelta(days=3650)
+        first = timezone.make_aware(datetime.combine(day, time()))
+        half = max(offer.duration // 2, 1)
+        starts = [first + timedelta(minutes=half * index) for index in range(options['slots'])]
+        payload = {'specialist_id': offer.specialist_id_id, 'client_id': client_user.pk,
+                   'service_id': offer.sub_service_id.service_id_id, 'sub_service_id': offer.sub_service_id_id}
+
+        outcomes, durations, lock = [], [], threading.Lock()
+
+        def worker(seed):
+            rng = random.Random(seed)
+            http = Client(raise_request_exception=False, HTTP_AUTHORIZATION=f"Bearer {token}")
+            try:
+                for _ in range(options['attempts']):
+                    data = {**payload, 'start_time': rng.choice(starts).isoformat()}
+                    with stopwatch() as elapsed:
+                        response = http.post('/api/v1/admin/appointments/', data, content_type='application/json')
+                    with lock:
+                        outcomes.append(response.status_code)
+                        durations.append(elapsed['seconds'])
+            finally:
+                connection.close()
+
+        rng = random.Random(options['seed'])
+        threads = [threading.Thread(target=worker, args=(rng.random(),)) for _ in range(options['threads'])]
+        with stopwatch() as wall:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        booked = (Appointment.objects
+                  .filter(specialist_id=offer.specialist_id_id, start_time__gte=first,
+                          start_time__lt=first + timedelta(days=2))
+                  .order_by('start_time'))
+        intervals = list(booked.filter(status__in=Appointment.BLOCKING_STATUSES).values_list('start_time', 'end_time'))
+        double_bookings, latest_end = 0, None
+        for start, end in intervals:
+            if latest_end is not None and start < latest_end:
+                double_bookings += 1
+            latest_end = max(end, latest_end or end)
+
+        results = {
+            **summarize(durations),
+            'attempts': len(outcomes),
+            'booked': outcomes.count(201),
+            'conflicts': outcomes.count(409),
+            'errors': len(outcomes) - outcomes.count(201) - outcomes.count(409),
+            'bookings_per_second': round(outcomes.count(201) / wall['seconds'], 1),
+            'attempts_per_second': round(len(outcomes) / wall['seconds'], 1),
+            'double_bookings': double_bookings,
+        }
+        if not options['keep']:
+            booked.delete()
+
+        write_report(options['output'], {
+            'environment': {**environment(), 'database': connection.vendor},
+            'threads': options['threads'],
+            'slots': options['slots'],
+            'results': results,
+        })
+        for key, value in results.items():
+            self.stdout.write(f"{key:<20} {value}")
+        if double_bookings:
+            raise CommandError(f'{double_bookings} double bookings, results written to {options["output"]}')
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
@@ -0,0 +1,178 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.management.commands.benchmark import Command as EndpointBenchmark
+from apps.models import Business, Service, ServiceBySpecialist
+from utils.benchmark import summarize, environment, write_report, load_report, compare
+
+
+class Command(BaseCommand):
+    help = ('Starts the WSGI deployment (gunicorn, sync workers) and the ASGI one (gunicorn, uvicorn workers, '
+            'async views under /api/v1/async/) side by side and compares their throughput and latency at several '
+            'numbers of concurrent keep-alive connections.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='worker processes per server')
+        parser.add_argument('--concurrency', type=int, nargs='*', default=[1, 16, 64])
+        parser.add_argument('--requests', type=int, default=400, help='requests per endpoint and concurrency')
+        parser.add_argument('--only', nargs='*', default=None, help='benchmark only these endpoint names')
+        parser.add_argument('--wsgi-port', type=int, default=8101)
+        parser.add_argument('--asgi-port', type=int, default=8102)
+        parser.add_argument('--output', default='benchmark_servers.json')
+        parser.add_argument('--compare', default=None, help='previous JSON report to compare p95 latency with')
+
+    def handle(self, *args, **options):
+        if not Business.objects.exists():
+            raise CommandError('The database is empty, run "manage.py seed_data" first.')
+        token = RefreshToken.for_user(EndpointBenchmark().benchmark_user()).access_token
+        headers = f"Authorization: Bearer {token}\r\n"
+
+        endpoints = self.endpoints()
+        if options['only']:
+            endpoints = {name: paths for name, paths in endpoints.items() if name in options['only']}
+        servers = {
+            'wsgi': ([sys.executable, '-m', 'gunicorn', 'root.wsgi:application', '--workers', str(options['workers']),
+                      '--bind', f"127.0.0.1:{options['wsgi_port']}", '--log-level', 'warning'],
+                     options['wsgi_port']),
+            # same process manager for both, so only the worker model differs
+            'asgi': ([sys.executable, '-m', 'gunicorn', 'root.asgi:application', '--workers', str(options['workers']),
+                      '--worker-class', 'uvicorn_worker.UvicornWorker',
+                      '--bind', f"127.0.0.1:{options['asgi_port']}", '--log-level', 'warning'],
+                     options['asgi_port']),
+        }
+
+        results = {}
+        for server, (command, port) in servers.items():
+            with self.running(command, port):
+                for name, paths in endpoints.items():
+                    for concurrency in options['concurrency']:
+                        key = f'{server}:{name}:c{concurrency}'
+                        results[key] = asyncio.run(self.load(port, paths[server], headers, concurrency,
+                                                             options['requests']))
+                        self.stdout.write(f"{key:<40} {results[key]['requests_per_second']:>8} req/s  "
+                                          f"p50 {results[key]['p50_ms']:>9} ms  p95 {results[key]['p95_ms']:>9} ms  "
+                                          f"errors {results[key]['errors']}")
+
+        report = {
+            'environment': {**environment(), 'database': connection.vendor},
+            'workers': options['workers'],
+            'requests': options['requests'],
+            'results': results,
+        }
+        write_report(options['output'], report)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['compare']:
+            for name, before, after, change in compare(load_report(options['compare']), report):
+                self.stdout.write(f"{name:<40} p95 {before:>9} -> {after:>9} ms ({change:+}%)")
+
+    def endpoints(self):
+        """Maps endpoint names to their WSGI (sync view) and ASGI (async view) paths."""
+        business = Business.objects.order_by('id').first()
+        service = Service.objects.order_by('id').first()
+        offer = ServiceBySpecialist.objects.order_by('id').first()
+        today = timezone.localdate()
+
+        def paths(sync_path, async_path=None):
+            return {'wsgi': f'/api/v1/{sync_path}', 'asgi': f'/api/v1/async/{async_path or sync_path}'}
+
+        return {
+            'business-list': paths('admin/business/', 'business/'),
+            'business-detail': paths(f'admin/business/{business.pk}/', f'business/{business.pk}/'),
+            'services-list': paths('admin/services/', 'services/'),
+            'services-detail': paths(f'admin/services/{service.pk}/', f'services/{service.pk}/'),
+            'statistics': paths(f'statistics/?start={today - timedelta(days=30)}&end={today}'),
+            'top-services': paths('top-services/'),
+            'availability-week': paths(f'availability/?specialist={offer.specialist_id_id}'
+                                       f'&sub_service={offer.sub_service_id_id}&start={today}'
+                                       f'&end={today + timedelta(days=6)}'),
+            'get-me': paths('get-me/'),
+        }
+
+    @contextmanager
+    def running(self, command, port):
+        process = subprocess.Popen(command, env=os.environ.copy())
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+                    break
+                except OSError:
+                    if process.poll() is not None:
+                        raise CommandError(f"{command[2]} exited with {process.returncode}")
+                    if time.monotonic() > deadline:
+                        raise CommandError(f"{command[2]} did not start listening on port {port}")
+                    time.sleep(0.2)
+            yield process
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    async def load(self, port, path, headers, concurrency, total):
+        """Sends `total` GETs of `path` over `concurrency` keep-alive connections."""
+        request = f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n{headers}\r\n".encode()
+        remaining = [total]
+        durations, errors = [], [0]
+
+        async def client():
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            try:
+                while remaining[0] > 0:
+                    remaining[0] -= 1
+                    started = time.perf_counter()
+                    writer.write(request)
+                    await writer.drain()
+                    status, close = await self.read_response(reader)
+                    durations.append(time.perf_counter() - started)
+                    if status != 200:
+                        errors[0] += 1
+                    if close:
+                        writer.close()
+                        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            finally:
+                writer.close()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        return {
+            **summarize(durations),
+            'concurrency': concurrency,
+            'requests_per_second': round(len(durations) / elapsed, 1),
+            'errors': errors[0],
+        }
+
+    @staticmethod
+    async def read_response(reader):
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+        if 'content-length' in headers:
+            await reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding') == 'chunked':
+            while True:
+                size = int((await reader.readline()).strip(), 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        return status, headers.get('connection', '').lower() == 'close'
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apps import inbox
+
+
+class Command(BaseCommand):
+    help = ('Deletes read notifications older than INBOX["RETENTION_DAYS"] in small transactions, '
+            'so it can run next to live traffic.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='retention in days, instead of the setting')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--pause', type=float, default=0.0, help='seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        deleted = inbox.compact(options['days'], options['batch_size'], options['pause'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} read notifications"))
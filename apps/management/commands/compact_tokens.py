@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apps.tokens import compact_expired_tokens
+
+
+class Command(BaseCommand):
+    help = ('Deletes expired outstanding tokens and their blacklist entries in small transactions, '
+            'so it can run next to live traffic.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.0, help='seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        outstanding, blacklisted = compact_expired_tokens(options['batch_size'], options['pause'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {outstanding} expired outstanding tokens and {blacklisted} blacklisted tokens"))
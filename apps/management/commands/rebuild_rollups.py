@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps import rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the daily appointment rollup tables from the Appointment table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rollups.rebuild(batch_size=options['batch_size'])
+        counts = ', '.join(f"{model.__name__}: {model.objects.count()}" for model in rollups.ROLLUP_MODELS)
+        self.stdout.write(self.style.SUCCESS(f"Rollups rebuilt ({counts})"))
@@ -0,0 +1,38 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps import jobs
+
+
+class Command(BaseCommand):
+    help = ('Runs background job workers (apps/jobs.py) until SIGTERM or SIGINT; '
+            'a worker finishes its current batch before it exits.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='worker processes to run')
+        parser.add_argument('--once', action='store_true', help='exit when no job is due')
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            self.work(options['once'])
+            return
+        # children must not share the parent's database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=self.work, args=(options['once'],)) for _ in range(options['processes'])]
+        for worker in workers:
+            worker.start()
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda signum, frame: [worker.terminate() for worker in workers])
+        for worker in workers:
+            worker.join()
+
+    @staticmethod
+    def work(once):
+        stopping = []
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda signum, frame: stopping.append(signum))
+        jobs.work(once=once, should_stop=lambda: bool(stopping))
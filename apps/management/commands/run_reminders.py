@@ -0,0 +1,29 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.reminders import ReminderScheduler
+
+
+class Command(BaseCommand):
+    help = ('Enqueues reminders before approved appointments as they fall due (apps/reminders.py). '
+            'Run a single instance; it stops on SIGTERM or SIGINT.')
+
+    def handle(self, *args, **options):
+        stopping = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda signum, frame: stopping.set())
+
+        scheduler = ReminderScheduler()
+        while not stopping.is_set():
+            reminders = scheduler.tick()
+            if reminders:
+                scheduler.send(reminders)
+                self.stdout.write(f"Enqueued {len(reminders)} reminders")
+            wait = scheduler.config['POLL_INTERVAL']
+            next_due = scheduler.next_due()
+            if next_due is not None:
+                wait = min(wait, max((next_due - timezone.now()).total_seconds(), 0))
+            stopping.wait(wait)
@@ -0,0 +1,267 @@
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from apps import inbox
+from apps.models import (User, Business, Service, SubService, ServiceBySpecialist, BusinessWorker,
+                         Appointment, Review, Notification, WorkSchedule, TimeOff, OpeningInterval)
+from apps.opening_hours import WEEKDAYS, week_intervals
+
+STATUS_WEIGHTS = {
+    Appointment.Status.APPROVED: 60,
+    Appointment.Status.PENDING: 15,
+    Appointment.Status.CANCELED: 12,
+    Appointment.Status.REJECTED: 8,
+    Appointment.Status.MOVED: 5,
+}
+
+FIRST_NAMES = ['Aziz', 'Dilnoza', 'Jasur', 'Madina', 'Sardor', 'Nigora', 'Bekzod', 'Malika', 'Otabek', 'Zarina']
+LAST_NAMES = ['Karimov', 'Rahimova', 'Tursunov', 'Yusupova', 'Aliyev', 'Sodiqova', 'Ergashev', 'Nazarova']
+WORKING_HOURS = [(time(9), time(18)), (time(10), time(19)), (time(8), time(17))]
+DESCRIPTION = '<p>Professional <strong>care</strong> with certified specialists and modern equipment.</p>'
+OPENING_HOURS = [
+    {weekday: [['09:00', '18:00']] for weekday in WEEKDAYS[:5]},
+    {weekday: [['10:00', '20:00']] for weekday in WEEKDAYS[:6]},
+    {weekday: [['08:00', '13:00'], ['14:00', '19:00']] for weekday in WEEKDAYS},
+    {weekday: [['00:00', '24:00']] for weekday in WEEKDAYS},
+    {**{weekday: [['12:00', '23:00']] for weekday in WEEKDAYS[:4]}, 'friday': [['12:00', '02:00']],
+     'saturday': [['12:00', '02:00']]},
+]
+
+
+@contextmanager
+def manual_timestamps(*models):
+    """Lets bulk_create keep the created_at/updated_at values set on the instances."""
+    fields = [(model._meta.get_field('created_at'), model._meta.get_field('updated_at')) for model in models]
+    try:
+        for created_at, updated_at in fields:
+            created_at.auto_now_add = updated_at.auto_now = False
+        yield
+    finally:
+        for created_at, updated_at in fields:
+            created_at.auto_now_add = updated_at.auto_now = True
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Generates a synthetic dataset with bulk inserts for load testing and benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--businesses', type=int, default=50)
+        parser.add_argument('--services', type=int, default=5, help='services per business')
+        parser.add_argument('--sub-services', type=int, default=3, help='sub services per service')
+        parser.add_argument('--workers', type=int, default=3, help='specialists per service')
+        parser.add_argument('--clients', type=int, default=5000)
+        parser.add_argument('--appointments', type=int, default=100000)
+        parser.add_argument('--reviews', type=int, default=20000)
+        parser.add_argument('--notifications', type=int, default=100000)
+        parser.add_argument('--days', type=int, default=365, help='spread created_at over this many past days')
+        parser.add_argument('--booking-horizon', type=int, default=14,
+                            help='appointments start up to this many days after they were created')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None, help='random seed for a repeatable dataset')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.days = options['days']
+        self.horizon = options['booking_horizon']
+        self.phone_seq = (User.objects.aggregate(last=Max('id'))['last'] or 0) * 1000
+
+        with transaction.atomic():
+            clients = self.create_users(options['clients'], User.RoleType.CLIENT)
+            services = self.create_catalog(options)
+        self.stdout.write(f"{len(clients)} clients, {len(services)} services")
+
+        with manual_timestamps(Appointment, Review, Notification):
+            appointment_ids = self.create_appointments(options['appointments'], services, clients)
+            self.create_reviews(options['reviews'], appointment_ids)
+            self.create_notifications(options['notifications'], clients)
+
+        # bulk_create skips the signals that maintain the statistics rollups
+        call_command('rebuild_rollups', batch_size=self.batch_size, stdout=self.stdout)
+        # and the unread counters, see apps/inbox.py
+        inbox.recount(self.batch_size)
+        self.stdout.write(self.style.SUCCESS('Dataset generated'))
+
+    def random_moment(self):
+        return self.now - timedelta(seconds=self.random.randrange(max(self.days, 1) * 86400))
+
+    def bulk_insert(self, model, objects):
+        total = 0
+        for batch in batched(objects, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, batch_size=self.batch_size)
+            total += len(batch)
+        self.stdout.write(f"  {model.__name__}: {total}")
+
+    def create_users(self, count, role):
+        password = make_password(None)
+        users = []
+        for _ in range(count):
+            self.phone_seq += 1
+            users.append(User(phone_number=f"+998{self.phone_seq:09d}", role=role, password=password,
+                              first_name=self.random.choice(FIRST_NAMES),
+                              last_name=self.random.choice(LAST_NAMES)))
+        return User.objects.bulk_create(users, batch_size=self.batch_size)
+
+    def create_catalog(self, options):
+        """Returns a list of (service_id, [(specialist_id, sub_service_id, duration), ...]) pairs."""
+        business_types = list(Business.Type.values)
+        businesses = [
+            Business(name=f"Business {i}", description=DESCRIPTION, type=self.random.choice(business_types),
+                     address=f"Tashkent, street {i}", is_active=self.random.random() < 0.9,
+                     latitude=round(41.2 + self.random.uniform(0, 0.2), 6),
+                     longitude=round(69.1 + self.random.uniform(0, 0.3), 6),
+                     opening_hours=self.random.choice(OPENING_HOURS))
+            for i in range(options['businesses'])
+        ]
+        services = [
+            Service(name=f"Service {j}", description=DESCRIPTION, business_id=business)
+            for business in businesses for j in range(options['services'])
+        ]
+        # bulk_create skips save(), which fills these in
+        for instance in businesses + services:
+            instance.update_search_document()
+        for business in businesses:
+            business.update_geohash()
+        businesses = Business.objects.bulk_create(businesses, batch_size=self.batch_size)
+        services = Service.objects.bulk_create(services, batch_size=self.batch_size)
+        OpeningInterval.objects.bulk_create(
+            (OpeningInterval(business_id=business, start_minute=start, end_minute=end)
+             for business in businesses for start, end in week_intervals(business.opening_hours)),
+            batch_size=self.batch_size,
+        )
+
+        specialists = self.create_users(len(services) * options['workers'], User.RoleType.SPECIALIST)
+        staff = {service.id: specialists[i * options['workers']:(i + 1) * options['workers']]
+                 for i, service in enumerate(services)}
+
+        BusinessWorker.objects.bulk_create(
+            (BusinessWorker(specialist_id=specialist, service_id=service, position='Master',
+                            bio=DESCRIPTION, years_of_experience=self.random.randint(0, 20))
+             for service in services for specialist in staff[service.id]),
+            batch_size=self.batch_size,
+        )
+        sub_services = SubService.objects.bulk_create(
+            (SubService(name=f"Sub service {k}", description=DESCRIPTION, service_id=service,
+                        specialist_id=self.random.choice(staff[service.id]))
+             for service in services for k in range(options['sub_services'])),
+            batch_size=self.batch_size,
+        )
+        offers = ServiceBySpecialist.objects.bulk_create(
+            (ServiceBySpecialist(specialist_id=specialist, sub_service_id=sub_service,
+                                 price=self.random.randrange(50, 500) * 1000,
+                                 duration=self.random.choice([15, 30, 45, 60, 90]))
+             for sub_service in sub_services for specialist in staff[sub_service.service_id_id]),
+            batch_size=self.batch_size,
+        )
+        self.create_schedules(specialists)
+
+        services_offers = {service.id: [] for service in services}
+        for offer in offers:
+            services_offers[offer.sub_service_id.service_id_id].append(
+                (offer.specialist_id_id, offer.sub_service_id_id, offer.duration))
+        return list(services_offers.items())
+
+    def create_schedules(self, specialists):
+        schedules = WorkSchedule.objects.bulk_create(
+            (WorkSchedule(specialist_id=specialist, start_time=start, end_time=end)
+             for specialist in specialists for start, end in [self.random.choice(WORKING_HOURS)]),
+            batch_size=self.batch_size,
+        )
+        self.working_hours = {schedule.specialist_id_id: (schedule.start_time, schedule.end_time)
+                              for schedule in schedules}
+
+        first_day = timezone.localdate(self.now) - timedelta(days=self.days)
+        span = self.days + self.horizon + 1
+        TimeOff.objects.bulk_create(
+            (TimeOff(specialist_id=schedule.specialist_id, work_schedule_id=schedule,
+                     date=first_day + timedelta(days=offset), reason='<p>Day off</p>')
+             for schedule in schedules
+             for offset in self.random.sample(range(span), min(span, span // 30 + 1))),
+            batch_size=self.batch_size,
+        )
+
+    def create_appointments(self, count, services, clients):
+        if not services or not clients:
+            return range(0)
+        statuses = list(STATUS_WEIGHTS)
+        weights = list(STATUS_WEIGHTS.values())
+
+        services = [(service_id, offers) for service_id, offers in services if offers]
+        # next free minute of each (specialist, day), so bookings never overlap
+        calendar = {}
+
+        def book(specialist_id, created_at, duration):
+            day = timezone.localdate(created_at) + timedelta(days=self.random.randint(0, self.horizon))
+            opens, closes = self.working_hours[specialist_id]
+            start = calendar.get((specialist_id, day), opens.hour * 60 + opens.minute)
+            start += self.random.choice([0, 0, 15, 30])
+            if start + duration > closes.hour * 60 + closes.minute:
+                return None, None
+            calendar[specialist_id, day] = start + duration
+            start_time = timezone.make_aware(datetime.combine(day, time())) + timedelta(minutes=start)
+            return start_time, start_time + timedelta(minutes=duration)
+
+        def appointments():
+            for _ in range(count):
+                service_id, offers = self.random.choice(services)
+                specialist_id, sub_service_id, duration = self.random.choice(offers)
+                created_at = self.random_moment()
+                start_time, end_time = book(specialist_id, created_at, duration)
+                yield Appointment(service_id_id=service_id, specialist_id_id=specialist_id,
+                                  sub_service_id_id=sub_service_id, client_id_id=self.random.choice(clients).id,
+                                  status=self.random.choices(statuses, weights)[0],
+                                  start_time=start_time, end_time=end_time,
+                                  created_at=created_at, updated_at=created_at)
+
+        first_id = (Appointment.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        self.bulk_insert(Appointment, appointments())
+        last_id = Appointment.objects.aggregate(last=Max('id'))['last'] or 0
+        return range(first_id, last_id + 1)
+
+    def create_reviews(self, count, appointment_ids):
+        """Reviews a random sample of the new appointments, at most one review per appointment."""
+        ratings = list(Review.Rating.values)
+        sample = self.random.sample(appointment_ids, min(count, len(appointment_ids)))
+
+        def reviews():
+            for batch in batched(sample, self.batch_size):
+                clients = Appointment.objects.filter(id__in=batch).values_list('id', 'client_id', 'created_at')
+                for appointment_id, client_id, appointment_created_at in clients:
+                    created_at = min(appointment_created_at + timedelta(days=1), self.now)
+                    yield Review(appointment_id_id=appointment_id, client_id_id=client_id,
+                                 rating=self.random.choice(ratings), comment=DESCRIPTION,
+                                 created_at=created_at, updated_at=created_at)
+
+        self.bulk_insert(Review, reviews())
+
+    def create_notifications(self, count, clients):
+        if not clients:
+            return
+        types = list(Notification.Status.values)
+
+        def notifications():
+            for _ in range(count):
+                created_at = self.random_moment()
+                yield Notification(user_id_id=self.random.choice(clients).id, type=self.random.choice(types),
+                                   message='<p>Your appointment is confirmed.</p>',
+                                   is_read=self.random.random() < 0.7,
+                                   created_at=created_at, updated_at=created_at)
+
+        self.bulk_insert(Notification, notifications())
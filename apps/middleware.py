@@ -0,0 +1,150 @@
+import logging
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERY_BUDGET = {
+    'HEADERS': False,
+    'ON_EXCEED': 'log',
+    'DEFAULT': None,
+}
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+# the counter of the async request being handled; sync_to_async copies it into worker threads
+_current_counter = ContextVar('query_budget_counter', default=None)
+
+
+class QueryCounter:
+    def __init__(self, scoped=False):
+        self.count = 0
+        # a scoped counter shares its connection with concurrent requests and only counts its own queries
+        self.scoped = scoped
+
+    def __call__(self, execute, sql, params, many, context):
+        if not self.scoped or _current_counter.get() is self:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+def get_query_budget_settings():
+    return {**DEFAULT_QUERY_BUDGET, **getattr(settings, 'QUERY_BUDGET', {})}
+
+
+class QueryBudgetMiddleware:
+    """
+    Counts the SQL queries executed while handling a request and compares them
+    with the `query_budget` declared on the resolved view class: either a number
+    or a dict of numbers keyed by HTTP method, with '*' for the other methods.
+
+    The count is reported in the `X-Query-Count` header (and the budget in
+    `X-Query-Budget`) when DEBUG or QUERY_BUDGET['HEADERS'] is on. A request
+    over budget is logged or raises `QueryBudgetExceeded`, depending on
+    QUERY_BUDGET['ON_EXCEED'].
+
+    Under ASGI the async ORM runs queries in worker threads, so the counter is
+    attached to the connections of the thread the ORM uses for this request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        counter = QueryCounter()
+        request.query_budget = None
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+
+        return self.check_budget(request, response, counter)
+
+    async def __acall__(self, request):
+        counter = QueryCounter(scoped=True)
+        request.query_budget = None
+        token = _current_counter.set(counter)
+        await sync_to_async(self.attach)(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(self.detach)(counter)
+            _current_counter.reset(token)
+        return self.check_budget(request, response, counter)
+
+    @staticmethod
+    def attach(counter):
+        for connection in connections.all():
+            connection.execute_wrappers.append(counter)
+
+    @staticmethod
+    def detach(counter):
+        for connection in connections.all():
+            if counter in connection.execute_wrappers:
+                connection.execute_wrappers.remove(counter)
+
+    def check_budget(self, request, response, counter):
+        config = get_query_budget_settings()
+        budget = request.query_budget if request.query_budget is not None else config['DEFAULT']
+
+        if settings.DEBUG or config['HEADERS']:
+            response['X-Query-Count'] = str(counter.count)
+            if budget is not None:
+                response['X-Query-Budget'] = str(budget)
+
+        if budget is not None and counter.count > budget:
+            message = f"{request.method} {request.path} ran {counter.count} queries, budget is {budget}"
+            if config['ON_EXCEED'] == 'raise':
+                raise QueryBudgetExceeded(message)
+            if config['ON_EXCEED'] == 'log':
+                logger.warning(message)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        budget = getattr(view_class, 'query_budget', None)
+        if isinstance(budget, dict):
+            budget = budget.get(request.method, budget.get('*'))
+        request.query_budget = budget
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """WhiteNoise that stays on the event loop under ASGI instead of forcing every request into a thread."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0005_alter_business_is_active'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='business',
+            name='is_active',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='business',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=15, max_digits=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name='business',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=15, max_digits=50, null=True),
+        ),
+        migrations.CreateModel(
+            name='PhoneOTP',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('new_phone_number', models.TextField(max_length=20)),
+                ('code', models.CharField(max_length=6)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='phones', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
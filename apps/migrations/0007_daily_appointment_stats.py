@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0006_phoneotp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBusinessStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('canceled', 'Canceled'), ('moved', 'Moved')], max_length=20)),
+                ('total', models.BigIntegerField(default=0)),
+                ('business_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='apps.business')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'business_id', 'status'), name='daily_business_stat_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyClientStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('canceled', 'Canceled'), ('moved', 'Moved')], max_length=20)),
+                ('total', models.BigIntegerField(default=0)),
+                ('client_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_client_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'client_id', 'status'), name='daily_client_stat_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyServiceStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('canceled', 'Canceled'), ('moved', 'Moved')], max_length=20)),
+                ('total', models.BigIntegerField(default=0)),
+                ('service_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='apps.service')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'service_id', 'status'), name='daily_service_stat_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySpecialistStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('canceled', 'Canceled'), ('moved', 'Moved')], max_length=20)),
+                ('total', models.BigIntegerField(default=0)),
+                ('specialist_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_specialist_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'specialist_id', 'status'), name='daily_specialist_stat_unique')],
+            },
+        ),
+    ]
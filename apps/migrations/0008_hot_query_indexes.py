@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0007_daily_appointment_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['created_at', 'id'], name='appointment_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['status', 'specialist_id'], name='appointment_status_spec_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailybusinessstat',
+            index=models.Index(fields=['status', 'business_id'], name='daily_bus_stat_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyspecialiststat',
+            index=models.Index(fields=['status', 'specialist_id'], name='daily_spec_stat_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['user_id', '-created_at'], name='notification_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='phoneotp',
+            index=models.Index(fields=['new_phone_number', '-created_at'], name='phoneotp_phone_created_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# PostgreSQL rejects overlapping blocking appointments of a specialist itself;
+# other databases check for overlaps under a lock (apps/booking.py; the SlotClaim
+# rows created here were replaced by BookingLock in 0018).
+ADD_EXCLUSION_CONSTRAINT = (
+    "CREATE EXTENSION IF NOT EXISTS btree_gist;",
+    """
+ALTER TABLE apps_appointment ADD CONSTRAINT appointment_no_overlap EXCLUDE USING gist (
+    specialist_id_id WITH =,
+    tstzrange(start_time, end_time, '[)') WITH &&
+) WHERE (status IN ('pending', 'approved', 'moved') AND start_time IS NOT NULL AND end_time IS NOT NULL);
+""",
+)
+DROP_EXCLUSION_CONSTRAINT = "ALTER TABLE apps_appointment DROP CONSTRAINT IF EXISTS appointment_no_overlap;"
+
+
+def add_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in ADD_EXCLUSION_CONSTRAINT:
+            schema_editor.execute(sql)
+
+
+def drop_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_EXCLUSION_CONSTRAINT)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0009_appointment_time_interval'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotClaim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot_start', models.DateTimeField()),
+                ('appointment_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_claims', to='apps.appointment')),
+                ('specialist_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_claims', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('specialist_id', 'slot_start'), name='slot_claim_unique')],
+            },
+        ),
+        migrations.RunPython(add_exclusion_constraint, drop_exclusion_constraint),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+from apps.search import build_document, create_search_index, drop_search_index
+
+# Model.SEARCH_DOCUMENT at the time of this migration (historical models have no class attributes)
+SEARCH_DOCUMENTS = {
+    'business': ('name', 'type', 'description'),
+    'service': ('name', 'description'),
+}
+
+
+def fill_search_documents(apps, schema_editor):
+    for model_name, fields in SEARCH_DOCUMENTS.items():
+        model = apps.get_model('apps', model_name)
+        rows = list(model.objects.using(schema_editor.connection.alias).only(*fields))
+        for row in rows:
+            row.search_document = build_document(row, fields)
+        model.objects.using(schema_editor.connection.alias).bulk_update(rows, ['search_document'], batch_size=500)
+
+
+def create_search_indexes(apps, schema_editor):
+    for model_name in SEARCH_DOCUMENTS:
+        create_search_index(schema_editor, apps.get_model('apps', model_name))
+
+
+def drop_search_indexes(apps, schema_editor):
+    for model_name in SEARCH_DOCUMENTS:
+        drop_search_index(schema_editor, apps.get_model('apps', model_name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0010_appointment_overlap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='business',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+from utils import geohash
+
+GEOHASH_PRECISION = 9
+
+
+def fill_geohashes(apps, schema_editor):
+    Business = apps.get_model('apps', 'Business')
+    businesses = list(Business.objects.using(schema_editor.connection.alias)
+                      .filter(latitude__isnull=False, longitude__isnull=False).only('latitude', 'longitude'))
+    for business in businesses:
+        business.geohash = geohash.encode(business.latitude, business.longitude, GEOHASH_PRECISION)
+    Business.objects.using(schema_editor.connection.alias).bulk_update(businesses, ['geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0011_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='business',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12, null=True),
+        ),
+        migrations.RunPython(fill_geohashes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='business',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['geohash'], name='business_active_geohash_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:43
+
+import apps.opening_hours
+import django.db.models.deletion
+from django.core.exceptions import ValidationError
+from django.db import migrations, models
+
+from apps.opening_hours import canonical, week_intervals
+
+
+def compile_opening_hours(apps, schema_editor):
+    """Canonicalizes and compiles the valid opening hours; invalid ones are left for their owners to fix."""
+    Business = apps.get_model('apps', 'Business')
+    OpeningInterval = apps.get_model('apps', 'OpeningInterval')
+    alias = schema_editor.connection.alias
+    businesses, intervals = [], []
+    for business in Business.objects.using(alias).exclude(opening_hours=None).only('opening_hours'):
+        try:
+            business.opening_hours = canonical(business.opening_hours)
+        except ValidationError:
+            continue
+        businesses.append(business)
+        intervals.extend(OpeningInterval(business_id=business, start_minute=start, end_minute=end)
+                         for start, end in week_intervals(business.opening_hours))
+    Business.objects.using(alias).bulk_update(businesses, ['opening_hours'], batch_size=500)
+    OpeningInterval.objects.using(alias).bulk_create(intervals, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0012_business_geohash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='business',
+            name='opening_hours',
+            field=models.JSONField(blank=True, null=True, validators=[apps.opening_hours.validate_opening_hours]),
+        ),
+        migrations.CreateModel(
+            name='OpeningInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_minute', models.IntegerField()),
+                ('end_minute', models.IntegerField()),
+                ('business_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='opening_intervals', to='apps.business')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['start_minute', 'end_minute', 'business_id'], name='opening_interval_minute_idx')],
+            },
+        ),
+        migrations.RunPython(compile_opening_hours, migrations.RunPython.noop),
+    ]
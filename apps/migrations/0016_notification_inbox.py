@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_unread(apps, schema_editor):
+    Notification = apps.get_model('apps', 'Notification')
+    NotificationCounter = apps.get_model('apps', 'NotificationCounter')
+    db = schema_editor.connection.alias
+    unread = (Notification.objects.using(db).filter(is_read=False).order_by()
+              .values('user_id').annotate(unread=Count('id')))
+    NotificationCounter.objects.using(db).bulk_create(
+        (NotificationCounter(user_id_id=row['user_id'], unread=row['unread']) for row in unread), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0015_reminder_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_unread, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user_id', '-created_at', '-id'], name='notification_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', True)), fields=['created_at', 'id'], name='notification_read_idx'),
+        ),
+    ]
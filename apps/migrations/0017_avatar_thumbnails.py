@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:05
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def enqueue_thumbnails(apps, schema_editor):
+    # the same jobs apps/signals.py enqueues when an avatar is saved
+    User = apps.get_model('apps', 'User')
+    Job = apps.get_model('apps', 'Job')
+    db = schema_editor.connection.alias
+    now = timezone.now()
+    avatars = User.objects.using(db).exclude(avatar='').exclude(avatar=None).values_list('pk', 'avatar')
+    Job.objects.using(db).bulk_create(
+        (Job(name='avatar_thumbnails', payload={'user': pk, 'avatar': avatar}, run_at=now)
+         for pk, avatar in avatars.iterator()), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0016_notification_inbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(enqueue_thumbnails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0017_avatar_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingLock',
+            fields=[
+                ('specialist_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='booking_lock', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('writes', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.DeleteModel(
+            name='SlotClaim',
+        ),
+    ]
@@ -1,17 +1,22 @@
+import copy
 import re
 from datetime import  timedelta
 from django.utils import timezone
 
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
-from django.db.models import ImageField, CASCADE, ForeignKey, JSONField
-from django.db.models import Model
+from django.db.models import ImageField, CASCADE, SET_NULL, ForeignKey, OneToOneField, JSONField
+from django.db.models import Model, UniqueConstraint, Index, Q
 from django.db.models.enums import TextChoices
-from django.db.models.fields import (CharField, BigIntegerField, BooleanField,
+from django.db.models.fields import (CharField, BigIntegerField, BooleanField, IntegerField,
                                      TimeField, DateField, DecimalField, TextField)
 from django.db.models.fields import DateTimeField
 from django_ckeditor_5.fields import CKEditor5Field
 
+from apps.opening_hours import canonical as canonical_opening_hours, validate_opening_hours
+from apps.search import build_document
+from utils import geohash
+
 
 class CreatedBaseModel(Model):
     updated_at = DateTimeField(auto_now=True)
@@ -21,6 +26,26 @@ class CreatedBaseModel(Model):
         abstract = True
 
 
+class SearchableModel(CreatedBaseModel):
+    """Keeps `search_document`, the plain text of the SEARCH_DOCUMENT fields, for apps/search.py."""
+    SEARCH_DOCUMENT = ()
+
+    search_document = TextField(blank=True, default='', editable=False)
+
+    class Meta:
+        abstract = True
+
+    def update_search_document(self):
+        self.search_document = build_document(self, self.SEARCH_DOCUMENT)
+
+    def save(self, *args, **kwargs):
+        self.update_search_document()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.SEARCH_DOCUMENT):
+            kwargs['update_fields'] = {*update_fields, 'search_document'}
+        super().save(*args, **kwargs)
+
+
 class UserManager(BaseUserManager):
     def create_user(self, phone, password=None, **extra_fields):
         if not phone:
@@ -57,6 +82,8 @@ class User(AbstractUser, CreatedBaseModel):
     )
     role = CharField(max_length=50, choices=RoleType.choices)
     avatar = ImageField(upload_to='users/%Y/%m/%d', null=True, blank=True)
+    # {'source': the avatar they were made from, variant: stored name}, see apps/avatars.py
+    avatar_thumbnails = JSONField(default=dict, blank=True)
     unhashed_password = CharField(null=True, blank=True)
 
     username = None
@@ -65,6 +92,12 @@ class User(AbstractUser, CreatedBaseModel):
 
     objects = UserManager()
 
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # a user built from token claims (apps/authentication.py) loads the rest of its row in one query
+        if fields is not None and getattr(self, 'from_token_claims', False):
+            fields = {*fields, *self.get_deferred_fields()}
+        super().refresh_from_db(using, fields, from_queryset)
+
     def check_phone(self):
         pattern = re.compile(r'^(?:\+?998[\s-]*)?(\d{2})[\s-]*(\d{3})[\s-]*(\d{2,4})(?:[\s-]*(\d{2}))?$')
         m = pattern.match(self.phone)
@@ -77,7 +110,7 @@ class User(AbstractUser, CreatedBaseModel):
             self.phone = self.check_phone()
         super().full_clean(exclude, validate_unique, validate_constraints)
 
-class Business(CreatedBaseModel):
+class Business(SearchableModel):
     class Type(TextChoices):
         CLINIC = 'clinic', 'Clinic'
         BARBERSHOP = 'barbershop', 'Barber Shop'
@@ -91,18 +124,63 @@ class Business(CreatedBaseModel):
     latitude = DecimalField(max_digits=50, decimal_places=15, blank=True, null=True)
     longitude = DecimalField(max_digits=50, decimal_places=15, blank=True, null=True)
     contact = CharField(max_length=255, blank=True, null=True)
-    opening_hours = JSONField(blank=True, null=True)
+    # canonical weekly schema, compiled into OpeningInterval rows, see apps/opening_hours.py
+    opening_hours = JSONField(blank=True, null=True, validators=[validate_opening_hours])
     is_active = BooleanField(default=False)
+    # geohash of (latitude, longitude), the index prefilter of apps/nearby.py
+    geohash = CharField(max_length=12, blank=True, null=True, editable=False)
+
+    SEARCH_DOCUMENT = ('name', 'type', 'description')
+    GEOHASH_PRECISION = 9
+
+    class Meta:
+        indexes = [Index(fields=['geohash'], condition=Q(is_active=True), name='business_active_geohash_idx')]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'opening_hours' in instance.__dict__:
+            # a copy, so changes made in place are noticed by apps.signals.compile_opening_hours
+            instance._loaded_opening_hours = copy.deepcopy(instance.opening_hours)
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        if (fields is None or 'opening_hours' in fields) and 'opening_hours' not in self.get_deferred_fields():
+            self._loaded_opening_hours = copy.deepcopy(self.opening_hours)
+
+    def update_geohash(self):
+        self.geohash = (geohash.encode(self.latitude, self.longitude, self.GEOHASH_PRECISION)
+                        if self.latitude is not None and self.longitude is not None else None)
+
+    def opening_hours_changed(self, update_fields=None):
+        """Whether saving writes new opening hours; invalid legacy values (migration 0013) are kept otherwise."""
+        if update_fields is not None:
+            return 'opening_hours' in update_fields
+        if 'opening_hours' in self.get_deferred_fields():
+            return False
+        return not hasattr(self, '_loaded_opening_hours') or self.opening_hours != self._loaded_opening_hours
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if self.opening_hours_changed(update_fields):
+            self.opening_hours = canonical_opening_hours(self.opening_hours)
+        self.update_geohash()
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
-class Service(CreatedBaseModel):
+class Service(SearchableModel):
     name = CharField(max_length=255)
     description = CKEditor5Field(blank=True, null=True)
     business_id = ForeignKey(Business, related_name='services', on_delete=CASCADE)
     is_active = BooleanField(default=True)
 
+    SEARCH_DOCUMENT = ('name', 'description')
+
     def __str__(self):
         return self.name
 
@@ -149,12 +227,107 @@ class Appointment(CreatedBaseModel):
     specialist_id = ForeignKey(User, related_name='appointments_as_specialist', on_delete=CASCADE)
     client_id = ForeignKey(User, related_name='appointments_as_client', on_delete=CASCADE)
     service_id = ForeignKey(Service, related_name='appointments', on_delete=CASCADE)
+    sub_service_id = ForeignKey(SubService, related_name='appointments', on_delete=SET_NULL, null=True, blank=True)
     status = CharField(max_length=20, choices=Status, default=Status.PENDING)
+    start_time = DateTimeField(null=True, blank=True)
+    end_time = DateTimeField(null=True, blank=True)
+
+    # statuses whose time interval is taken in the specialist's calendar
+    BLOCKING_STATUSES = (Status.PENDING, Status.APPROVED, Status.MOVED)
+
+    class Meta:
+        indexes = [
+            # bookings of a specialist overlapping a time range
+            Index(fields=['specialist_id', 'start_time'], name='appointment_spec_start_idx'),
+            # date range scans, rollup rebuilds and keyset pagination on (created_at, id)
+            Index(fields=['created_at', 'id'], name='appointment_created_at_idx'),
+            # per-status grouping by specialist
+            Index(fields=['status', 'specialist_id'], name='appointment_status_spec_idx'),
+            # the reminder scheduler's change feed and horizon, see apps/reminders.py
+            Index(fields=['updated_at'], name='appointment_updated_at_idx'),
+            Index(fields=['status', 'start_time'], name='appointment_status_start_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_rollup_key = instance.rollup_key()
+        instance._loaded_status = instance.status
+        return instance
+
+    def rollup_key(self):
+        """The daily rollup rows this appointment is counted in, see apps/rollups.py."""
+        if self.created_at is None:
+            return None
+        return (timezone.localdate(self.created_at), self.service_id_id, self.specialist_id_id,
+                self.client_id_id, self.status)
 
     def __str__(self):
         return f"Appointment {self.id} - {self.status}"
 
 
+class BookingLock(Model):
+    """The row that serializes a specialist's blocking bookings outside PostgreSQL, see apps/booking.py."""
+    specialist_id = OneToOneField(User, primary_key=True, related_name='booking_lock', on_delete=CASCADE)
+    writes = IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.writes} bookings of {self.specialist_id_id}"
+
+
+class OpeningInterval(Model):
+    """A [start_minute, end_minute) span of the week (minutes since Monday 00:00) in which a business is open."""
+    business_id = ForeignKey(Business, related_name='opening_intervals', on_delete=CASCADE)
+    start_minute = IntegerField()
+    end_minute = IntegerField()
+
+    class Meta:
+        indexes = [Index(fields=['start_minute', 'end_minute', 'business_id'], name='opening_interval_minute_idx')]
+
+    def __str__(self):
+        return f"{self.business_id} - {self.start_minute} to {self.end_minute}"
+
+
+class DailyAppointmentStat(Model):
+    day = DateField()
+    status = CharField(max_length=20, choices=Appointment.Status)
+    total = BigIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailyServiceStat(DailyAppointmentStat):
+    service_id = ForeignKey(Service, related_name='daily_stats', on_delete=CASCADE)
+
+    class Meta:
+        constraints = [UniqueConstraint(fields=['day', 'service_id', 'status'], name='daily_service_stat_unique')]
+
+
+class DailySpecialistStat(DailyAppointmentStat):
+    specialist_id = ForeignKey(User, related_name='daily_specialist_stats', on_delete=CASCADE)
+
+    class Meta:
+        constraints = [UniqueConstraint(fields=['day', 'specialist_id', 'status'],
+                                        name='daily_specialist_stat_unique')]
+        indexes = [Index(fields=['status', 'specialist_id'], name='daily_spec_stat_status_idx')]
+
+
+class DailyClientStat(DailyAppointmentStat):
+    client_id = ForeignKey(User, related_name='daily_client_stats', on_delete=CASCADE)
+
+    class Meta:
+        constraints = [UniqueConstraint(fields=['day', 'client_id', 'status'], name='daily_client_stat_unique')]
+
+
+class DailyBusinessStat(DailyAppointmentStat):
+    business_id = ForeignKey(Business, related_name='daily_stats', on_delete=CASCADE)
+
+    class Meta:
+        constraints = [UniqueConstraint(fields=['day', 'business_id', 'status'], name='daily_business_stat_unique')]
+        indexes = [Index(fields=['status', 'business_id'], name='daily_bus_stat_status_idx')]
+
+
 class Review(CreatedBaseModel):
     class Rating(TextChoices):
         ONE = "1", "1"
@@ -182,10 +355,28 @@ class Notification(CreatedBaseModel):
     type = CharField(max_length=50, choices=Status)
     is_read = BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            Index(fields=['user_id', '-created_at'], condition=Q(is_read=False), name='notification_unread_idx'),
+            # the inbox, paged on (created_at, id) newest first
+            Index(fields=['user_id', '-created_at', '-id'], name='notification_inbox_idx'),
+            # retention, see apps/inbox.py
+            Index(fields=['created_at', 'id'], condition=Q(is_read=True), name='notification_read_idx'),
+        ]
+
     def __str__(self):
         return f"Notification for {self.user_id}"
 
 
+class NotificationCounter(Model):
+    """The number of unread notifications of a user, kept by apps/inbox.py."""
+    user_id = OneToOneField(User, primary_key=True, related_name='notification_counter', on_delete=CASCADE)
+    unread = IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.unread} unread for {self.user_id_id}"
+
+
 class WorkSchedule(CreatedBaseModel):
     specialist_id = ForeignKey(User, related_name='work_schedules', on_delete=CASCADE)
     start_time = TimeField()
@@ -212,6 +403,9 @@ class PhoneOTP(Model):
     code = CharField(max_length=6)
     created_at = DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [Index(fields=['new_phone_number', '-created_at'], name='phoneotp_phone_created_idx')]
+
     def is_expired(self):
         now = timezone.now()
         print("Created:", self.created_at)
@@ -223,3 +417,22 @@ class PhoneOTP(Model):
     def can_send_new(self):
         return self.created_at + timedelta(minutes=2) < timezone.now()
     
+
+
+class Job(Model):
+    """A unit of background work run by `manage.py run_jobs`, see apps/jobs.py."""
+    name = CharField(max_length=100)
+    payload = JSONField(default=dict)
+    run_at = DateTimeField(default=timezone.now)
+    attempts = IntegerField(default=0)
+    # the claim token of the worker holding the job until run_at
+    claimed_by = CharField(max_length=32, null=True, blank=True)
+    failed = BooleanField(default=False)
+    last_error = TextField(blank=True, default='')
+    created_at = DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [Index(fields=['run_at', 'id'], condition=Q(failed=False), name='job_due_idx')]
+
+    def __str__(self):
+        return f"{self.name} #{self.id}"
@@ -0,0 +1,92 @@
+"""
+Notifications about appointment events.
+
+Saving an appointment that is new or changed status enqueues one
+APPOINTMENT_EVENT job (apps/signals.py) and nothing else; the job workers turn
+batches of events into Notification rows with a single bulk_create, through
+apps/inbox.py, which counts them unread. Reminders arrive the same way, as
+APPOINTMENT_REMINDERS jobs from apps/reminders.py.
+"""
+from django.utils import timezone
+
+from apps import inbox
+from apps.jobs import handler
+from apps.models import Appointment, Notification
+from apps.reminders import APPOINTMENT_REMINDERS
+
+APPOINTMENT_EVENT = 'appointment_event'
+
+Status = Appointment.Status
+
+NOTIFICATION_TYPES = {
+    Status.PENDING: Notification.Status.BOOKING,
+    Status.APPROVED: Notification.Status.BOOKING,
+    Status.MOVED: Notification.Status.BOOKING,
+    Status.REJECTED: Notification.Status.CANCELLED,
+    Status.CANCELED: Notification.Status.CANCELLED,
+}
+
+OUTCOMES = {
+    Status.PENDING: 'is waiting for approval',
+    Status.APPROVED: 'was approved',
+    Status.MOVED: 'was moved',
+    Status.REJECTED: 'was rejected',
+    Status.CANCELED: 'was canceled',
+}
+
+
+def appointment_event(appointment, previous_status):
+    """The payload of the job announcing `appointment`'s new status, None when there is nothing to announce."""
+    if appointment.status == previous_status:
+        return None
+    return {'appointment': appointment.pk, 'status': appointment.status, 'created': previous_status is None}
+
+
+def recipients(appointment, event):
+    # the specialist hears about new bookings and cancellations, the client about everything
+    if event['created'] or event['status'] == Status.CANCELED:
+        return {appointment.client_id_id, appointment.specialist_id_id}
+    return {appointment.client_id_id}
+
+
+def message(appointment, event):
+    when = (timezone.localtime(appointment.start_time).strftime('%Y-%m-%d %H:%M')
+            if appointment.start_time else 'a time to be agreed')
+    if event['created']:
+        return f"New appointment for {appointment.service_id.name} on {when}."
+    return f"Appointment for {appointment.service_id.name} on {when} {OUTCOMES[event['status']]}."
+
+
+@handler(APPOINTMENT_EVENT)
+def notify_appointment_events(events):
+    appointments = Appointment.objects.select_related('service_id').in_bulk({event['appointment'] for event in events})
+    inbox.create(
+        (Notification(user_id_id=user_id, type=NOTIFICATION_TYPES[event['status']],
+                      message=message(appointments[event['appointment']], event))
+         # appointments deleted since the event have nobody left to tell
+         for event in events if event['appointment'] in appointments
+         for user_id in recipients(appointments[event['appointment']], event))
+    )
+
+
+def duration(minutes):
+    for unit, size in (('day', 24 * 60), ('hour', 60), ('minute', 1)):
+        if minutes >= size and minutes % size == 0:
+            return f"{minutes // size} {unit}{'s' if minutes != size else ''}"
+    return f"{minutes} minutes"
+
+
+@handler(APPOINTMENT_REMINDERS)
+def send_appointment_reminders(batches):
+    reminders = [reminder for batch in batches for reminder in batch['reminders']]
+    appointments = (Appointment.objects.select_related('service_id')
+                    .filter(status=Appointment.Status.APPROVED)
+                    .in_bulk({appointment_id for appointment_id, _ in reminders}))
+    inbox.create(
+        (Notification(user_id_id=appointments[appointment_id].client_id_id, type=Notification.Status.REMINDER,
+                      message=f"Reminder: your appointment for {appointments[appointment_id].service_id.name} "
+                              f"starts in {duration(offset)}, at "
+                              f"{timezone.localtime(appointments[appointment_id].start_time):%Y-%m-%d %H:%M}.")
+         # approved when the reminder was scheduled; skipped when that is no longer so
+         for appointment_id, offset in reminders if appointment_id in appointments)
+    )
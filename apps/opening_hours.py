@@ -0,0 +1,120 @@
+"""
+Business opening hours: the canonical JSON schema and its compiled form.
+
+Canonical `Business.opening_hours` maps lowercase weekday names to sorted,
+non-overlapping [open, close] pairs of "HH:MM" strings:
+
+    {"monday": [["09:00", "13:00"], ["14:00", "18:00"]], "saturday": [["22:00", "02:00"]]}
+
+Days that are missing or empty are closed. "24:00" closes at midnight and an
+interval that closes at or before its opening time runs past midnight into
+the next day (Sunday into Monday). Input may also use three-letter day names
+and "HH:MM-HH:MM" strings.
+
+Every business keeps its week compiled into OpeningInterval rows of
+[start_minute, end_minute) minutes since Monday 00:00, local time, so "open at
+T" is one indexed range lookup instead of parsing every business's JSON.
+"""
+import re
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+TIME = re.compile(r'^(\d{1,2}):(\d{2})$')
+
+
+def _weekday(key):
+    name = str(key).strip().lower()
+    for weekday in WEEKDAYS:
+        if name in (weekday, weekday[:3]):
+            return weekday
+    raise ValidationError(f'Unknown weekday "{key}".')
+
+
+def _minutes(value):
+    match = TIME.match(str(value).strip())
+    if not match:
+        raise ValidationError(f'Invalid time "{value}", use HH:MM.')
+    hours, minutes = int(match.group(1)), int(match.group(2))
+    if minutes > 59 or hours > 24 or (hours == 24 and minutes):
+        raise ValidationError(f'Invalid time "{value}", use HH:MM.')
+    return hours * 60 + minutes
+
+
+def _format(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def _day_intervals(value):
+    if not isinstance(value, (list, tuple)):
+        raise ValidationError('Opening hours of a day must be a list of [open, close] pairs.')
+    intervals = []
+    for interval in value:
+        if isinstance(interval, str):
+            interval = interval.split('-')
+        if not isinstance(interval, (list, tuple)) or len(interval) != 2:
+            raise ValidationError(f'Invalid interval {interval!r}, use ["HH:MM", "HH:MM"].')
+        opens, closes = _minutes(interval[0]), _minutes(interval[1])
+        if opens == MINUTES_PER_DAY or opens == closes:
+            raise ValidationError(f'Empty interval {interval!r}.')
+        intervals.append((opens, closes))
+    intervals.sort()
+    for (first_open, first_close), (second_open, _) in zip(intervals, intervals[1:]):
+        # an interval closing at or before it opens ends the next day
+        if (first_close if first_close > first_open else first_close + MINUTES_PER_DAY) > second_open:
+            raise ValidationError('Intervals of a day must not overlap.')
+    return intervals
+
+
+def canonical(value):
+    """The canonical form of an opening_hours value, raising ValidationError when it is not one."""
+    if value in (None, {}):
+        return value
+    if not isinstance(value, dict):
+        raise ValidationError('Opening hours must map weekdays to lists of [open, close] pairs.')
+    days = {}
+    for key, intervals in value.items():
+        weekday = _weekday(key)
+        if weekday in days:
+            raise ValidationError(f'"{weekday}" is given twice.')
+        days[weekday] = _day_intervals(intervals)
+    return {weekday: [[_format(opens), _format(closes)] for opens, closes in days[weekday]]
+            for weekday in WEEKDAYS if days.get(weekday)}
+
+
+def validate_opening_hours(value):
+    canonical(value)
+
+
+def week_intervals(value):
+    """Merged [start, end) minute-of-week intervals of a canonical opening_hours value."""
+    intervals = []
+    for day, weekday in enumerate(WEEKDAYS):
+        for opens, closes in (value or {}).get(weekday, ()):
+            start = day * MINUTES_PER_DAY + _minutes(opens)
+            end = day * MINUTES_PER_DAY + _minutes(closes)
+            if end <= start:
+                end += MINUTES_PER_DAY
+            if end > MINUTES_PER_WEEK:
+                intervals.append((0, end - MINUTES_PER_WEEK))
+                end = MINUTES_PER_WEEK
+            intervals.append((start, end))
+
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def minute_of_week(moment):
+    """Minutes since Monday 00:00 of a datetime, in the current time zone."""
+    if timezone.is_aware(moment):
+        moment = timezone.localtime(moment)
+    return moment.weekday() * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
@@ -1,14 +1,247 @@
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.response import Response
+import base64
+import binascii
+import hashlib
+import json
 import math
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator as DjangoPaginator, PageNotAnInteger, EmptyPage
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination, BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+DEFAULT_PAGINATION_COUNT = {
+    'EXACT_THRESHOLD': 10000,
+    'CACHE_TIMEOUT': 300,
+}
+
+
+def get_pagination_count_settings():
+    return {**DEFAULT_PAGINATION_COUNT, **getattr(settings, 'PAGINATION_COUNT', {})}
+
+
+class CountingPaginator(DjangoPaginator):
+    """
+    Counts exactly up to PAGINATION_COUNT['EXACT_THRESHOLD'] rows (with a
+    LIMITed count), and above that uses the Postgres planner estimate or, on
+    other databases, an exact count cached for PAGINATION_COUNT['CACHE_TIMEOUT']
+    seconds. `count_is_exact` tells which one was used.
+    """
+    count_is_exact = True
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+
+        config = get_pagination_count_settings()
+        threshold = config['EXACT_THRESHOLD']
+        bounded = self.object_list.order_by()[:threshold + 1].count()
+        if bounded <= threshold:
+            return bounded
+
+        self.count_is_exact = False
+        queryset = self.object_list.order_by()
+        if connections[queryset.db].vendor == 'postgresql':
+            return max(self.planner_estimate(queryset), threshold + 1)
+        return self.cached_count(queryset, config['CACHE_TIMEOUT'])
+
+    @staticmethod
+    def planner_estimate(queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    @staticmethod
+    def cached_count(queryset, timeout):
+        sql, params = queryset.query.sql_with_params()
+        key = 'pagination:count:' + hashlib.md5(f"{queryset.db}:{sql}:{params!r}".encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, timeout)
+        return count
+
+    def validate_number(self, number):
+        self.count  # decides count_is_exact
+        if self.count_is_exact:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.count_is_exact:
+            return super().page(number)
+        # an estimate must not cut off the last page, so slice without capping at count
+        bottom = (number - 1) * self.per_page
+        page = self._get_page(self.object_list[bottom:bottom + self.per_page], number, self)
+        if not page.object_list and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        return page
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pages on (ordering field, id) with opaque cursors instead of OFFSET, and
+    never counts the rows. The ordering field and direction are taken from the
+    queryset's ordering, so the view's `ordering` and OrderingFilter still apply.
+    The field may be an annotation, like FullTextSearchFilter's `search_rank`,
+    whose cursor value is compared as it was serialized; orderings on anything
+    else (related fields, expressions) page on the primary key.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_results(list(self.page_queryset(queryset, request)))
+
+    def page_queryset(self, queryset, request):
+        """The query for the page the request's cursor points at; its rows go to `paginate_results`."""
+        self.request = request
+        self.model = queryset.model
+        self.annotations = set(queryset.query.annotations)
+        self.field, self.descending = self.get_ordering(queryset)
+        self.base_url = remove_query_param(request.build_absolute_uri(), 'page')
+
+        self.cursor = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        descending = self.descending != self.reverse
+
+        if self.cursor:
+            queryset = queryset.filter(self.after(self.cursor, descending))
+        direction = '-' if descending else ''
+        return queryset.order_by(f'{direction}{self.field}', f'{direction}pk')[:self.page_size + 1]
+
+    @property
+    def reverse(self):
+        return self.cursor['r'] if self.cursor else False
+
+    def paginate_results(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        self.results = results
+        self.has_next = has_more if not self.reverse else True
+        self.has_previous = has_more if self.reverse else self.cursor is not None
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            "items": data,
+            "pageSize": self.page_size,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+        })
+
+    def get_next_link(self):
+        if not self.has_next or not self.results:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   self.encode_cursor(self.results[-1], reverse=False))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.results:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   self.encode_cursor(self.results[0], reverse=True))
+
+    @staticmethod
+    def get_ordering(queryset):
+        ordering = queryset.query.order_by or queryset.model._meta.ordering or ('pk',)
+        field = ordering[0]
+        if not isinstance(field, str):
+            return 'pk', False
+        descending = field.startswith('-')
+        field = field.lstrip('-')
+        if field in ('id', 'pk'):
+            return 'pk', descending
+        if field in queryset.query.annotations:
+            return field, descending
+        try:
+            concrete = queryset.model._meta.get_field(field).concrete
+        except FieldDoesNotExist:
+            concrete = False
+        return (field if concrete else 'pk'), descending
+
+    def after(self, cursor, descending):
+        lookup = 'lt' if descending else 'gt'
+        if self.field == 'pk':
+            return Q(**{f'pk__{lookup}': cursor['id']})
+        value = cursor['v']
+        if self.field in self.annotations:
+            if not isinstance(value, (int, float, str)) or isinstance(value, bool):
+                raise NotFound(self.invalid_cursor_message)
+        else:
+            try:
+                value = self.model._meta.get_field(self.field).to_python(value)
+            except (ValidationError, FieldDoesNotExist):
+                raise NotFound(self.invalid_cursor_message)
+        return Q(**{f'{self.field}__{lookup}': value}) | Q(**{self.field: value, f'pk__{lookup}': cursor['id']})
+
+    def encode_cursor(self, instance, reverse):
+        value = None if self.field == 'pk' else getattr(instance, self.field)
+        payload = {'v': value.isoformat() if hasattr(value, 'isoformat') else value, 'id': instance.pk, 'r': reverse}
+        return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        if not token:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+            if not isinstance(payload, dict) or not {'v', 'id', 'r'} <= payload.keys():
+                raise ValueError
+            if not isinstance(payload['id'], int) or isinstance(payload['id'], bool):
+                raise ValueError
+        except (ValueError, binascii.Error, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return payload
+
+
 class GlobalCustomPagination(PageNumberPagination):
+    django_paginator_class = CountingPaginator
     page_size = 10
     page_size_query_param = 'limit'
     max_page_size = 100
     page_query_param = 'page'
+    pagination_mode_query_param = 'pagination'
+
+    def use_cursor(self, request, view):
+        return (KeysetPagination.cursor_query_param in request.query_params
+                or request.query_params.get(self.pagination_mode_query_param) == 'cursor'
+                or getattr(view, 'pagination_mode', None) == 'cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_cursor(request, view):
+            self.keyset = KeysetPagination(self.get_page_size(request))
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
 
     def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+
         total_count = self.page.paginator.count
         page_size = self.get_page_size(self.request)
         current_page = self.page.number
@@ -21,6 +254,7 @@ class GlobalCustomPagination(PageNumberPagination):
             "pageSize": page_size,
             "totalCount": total_count,
             "totalPages": total_pages,
-            "total": total_count
+            "total": total_count,
+            "totalCountExact": self.page.paginator.count_is_exact
             }
         )
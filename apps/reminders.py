@@ -0,0 +1,131 @@
+"""
+Reminders before approved appointments.
+
+`manage.py run_reminders` keeps the approved appointments starting within the
+next max(REMINDERS['OFFSETS']) minutes in memory, with a heap of the moments
+their reminders are due, one per offset (minutes before the start). Every
+POLL_INTERVAL seconds, and whenever a reminder falls due, it:
+
+- re-reads the appointments whose `updated_at` moved since the previous tick,
+  give or take CHANGE_OVERLAP seconds for clock skew and slow commits;
+- loads the approved appointments whose start entered the horizon since the
+  previous tick;
+- enqueues the due reminders in APPOINTMENT_REMINDERS jobs of up to
+  BATCH_SIZE, which apps/notifications.py turns into Notification rows.
+
+Both reads are range scans on indexes (appointment_updated_at_idx and
+appointment_status_start_idx); the table is never scanned as a whole. A
+cancelled or moved appointment leaves its old heap entries behind; they are
+skipped when they come up, as each entry carries the version of the tracking
+it was made for. Changes made with QuerySet.update(), which leaves
+`updated_at` alone, are not seen.
+
+The time up to which reminders were enqueued is kept in the cache, so a
+restarted scheduler sends the reminders that fell due while it was down, late,
+and none twice.
+"""
+import heapq
+from datetime import timedelta
+from itertools import count
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from apps.jobs import enqueue
+from apps.models import Appointment
+
+APPOINTMENT_REMINDERS = 'appointment_reminders'
+FIRED_UNTIL_KEY = 'reminders:fired_until'
+# heap entry offset that forgets an appointment once it has started
+EXPIRY = -1
+
+DEFAULT_REMINDERS = {
+    'OFFSETS': [24 * 60, 60],
+    'POLL_INTERVAL': 30,
+    'CHANGE_OVERLAP': 5,
+    'BATCH_SIZE': 500,
+}
+
+
+def get_reminder_settings():
+    return {**DEFAULT_REMINDERS, **getattr(settings, 'REMINDERS', {})}
+
+
+class ReminderScheduler:
+    def __init__(self):
+        self.config = get_reminder_settings()
+        self.offsets = sorted(set(self.config['OFFSETS']), reverse=True)
+        # appointment id -> (start_time, version) of the approved appointments within the horizon
+        self.tracked = {}
+        # (due at, appointment id, offset, version of the tracking the entry was made for)
+        self.heap = []
+        self.versions = count()
+        self.changed_since = None
+        self.loaded_until = None
+        self.fired_until = None
+
+    def horizon(self, now):
+        return now + timedelta(minutes=self.offsets[0], seconds=2 * self.config['POLL_INTERVAL'])
+
+    def tick(self, now=None):
+        """Catches up with the database and returns the (appointment id, offset) reminders due at `now`."""
+        now = now or timezone.now()
+        horizon = self.horizon(now)
+        if self.loaded_until is None:
+            self.fired_until = cache.get(FIRED_UNTIL_KEY) or now
+            self.changed_since = now
+            upcoming = Appointment.objects.filter(status=Appointment.Status.APPROVED,
+                                                  start_time__gt=now, start_time__lte=horizon)
+        else:
+            changed = Appointment.objects.filter(
+                updated_at__gte=self.changed_since - timedelta(seconds=self.config['CHANGE_OVERLAP']))
+            self.changed_since = now
+            for row in changed.values_list('id', 'status', 'start_time'):
+                self.track(*row, now, self.loaded_until)
+            upcoming = Appointment.objects.filter(status=Appointment.Status.APPROVED,
+                                                  start_time__gt=self.loaded_until, start_time__lte=horizon)
+        self.loaded_until = horizon
+        for row in upcoming.values_list('id', 'status', 'start_time'):
+            self.track(*row, now, horizon)
+        return self.due(now)
+
+    def track(self, appointment_id, status, start, now, horizon):
+        if status != Appointment.Status.APPROVED or start is None or not now < start <= horizon:
+            start = None
+        if self.tracked.get(appointment_id, (None,))[0] == start:
+            return
+        if start is None:
+            del self.tracked[appointment_id]
+            return
+        version = next(self.versions)
+        self.tracked[appointment_id] = (start, version)
+        for offset in self.offsets:
+            due_at = start - timedelta(minutes=offset)
+            if due_at > self.fired_until:
+                heapq.heappush(self.heap, (due_at, appointment_id, offset, version))
+        heapq.heappush(self.heap, (start, appointment_id, EXPIRY, version))
+
+    def due(self, now):
+        reminders = []
+        while self.heap and self.heap[0][0] <= now:
+            _, appointment_id, offset, version = heapq.heappop(self.heap)
+            if self.tracked.get(appointment_id, (None, None))[1] != version:
+                continue
+            if offset == EXPIRY:
+                del self.tracked[appointment_id]
+            else:
+                reminders.append((appointment_id, offset))
+        self.fired_until = now
+        return reminders
+
+    def next_due(self):
+        return self.heap[0][0] if self.heap else None
+
+    def send(self, reminders):
+        batch_size = self.config['BATCH_SIZE']
+        with transaction.atomic():
+            for start in range(0, len(reminders), batch_size):
+                enqueue(APPOINTMENT_REMINDERS, {'reminders': reminders[start:start + batch_size]})
+        cache.set(FIRED_UNTIL_KEY, self.fired_until, timeout=None)
@@ -0,0 +1,80 @@
+"""
+Daily appointment counters used by the statistics views.
+
+Every appointment is counted once per dimension (service, specialist, client
+and business) in the row for its local `created_at` day and its status. The
+signal handlers in apps/signals.py keep the rows up to date when appointments
+are created, change or are deleted; `manage.py rebuild_rollups` recomputes them
+from scratch after bulk writes that bypass signals.
+"""
+from django.db import transaction, IntegrityError
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+
+from apps.cache import bump_data_version
+from apps.models import (Appointment, Service, DailyServiceStat, DailySpecialistStat, DailyClientStat,
+                         DailyBusinessStat)
+
+ROLLUP_MODELS = (DailyServiceStat, DailySpecialistStat, DailyClientStat, DailyBusinessStat)
+
+
+def _rows(key, business_id):
+    day, service_id, specialist_id, client_id, status = key
+    return (
+        (DailyServiceStat, {'day': day, 'status': status, 'service_id_id': service_id}),
+        (DailySpecialistStat, {'day': day, 'status': status, 'specialist_id_id': specialist_id}),
+        (DailyClientStat, {'day': day, 'status': status, 'client_id_id': client_id}),
+        (DailyBusinessStat, {'day': day, 'status': status, 'business_id_id': business_id}),
+    )
+
+
+def _increment(model, lookup, delta):
+    if model.objects.filter(**lookup).update(total=F('total') + delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(total=delta, **lookup)
+    except IntegrityError:
+        # another request inserted the row first
+        model.objects.filter(**lookup).update(total=F('total') + delta)
+
+
+def apply_change(old_key, new_key):
+    """Moves one appointment from the rollup rows of `old_key` to those of `new_key`."""
+    if old_key == new_key:
+        return
+    service_ids = {key[1] for key in (old_key, new_key) if key}
+    businesses = dict(Service.objects.filter(id__in=service_ids).values_list('id', 'business_id'))
+
+    with transaction.atomic():
+        for key, delta in ((old_key, -1), (new_key, 1)):
+            if key is None or key[1] not in businesses:
+                continue
+            for model, lookup in _rows(key, businesses[key[1]]):
+                _increment(model, lookup, delta)
+        transaction.on_commit(bump_data_version)
+
+
+def rebuild(batch_size=5000):
+    """Recomputes every rollup table from the Appointment table."""
+    appointments = Appointment.objects.annotate(day=TruncDate('created_at')).order_by()
+    dimensions = (
+        (DailyServiceStat, 'service_id', 'service_id'),
+        (DailySpecialistStat, 'specialist_id', 'specialist_id'),
+        (DailyClientStat, 'client_id', 'client_id'),
+        (DailyBusinessStat, 'business_id', 'service_id__business_id'),
+    )
+    with transaction.atomic():
+        for model, field, source in dimensions:
+            model.objects.all().delete()
+            rows = (
+                appointments
+                .values('day', 'status', source)
+                .annotate(total=Count('id'))
+            )
+            model.objects.bulk_create(
+                (model(day=row['day'], status=row['status'], total=row['total'], **{f'{field}_id': row[source]})
+                 for row in rows.iterator(chunk_size=batch_size)),
+                batch_size=batch_size,
+            )
+        transaction.on_commit(bump_data_version)
@@ -0,0 +1,128 @@
+"""
+Ranked full-text search over Business and Service.
+
+Every SearchableModel stores the plain text of its SEARCH_DOCUMENT fields
+(CKEditor HTML reduced to visible text) in `search_document` on save.
+PostgreSQL matches it through a GIN index on
+to_tsvector('simple', search_document); SQLite through the external-content
+FTS5 table <db_table>_fts, which triggers keep in sync with the model table.
+Both are created by `create_search_index` (migration 0011). A migration that
+makes SQLite rebuild the model table drops the triggers with it and has to
+call `create_search_index` again.
+
+Every word of the query is matched as a prefix, so "barb tash" finds
+"Barber shop in Tashkent". Other databases fall back to substring matching
+on the document, without ranking.
+"""
+import html
+import re
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+from rest_framework.settings import api_settings
+
+SEARCH_CONFIG = 'simple'
+
+TAG = re.compile(r'<[^>]*>')
+SPACE = re.compile(r'\s+')
+WORD = re.compile(r'\w+')
+
+
+def plain_text(value):
+    """Visible text of a CKEditor HTML value, with entities decoded and whitespace collapsed."""
+    if not value:
+        return ''
+    return SPACE.sub(' ', html.unescape(TAG.sub(' ', str(value)))).strip()
+
+
+def build_document(instance, fields):
+    return ' '.join(text for text in (plain_text(getattr(instance, field)) for field in fields) if text)
+
+
+def search_words(terms):
+    return WORD.findall(' '.join(terms).lower())
+
+
+def search_vector():
+    return SearchVector('search_document', config=SEARCH_CONFIG)
+
+
+def _fts_table(model):
+    return f'{model._meta.db_table}_fts'
+
+
+def _index_name(model):
+    return f'{model._meta.model_name}_search_idx'
+
+
+def create_search_index(schema_editor, model):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.add_index(model, GinIndex(search_vector(), name=_index_name(model)))
+    elif connection.vendor == 'sqlite':
+        quote = schema_editor.quote_name
+        table, fts = quote(model._meta.db_table), quote(_fts_table(model))
+        drop_search_index(schema_editor, model)
+        schema_editor.execute(f"CREATE VIRTUAL TABLE {fts} USING fts5(search_document, "
+                              f"content={table}, content_rowid='id')")
+        schema_editor.execute(f"CREATE TRIGGER {quote(_fts_table(model) + '_insert')} AFTER INSERT ON {table} "
+                              f"BEGIN INSERT INTO {fts}(rowid, search_document) "
+                              f"VALUES (new.id, new.search_document); END")
+        schema_editor.execute(f"CREATE TRIGGER {quote(_fts_table(model) + '_delete')} AFTER DELETE ON {table} "
+                              f"BEGIN INSERT INTO {fts}({fts}, rowid, search_document) "
+                              f"VALUES ('delete', old.id, old.search_document); END")
+        schema_editor.execute(f"CREATE TRIGGER {quote(_fts_table(model) + '_update')} "
+                              f"AFTER UPDATE OF search_document ON {table} "
+                              f"BEGIN INSERT INTO {fts}({fts}, rowid, search_document) "
+                              f"VALUES ('delete', old.id, old.search_document); "
+                              f"INSERT INTO {fts}(rowid, search_document) VALUES (new.id, new.search_document); END")
+        schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def drop_search_index(schema_editor, model):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(_index_name(model))}")
+    elif connection.vendor == 'sqlite':
+        for suffix in ('_insert', '_delete', '_update'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {schema_editor.quote_name(_fts_table(model) + suffix)}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {schema_editor.quote_name(_fts_table(model))}")
+
+
+def search(queryset, words):
+    """Rows whose document contains every word as a prefix, annotated with `search_rank` (higher is better)."""
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        query = SearchQuery(' & '.join(f'{word}:*' for word in words), config=SEARCH_CONFIG, search_type='raw')
+        return (queryset.alias(search=search_vector()).filter(search=query)
+                .annotate(search_rank=SearchRank(search_vector(), query)))
+    if vendor == 'sqlite':
+        # joined rather than filtered through a subquery: FTS5 computes `rank` (bm25) only within the MATCH query
+        table, fts = queryset.model._meta.db_table, _fts_table(queryset.model)
+        query = ' '.join(f'"{word}"*' for word in words)
+        return (queryset.extra(tables=[fts], where=[f'"{fts}" MATCH %s', f'"{fts}".rowid = "{table}"."id"'],
+                               params=[query])
+                .annotate(search_rank=RawSQL(f'-"{fts}".rank', [])))
+    for word in words:
+        queryset = queryset.filter(search_document__icontains=word)
+    return queryset
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    `?search=` on the model's search document, best matches first unless
+    `?ordering=` is given. Goes after OrderingFilter in `filter_backends`,
+    whose ordering then breaks ties between equally ranked rows.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        words = search_words(self.get_search_terms(request))
+        if not words:
+            return queryset
+        queryset = search(queryset, words)
+        if 'search_rank' in queryset.query.annotations and not request.query_params.get(api_settings.ORDERING_PARAM):
+            queryset = queryset.order_by('-search_rank', *queryset.query.order_by)
+        return queryset
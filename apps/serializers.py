@@ -1,21 +1,58 @@
 import re
+from datetime import timedelta
 
 from django.contrib.auth.password_validation import validate_password
+from django.db.models import Prefetch
 from django.template.context_processors import request
 from rest_framework import status
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
 from rest_framework.exceptions import ValidationError
-from rest_framework.serializers import (ModelSerializer, CharField, Serializer,
-                                        DateField, IntegerField, SerializerMethodField)
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework.serializers import (ModelSerializer, CharField, Serializer, ChoiceField, Field,
+                                        DateField, DateTimeField, FloatField, IntegerField, ListField,
+                                        SerializerMethodField)
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer, \
+    TokenBlacklistSerializer
 
-from apps.models import User, Business, Appointment, Service, SubService, BusinessWorker
+from apps import avatars
+from apps.authentication import USER_CLAIMS
+from apps.fieldsets import Fieldset, SparseFieldsMixin
+from apps.models import (User, Business, Appointment, Service, SubService, BusinessWorker, ServiceBySpecialist,
+                         Notification)
+from apps.tokens import RefreshToken
 
 
-class UserModelSerializer(ModelSerializer):
+def validate_avatar(value):
+    image_format = avatars.sniff(value) if value else None
+    if value and image_format is None:
+        raise ValidationError('Avatar must be a JPEG, PNG or WebP image.')
+    if value:
+        value.name = avatars.canonical_name(value.name, image_format)
+    return value
+
+
+@extend_schema_field(OpenApiTypes.URI)
+class AvatarThumbnailField(Field):
+    """The URL of the user's `variant` avatar thumbnail, or of the original until it is made."""
+
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        super().__init__(source='*', read_only=True, **kwargs)
+
+    def to_representation(self, user):
+        url = avatars.thumbnail_url(user, self.variant)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if url and request else url
+
+
+class UserModelSerializer(SparseFieldsMixin, ModelSerializer):
+    avatar_thumbnail = AvatarThumbnailField('medium')
+
     class Meta:
         model = User
-        fields  = ('id', 'first_name', 'last_name', 'phone_number', 'role', 'avatar',
+        fields  = ('id', 'first_name', 'last_name', 'phone_number', 'role', 'avatar', 'avatar_thumbnail',
                    'created_at', 'password', 'unhashed_password')
+        field_sources = {'avatar_thumbnail': ['avatar', 'avatar_thumbnails']}
         read_only_fields = 'created_at', 'updated_at', 'date_joined', 'unhashed_password'
 
     def validate_phone_number(self, value):
@@ -43,9 +80,7 @@ class UserModelSerializer(ModelSerializer):
         return value
 
     def validate_avatar(self, value):
-        if value and not value.name.lower().endswith(('.jpg', 'jpeg', 'png')):
-            raise ValidationError('Avatar must be an image.')
-        return value
+        return validate_avatar(value)
 
     def create(self, validated_data):
         password = validated_data.pop('password')
@@ -67,18 +102,32 @@ class UserModelSerializer(ModelSerializer):
         instance.save()
         return instance
 
-class BusinessModelSerializer(ModelSerializer):
+class BusinessModelSerializer(SparseFieldsMixin, ModelSerializer):
     class Meta:
         model = Business
-        fields = '__all__'
+        exclude = ('search_document', 'geohash')
         read_only_fields = 'created_at', 'updated_at'
+        expandable = ('services',)
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fieldset=None):
+        fieldset = fieldset or Fieldset()
+        queryset = cls.sparse(queryset, fieldset)
+        if not fieldset.expands('services'):
+            return queryset
+        services = ServiceModelSerializer.setup_eager_loading(Service.objects.all(), fieldset.nested('services'))
+        return queryset.prefetch_related(Prefetch('services', queryset=services))
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data['services'] = ServiceModelSerializer(instance.services.all(),many=True).data
+        if self.fieldset.expands('services'):
+            data['services'] = ServiceModelSerializer(instance.services.all(), many=True,
+                                                      fieldset=self.fieldset.nested('services')).data
         return data
 
 class SpecialistModelSerializer(ModelSerializer):
+    avatar = AvatarThumbnailField('small')
+
     class Meta:
         model = User
         fields = ["id", "first_name", "last_name", "phone_number", "avatar"]
@@ -91,7 +140,7 @@ class BusinessWorkerSerializer(ModelSerializer):
         fields = ["id", "specialist", "position", "bio", "years_of_experience"]
         read_only_fields = ['created_at', 'updated_at']
 
-class AppointmentModelSerializer(ModelSerializer):
+class AppointmentModelSerializer(SparseFieldsMixin, ModelSerializer):
     specialist_name = SerializerMethodField()
     client_name = SerializerMethodField()
     service_name = SerializerMethodField()
@@ -100,10 +149,45 @@ class AppointmentModelSerializer(ModelSerializer):
         model = Appointment
         fields = [
             'id', 'created_at', 'updated_at', 'status',
-            'specialist_id', 'client_id', 'service_id',
+            'specialist_id', 'client_id', 'service_id', 'sub_service_id',
+            'start_time', 'end_time',
             'specialist_name', 'client_name', 'service_name'
         ]
         read_only_fields = ('created_at', 'updated_at')
+        field_sources = {
+            'specialist_name': ['specialist_id__first_name', 'specialist_id__last_name'],
+            'client_name': ['client_id__first_name', 'client_id__last_name'],
+            'service_name': ['service_id__name'],
+        }
+        # Appointment.from_db reads them for the rollup key and the status
+        always_load = ('created_at', 'status', 'service_id', 'specialist_id', 'client_id')
+
+    def validate(self, data):
+        start_time = data.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = data.get('end_time', getattr(self.instance, 'end_time', None))
+        sub_service = data.get('sub_service_id', getattr(self.instance, 'sub_service_id', None))
+        specialist = data.get('specialist_id', getattr(self.instance, 'specialist_id', None))
+
+        if start_time and not end_time and sub_service:
+            duration = (ServiceBySpecialist.objects
+                        .filter(specialist_id=specialist, sub_service_id=sub_service)
+                        .values_list('duration', flat=True).first())
+            if duration is None:
+                raise ValidationError('Specialist does not provide this sub service.')
+            data['end_time'] = end_time = start_time + timedelta(minutes=duration)
+
+        if bool(start_time) != bool(end_time):
+            raise ValidationError('Both start_time and end_time are required.')
+        if start_time and end_time <= start_time:
+            raise ValidationError('End time must be later than start time.')
+        return data
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fieldset=None):
+        fieldset = fieldset or Fieldset()
+        related = [relation for name, relation in (('specialist_name', 'specialist_id'), ('client_name', 'client_id'),
+                                                   ('service_name', 'service_id')) if fieldset.includes(name)]
+        return cls.sparse(queryset, fieldset).select_related(*related)
 
     def get_specialist_name(self, obj):
         if obj.specialist_id:
@@ -120,26 +204,58 @@ class AppointmentModelSerializer(ModelSerializer):
             return obj.service_id.name
         return None
 
-class ServiceModelSerializer(ModelSerializer):
+class ServiceModelSerializer(SparseFieldsMixin, ModelSerializer):
     business_title = CharField(source='business_id.name', read_only=True)
     specialists = SerializerMethodField()
     appointments = SerializerMethodField()
 
     class Meta:
             model = Service
-            fields = '__all__'
+            exclude = ('search_document',)
+            expandable = ('specialists', 'appointments', 'sub_services')
+            # what the prefetch of Business.services is matched on
+            always_load = ('business_id',)
+
+    @staticmethod
+    def active_specialists():
+        return (BusinessWorker.objects
+                .filter(is_active=True, specialist_id__role=User.RoleType.SPECIALIST)
+                .select_related('specialist_id'))
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fieldset=None):
+        fieldset = fieldset or Fieldset()
+        queryset = cls.sparse(queryset, fieldset)
+        if fieldset.includes('business_title'):
+            queryset = queryset.select_related('business_id')
+        prefetches = []
+        if fieldset.expands('sub_services'):
+            prefetches.append('sub_services')
+        if fieldset.expands('specialists'):
+            prefetches.append(Prefetch('business_workers', queryset=cls.active_specialists(), to_attr='active_workers'))
+        if fieldset.expands('appointments'):
+            appointments = AppointmentModelSerializer.setup_eager_loading(Appointment.objects.all(),
+                                                                          fieldset.nested('appointments'))
+            prefetches.append(Prefetch('appointments', queryset=appointments))
+        return queryset.prefetch_related(*prefetches)
 
     def get_specialists(self, obj):
-        specialists = BusinessWorker.objects.filter(service_id_id = obj, is_active = True,
-                                                    specialist_id__role = User.RoleType.SPECIALIST)
+        specialists = getattr(obj, 'active_workers', None)
+        if specialists is None:
+            specialists = self.active_specialists().filter(service_id=obj)
         return BusinessWorkerSerializer(specialists, many=True).data
+
     def get_appointments(self, obj):
-        appointments = Appointment.objects.filter(service_id_id = obj)
-        return AppointmentModelSerializer(appointments, many=True).data
+        appointments = obj.appointments.all()
+        fieldset = self.fieldset.nested('appointments')
+        if 'appointments' not in getattr(obj, '_prefetched_objects_cache', {}):
+            appointments = AppointmentModelSerializer.setup_eager_loading(appointments, fieldset)
+        return AppointmentModelSerializer(appointments, many=True, fieldset=fieldset).data
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data['sub services'] = SubServiceModelSerializer(instance.sub_services, many=True).data
+        if self.fieldset.expands('sub_services'):
+            data['sub services'] = SubServiceModelSerializer(instance.sub_services.all(), many=True).data
         return data
 
 class SubServiceModelSerializer(ModelSerializer):
@@ -160,7 +276,48 @@ class AppointmentStatsSerializer(Serializer):
 
         return data
 
-class BusinessWorkerModelSerializer(ModelSerializer):
+class AvailabilityQuerySerializer(Serializer):
+    specialist = IntegerField()
+    sub_service = IntegerField()
+    start = DateField()
+    end = DateField(required=False)
+
+    max_days = 62
+
+    def validate(self, data):
+        data.setdefault('end', data['start'])
+        if data['end'] < data['start']:
+            raise ValidationError('End date must be greater than or equal to start date.')
+        if (data['end'] - data['start']).days >= self.max_days:
+            raise ValidationError(f'At most {self.max_days} days can be requested at once.')
+        return data
+
+class SlotSerializer(Serializer):
+    start = DateTimeField()
+    end = DateTimeField()
+
+class AvailabilitySerializer(Serializer):
+    specialist_id = IntegerField()
+    sub_service_id = IntegerField()
+    duration = IntegerField()
+    slots = SlotSerializer(many=True)
+
+class EarliestAvailabilityQuerySerializer(Serializer):
+    business = IntegerField()
+    sub_service = IntegerField()
+    start = DateField(required=False)
+    days = IntegerField(default=14, min_value=1, max_value=AvailabilityQuerySerializer.max_days)
+    limit = IntegerField(default=5, min_value=1, max_value=50)
+
+class SpecialistSlotSerializer(SlotSerializer):
+    specialist_id = IntegerField()
+
+class EarliestAvailabilitySerializer(Serializer):
+    business_id = IntegerField()
+    sub_service_id = IntegerField()
+    slots = SpecialistSlotSerializer(many=True)
+
+class BusinessWorkerModelSerializer(SparseFieldsMixin, ModelSerializer):
     class Meta:
         model = BusinessWorker
         fields = '__all__'
@@ -189,6 +346,16 @@ class TopSpecialistSerializer(Serializer):
     total_appointments = IntegerField()
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        # lets CachedJWTAuthentication build the user without a query in its stateless mode
+        token = super().get_token(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
     def validate(self, attrs):
         data = super().validate(attrs)
 
@@ -206,6 +373,9 @@ class UserUpdateSerializer(ModelSerializer):
             "avatar",
         ]
 
+    def validate_avatar(self, value):
+        return validate_avatar(value)
+
     def validate_phone_number(self, value):
         pattern = r'^\+?998[0-9]{9}$'
         if not re.match(pattern, value):
@@ -224,14 +394,42 @@ class OtpTokenSerializer(Serializer):
     code = CharField()
 
 
-    # class CustomTokenRefreshSerializer(TokenRefreshSerializer):
-#     def validate(self, attrs):
-#         data = super().validate(attrs)
-#
-#         return {
-#             "status_code": status.HTTP_200_OK,
-#             "message": "Token refreshed successfully",
-#             # "access": data.get("access"),
-#             # "refresh": attrs.get("refresh")
-#         }
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RefreshToken
+
+
+class CustomTokenBlacklistSerializer(TokenBlacklistSerializer):
+    token_class = RefreshToken
+
+
+class NearbyQuerySerializer(Serializer):
+    latitude = FloatField(min_value=-90, max_value=90)
+    longitude = FloatField(min_value=-180, max_value=180)
+    radius = FloatField(default=5, min_value=0.01, max_value=50, help_text='kilometres')
+    type = ChoiceField(choices=Business.Type.choices, required=False)
+    limit = IntegerField(default=20, min_value=1, max_value=100)
+
+class NearbyBusinessSerializer(ModelSerializer):
+    distance = SerializerMethodField(help_text='kilometres')
+
+    class Meta:
+        model = Business
+        fields = ['id', 'name', 'type', 'address', 'latitude', 'longitude', 'contact', 'distance']
+
+    def get_distance(self, obj) -> float:
+        return round(obj.distance, 3)
+
+
+class NotificationModelSerializer(ModelSerializer):
+    class Meta:
+        model = Notification
+        fields = ['id', 'type', 'message', 'is_read', 'created_at']
+
+
+class NotificationReadSerializer(Serializer):
+    ids = ListField(child=IntegerField(), required=False, max_length=1000,
+                    help_text='the notifications to mark read; all of them when left out')
+
 
+class UnreadCountSerializer(Serializer):
+    unread = IntegerField()
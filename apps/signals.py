@@ -0,0 +1,65 @@
+import copy
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings
+
+from apps import avatars, rollups
+from apps.authentication import user_cache
+from apps.jobs import enqueue
+from apps.models import Appointment, Business, OpeningInterval, User
+from apps.notifications import APPOINTMENT_EVENT, appointment_event
+from apps.opening_hours import week_intervals
+
+
+@receiver(post_save, sender=Appointment)
+def update_appointment_rollups(sender, instance, **kwargs):
+    new_key = instance.rollup_key()
+    rollups.apply_change(getattr(instance, '_loaded_rollup_key', None), new_key)
+    instance._loaded_rollup_key = new_key
+
+
+@receiver(post_save, sender=Appointment)
+def enqueue_appointment_notifications(sender, instance, created, **kwargs):
+    event = appointment_event(instance, None if created else getattr(instance, '_loaded_status', instance.status))
+    if event is not None:
+        enqueue(APPOINTMENT_EVENT, event)
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=Appointment)
+def remove_appointment_from_rollups(sender, instance, **kwargs):
+    old_key = getattr(instance, '_loaded_rollup_key', None) or instance.rollup_key()
+    rollups.apply_change(old_key, None)
+    instance._loaded_rollup_key = None
+
+
+@receiver(post_save, sender=Business)
+def compile_opening_hours(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'opening_hours' not in update_fields:
+        return
+    if 'opening_hours' in instance.get_deferred_fields():
+        return
+    if instance.opening_hours == getattr(instance, '_loaded_opening_hours', None):
+        return
+    OpeningInterval.objects.filter(business_id=instance).delete()
+    OpeningInterval.objects.bulk_create(
+        OpeningInterval(business_id=instance, start_minute=start, end_minute=end)
+        for start, end in week_intervals(instance.opening_hours)
+    )
+    instance._loaded_opening_hours = copy.deepcopy(instance.opening_hours)
+
+
+@receiver([post_save, post_delete], sender=User)
+def forget_authenticated_user(sender, instance, **kwargs):
+    user_cache.invalidate(getattr(instance, api_settings.USER_ID_FIELD))
+
+
+@receiver(post_save, sender=User)
+def enqueue_avatar_thumbnails(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'avatar' not in update_fields:
+        return
+    if {'avatar', 'avatar_thumbnails'} & instance.get_deferred_fields():
+        return
+    if avatars.needs_thumbnails(instance):
+        enqueue(avatars.AVATAR_THUMBNAILS, {'user': instance.pk, 'avatar': instance.avatar.name})
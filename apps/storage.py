@@ -0,0 +1,45 @@
+"""
+Uploads stored under content-hashed names.
+
+HashedFileSystemStorage saves `users/me.jpg` as `users/me.<hash>.jpg`, the
+hash being the first HASH_LENGTH hex digits of the content's BLAKE2b digest.
+A name therefore never stands for two different contents, even after the
+file is deleted and something else is uploaded as `me.jpg`, and
+apps/views/media_views.py lets clients cache such files forever. When the
+same content is saved twice under one name, FileSystemStorage's suffix
+follows the hash and the name stays immutable.
+"""
+import hashlib
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASH_LENGTH = 12
+HASHED_NAME = re.compile(rf'\.([0-9a-f]{{{HASH_LENGTH}}})(?:_[A-Za-z0-9]{{7}})?(?:\.[^./]*)?$')
+
+
+def content_hash(name):
+    """The content hash in a name given by HashedFileSystemStorage, None for other names."""
+    match = HASHED_NAME.search(name)
+    return match.group(1) if match else None
+
+
+class HashedFileSystemStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.blake2b()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        root, ext = posixpath.splitext(name)
+        hashed = f".{digest.hexdigest()[:HASH_LENGTH]}{ext}"
+        if max_length is not None:
+            # FileSystemStorage shortens long names at the end of the root, which is where the hash goes;
+            # 8 characters are left for its collision suffix
+            root = root[:max_length - len(hashed) - 8]
+        return super().save(root + hashed, content, max_length)
@@ -1,3 +1,1292 @@
-from django.test import TestCase
+import base64
+import json
+import math
+import shutil
+import tempfile
+import time as time_module
+from datetime import date, datetime, time, timedelta
+from io import BytesIO
+from itertools import count, cycle
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from PIL import Image
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count, Sum
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import URLResolver, get_resolver
+from rest_framework.routers import APIRootView
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps import avatars, inbox, jobs, rollups, tokens
+from apps.authentication import user_cache
+from apps.cache import get_or_compute, data_version, bump_data_version, _params_digest as _params_key
+from apps.models import (Job, User, Business, Service, SubService, BusinessWorker, Appointment,
+                         ServiceBySpecialist, Notification, NotificationCounter, PhoneOTP, DailyServiceStat,
+                         DailySpecialistStat, WorkSchedule, TimeOff, BookingLock, OpeningInterval)
+from apps.availability import merge, subtract, free_slots, earliest_slots
+from apps.management.commands.seed_data import manual_timestamps
+from apps.middleware import QueryBudgetExceeded
+from apps.opening_hours import canonical, week_intervals
+from apps.pagination import KeysetPagination
+from apps.reminders import ReminderScheduler
+from apps.serializers import CustomTokenObtainPairSerializer, UserModelSerializer, SpecialistModelSerializer
+from apps.views.adminViews import GetMe
+from utils import geohash
+from utils.otp_service import CacheOTPStore, DatabaseOTPStore, OTPError
+
+_phones = count(1000000)
+# the project's cache, before BookingTestCase swaps it for LocMemCache
+CONFIGURED_CACHES = settings.CACHES
+
+
+def _views(pattern):
+    if isinstance(pattern, URLResolver):
+        for child in pattern.url_patterns:
+            yield from _views(child)
+    else:
+        yield pattern.callback
+
+
+def make_user(role=User.RoleType.CLIENT, **extra):
+    return User.objects.create(phone_number=f"+998901{next(_phones)}", role=role,
+                               first_name='Test', last_name=role, **extra)
+
+
+def seed(size):
+    """Creates `size` businesses, each with `size` services, and `size` appointments per service."""
+    client = make_user()
+    for i in range(size):
+        business = Business.objects.create(name=f"Business {i}", type=Business.Type.CLINIC,
+                                           address='Tashkent', is_active=True)
+        for j in range(size):
+            service = Service.objects.create(name=f"Service {j}", business_id=business)
+            specialist = make_user(User.RoleType.SPECIALIST)
+            sub_service = SubService.objects.create(name=f"Sub service {j}", service_id=service,
+                                                    specialist_id=specialist)
+            ServiceBySpecialist.objects.create(specialist_id=specialist, sub_service_id=sub_service,
+                                               price=100000, duration=30)
+            BusinessWorker.objects.create(specialist_id=specialist, service_id=service, position='Master')
+            Appointment.objects.bulk_create(
+                Appointment(specialist_id=specialist, client_id=client, service_id=service,
+                            status=Appointment.Status.APPROVED)
+                for _ in range(size)
+            )
+    rollups.rebuild()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class BookingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.invalidate()
+        tokens.blacklist_snapshot.clear()
+
+
+@override_settings(QUERY_BUDGET={'HEADERS': True, 'ON_EXCEED': 'raise', 'DEFAULT': None})
+class QueryBudgetTest(BookingTestCase):
+    """Every endpoint has to stay within its declared budget and must not grow with the data."""
+    sizes = (1, 3, 6)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = make_user(User.RoleType.ADMIN)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def urls(self):
+        business = Business.objects.first()
+        service = Service.objects.first()
+        appointment = Appointment.objects.first()
+        worker = BusinessWorker.objects.first()
+        today = date.today().isoformat()
+        return [
+            '/api/v1/admin/users/',
+            f'/api/v1/admin/users/{self.user.pk}/',
+            '/api/v1/admin/business/',
+            f'/api/v1/admin/business/{business.pk}/',
+            '/api/v1/admin/appointments/',
+            f'/api/v1/admin/appointments/{appointment.pk}/',
+            '/api/v1/admin/services/',
+            f'/api/v1/admin/services/{service.pk}/',
+            '/api/v1/admin/business-workers/',
+            f'/api/v1/admin/business-workers/{worker.pk}/',
+            f'/api/v1/statistics/?start={today}',
+            '/api/v1/top-services/',
+            '/api/v1/top-clients/',
+            '/api/v1/top-businesses/',
+            '/api/v1/top-specialists/',
+            f'/api/v1/earliest-availability/?business={business.pk}&sub_service={SubService.objects.first().pk}',
+            '/api/v1/nearby/?latitude=41.3&longitude=69.25&radius=20',
+            '/api/v1/get-me/',
+            '/api/v1/notifications/',
+            '/api/v1/notifications/unread-count/',
+        ]
+
+    def query_counts(self):
+        counts = {}
+        # steady state: the authenticated user is already in the per-process cache
+        self.client.get('/api/v1/get-me/')
+        for url in self.urls():
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertIn('X-Query-Budget', response, f"{url} has no query budget")
+            counts[url] = int(response['X-Query-Count'])
+        unread = list(Notification.objects.filter(user_id=self.user, is_read=False).values_list('id', flat=True))
+        response = self.client.post('/api/v1/notifications/read/', {'ids': unread}, format='json')
+        self.assertEqual(response.status_code, 200)
+        counts['/api/v1/notifications/read/'] = int(response['X-Query-Count'])
+        return counts
+
+    def test_queries_do_not_grow_with_data(self):
+        baseline = None
+        for size in self.sizes:
+            seed(size)
+            inbox.create(Notification(user_id=self.user, message='Booked', type=Notification.Status.BOOKING)
+                         for _ in range(size))
+            cache.clear()
+            counts = self.query_counts()
+            if baseline is None:
+                baseline = counts
+            self.assertEqual(counts, baseline, f"query counts changed at size {size}")
+
+    def test_every_route_declares_a_budget(self):
+        for pattern in get_resolver('apps.urls').url_patterns:
+            for view in _views(pattern):
+                view_class = getattr(view, 'cls', None) or getattr(view, 'view_class', None)
+                if view_class is None or issubclass(view_class, APIRootView):
+                    continue
+                self.assertIsNotNone(getattr(view_class, 'query_budget', None), view_class.__name__)
+
+    def test_write_endpoints_stay_within_budget(self):
+        self.user.set_password('secret1')
+        self.user.save()
+        response = self.client.post('/api/v1/token/', {'phone_number': self.user.phone_number,
+                                                       'password': 'secret1'})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.patch('/api/v1/user-update/', {'first_name': 'Updated'})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post('/api/v1/change-phone/', {'new_phone_number': '+998901234567'})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post('/api/v1/verify-phone/', {'code': response.data['code']})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post('/api/v1/notifications/read/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_budget_exceeded_raises(self):
+        with patch.object(GetMe, 'query_budget', 0), self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/api/v1/get-me/')
+
+
+class AppointmentRollupTest(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        seed(2)
+        self.service = Service.objects.first()
+        self.specialist = BusinessWorker.objects.filter(service_id=self.service).first().specialist_id
+        self.client_user = make_user()
+
+    def snapshot(self):
+        return {
+            model.__name__: sorted(model.objects.filter(total__gt=0).values_list(
+                'day', model._meta.constraints[0].fields[1], 'status', 'total'))
+            for model in rollups.ROLLUP_MODELS
+        }
+
+    def book(self, **extra):
+        return Appointment.objects.create(service_id=self.service, specialist_id=self.specialist,
+                                          client_id=self.client_user, **extra)
+
+    def test_signals_match_rebuild(self):
+        pending = self.book()
+        approved = self.book(status=Appointment.Status.APPROVED)
+        self.book(status=Appointment.Status.MOVED)
+
+        pending.status = Appointment.Status.APPROVED
+        pending.save()
+        approved = Appointment.objects.get(pk=approved.pk)
+        approved.status = Appointment.Status.CANCELED
+        approved.save(update_fields=['status'])
+        Appointment.objects.filter(pk=approved.pk).first().delete()
+
+        incremental = self.snapshot()
+        rollups.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_statistics_views_answer_from_rollups(self):
+        self.book(status=Appointment.Status.APPROVED)
+        service_totals = {row['service_id']: row['total'] for row in self.client.get('/api/v1/top-services/').data}
+        self.assertEqual(service_totals[self.service.pk], Appointment.objects.filter(service_id=self.service).count())
+
+        today = timezone.localdate().isoformat()
+        statistics = self.client.get(f'/api/v1/statistics/?start={today}').data['statistics']
+        self.assertEqual(sum(row['total_appointments'] for row in statistics), Appointment.objects.count())
+
+        specialists = {row['specialist_id']: row['total_appointments']
+                       for row in self.client.get('/api/v1/top-specialists/').data}
+        self.assertEqual(specialists[self.specialist.pk], Appointment.objects.filter(
+            specialist_id=self.specialist, status=Appointment.Status.APPROVED).count())
+
+
+class StatisticsCacheTest(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        seed(1)
+        self.params = QueryDict('limit=10')
+
+    def test_cached_until_data_changes(self):
+        first = self.client.get('/api/v1/top-services/').data
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/v1/top-services/').data, first)
+
+        version = data_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.create(service_id=Service.objects.first(), client_id=make_user(),
+                                       specialist_id=BusinessWorker.objects.first().specialist_id)
+        self.assertGreater(data_version(), version)
+        self.assertEqual(self.client.get('/api/v1/top-services/').data[0]['total'], first[0]['total'] + 1)
+
+    def test_stale_result_served_while_another_worker_recomputes(self):
+        self.assertEqual(get_or_compute('view', self.params, lambda: 'old'), 'old')
+        bump_data_version()
+        cache.add(f"statistics:view:{_params_key(self.params)}:v{data_version()}:lock", 1)
+
+        self.assertEqual(get_or_compute('view', self.params, lambda: 'new'), 'old')
+        cache.clear()
+        self.assertEqual(get_or_compute('view', self.params, lambda: 'new'), 'new')
+
+    def test_version_outlives_the_default_timeout_of_the_configured_cache(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        with override_settings(CACHES={'default': {**CONFIGURED_CACHES['default'], 'LOCATION': location}}):
+            bump_data_version()
+            version = data_version()
+            bump_data_version()
+            bumped = data_version()
+            self.assertGreater(bumped, version)
+            with patch('time.time', return_value=time_module.time() + 3600):
+                self.assertEqual(data_version(), bumped)
+
+    def test_version_moves_forward_when_the_clock_is_behind(self):
+        bump_data_version()
+        version = data_version()
+        with patch('time.time_ns', return_value=version - 10 ** 9):
+            bump_data_version()
+        self.assertGreater(data_version(), version)
+
+
+class KeysetPaginationTest(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        seed(3)
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('totalCount', response.data)
+            pages.append([item['id'] for item in response.data['items']])
+            url = response.data[link]
+        return pages
+
+    def test_forward_and_backward_follow_the_view_ordering(self):
+        for ordering in ('created_at', '-created_at'):
+            expected = list(Appointment.objects.order_by(ordering, ordering.replace('created_at', 'id'))
+                            .values_list('id', flat=True))
+            forward = self.walk(f'/api/v1/admin/appointments/?pagination=cursor&limit=4&ordering={ordering}',
+                                'next')
+            self.assertEqual(sum(forward, []), expected)
+
+            last_page = self.client.get(f'/api/v1/admin/appointments/?pagination=cursor&limit=4'
+                                        f'&ordering={ordering}&cursor={self.cursor_after(expected[-5])}')
+            backward = self.walk(last_page.data['previous'], 'previous')
+            self.assertEqual(sum(reversed(backward), []), expected[:-4])
+
+    def cursor_after(self, appointment_id):
+        paginator = KeysetPagination(4)
+        paginator.field = 'created_at'
+        return paginator.encode_cursor(Appointment.objects.get(pk=appointment_id), reverse=False)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/v1/admin/appointments/?cursor=garbage').status_code, 404)
+
+
+class ApproximateCountTest(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        seed(3)
+        self.total = Appointment.objects.count()
+
+    def test_exact_below_threshold(self):
+        data = self.client.get('/api/v1/admin/appointments/?limit=5').data
+        self.assertTrue(data['totalCountExact'])
+        self.assertEqual(data['totalCount'], self.total)
+
+    @override_settings(PAGINATION_COUNT={'EXACT_THRESHOLD': 10, 'CACHE_TIMEOUT': 60})
+    def test_cached_count_above_threshold(self):
+        data = self.client.get('/api/v1/admin/appointments/?limit=5').data
+        self.assertFalse(data['totalCountExact'])
+        self.assertEqual(data['totalCount'], self.total)
+
+        Appointment.objects.filter(pk=Appointment.objects.first().pk).delete()
+        with self.assertNumQueries(2):
+            data = self.client.get('/api/v1/admin/appointments/?limit=5').data
+        self.assertEqual(data['totalCount'], self.total)
+
+        last_page = math.ceil((self.total - 1) / 5)
+        response = self.client.get(f'/api/v1/admin/appointments/?limit=5&page={last_page}')
+        self.assertEqual(len(response.data['items']), (self.total - 1) - (last_page - 1) * 5)
+        self.assertEqual(self.client.get(f'/api/v1/admin/appointments/?limit=5&page={last_page + 2}').status_code,
+                         404)
+
+
+class ExplainPlanTest(BookingTestCase):
+    """
+    Hot query shapes must be answered from an index, not a full table scan,
+    with the planner's default settings. PostgreSQL's planner weighs table
+    sizes, so the rows spread over DAYS days, with few approved appointments,
+    are seeded at the scale where it has to prefer the indexes.
+    """
+    DAYS = 1000
+
+    @classmethod
+    def setUpTestData(cls):
+        rows = 100_000 if connection.vendor == 'postgresql' else 5_000
+        now = timezone.now()
+        seed(4)
+        users = list(User.objects.all())
+        appointments = list(Appointment.objects.all())
+        others = [status for status in Appointment.Status.values if status != Appointment.Status.APPROVED]
+        with manual_timestamps(Appointment, Notification):
+            Appointment.objects.bulk_create(
+                (Appointment(specialist_id=a.specialist_id, client_id=a.client_id, service_id=a.service_id,
+                             status=Appointment.Status.APPROVED if i % 50 == 0 else others[i % len(others)],
+                             created_at=now - timedelta(days=i % cls.DAYS, minutes=i % 1440),
+                             updated_at=now - timedelta(days=i % cls.DAYS, minutes=i % 1440))
+                 for i, a in zip(range(rows), cycle(appointments))),
+                batch_size=1000,
+            )
+            Notification.objects.bulk_create(
+                (Notification(user_id=users[i % len(users)], message='Reminder', type=Notification.Status.REMINDER,
+                              is_read=i % 3 > 0, created_at=now - timedelta(days=i % cls.DAYS),
+                              updated_at=now - timedelta(days=i % cls.DAYS))
+                 for i in range(rows)),
+                batch_size=1000,
+            )
+        PhoneOTP.objects.bulk_create(
+            (PhoneOTP(user=users[i % len(users)], new_phone_number=f"+99890{i:07d}", code='1234')
+             for i in range(rows)),
+            batch_size=1000,
+        )
+        rollups.rebuild()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertIndexScan(self, queryset, table):
+        plan = queryset.explain()
+        if connection.vendor == 'postgresql':
+            self.assertNotRegex(plan, rf'Seq Scan on {table}\b', plan)
+        else:
+            self.assertNotRegex(plan, rf'SCAN {table}(?! USING)', plan)
+
+    def test_hot_queries_use_indexes(self):
+        now = timezone.now()
+        specialist = Appointment.objects.first().specialist_id
+        user = User.objects.first()
+        hot_queries = {
+            'apps_appointment': [
+                Appointment.objects.filter(created_at__gte=now - timedelta(days=7), created_at__lte=now),
+                Appointment.objects.filter(created_at__gt=now - timedelta(days=7)).order_by('created_at', 'id')[:11],
+                (Appointment.objects.filter(status=Appointment.Status.APPROVED)
+                 .values('specialist_id').annotate(total=Count('id'))),
+                Appointment.objects.filter(specialist_id=specialist, status=Appointment.Status.APPROVED),
+            ],
+            'apps_dailyservicestat': [
+                (DailyServiceStat.objects.filter(day__gte=now.date() - timedelta(days=30), day__lte=now.date())
+                 .values('service_id').annotate(total=Sum('total'))),
+            ],
+            'apps_dailyspecialiststat': [
+                (DailySpecialistStat.objects.filter(status=Appointment.Status.APPROVED)
+                 .values('specialist_id').annotate(total=Sum('total'))),
+            ],
+            'apps_phoneotp': [
+                PhoneOTP.objects.filter(new_phone_number='+998901234567').order_by('-created_at')[:1],
+            ],
+            'apps_notification': [
+                Notification.objects.filter(user_id=user, is_read=False).order_by('-created_at'),
+            ],
+        }
+        for table, querysets in hot_queries.items():
+            for queryset in querysets:
+                with self.subTest(query=str(queryset.query)):
+                    self.assertIndexScan(queryset, table)
+
+
+class AvailabilityTest(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        seed(1)
+        self.offer = ServiceBySpecialist.objects.select_related('specialist_id', 'sub_service_id').first()
+        self.specialist = self.offer.specialist_id
+        self.schedule = WorkSchedule.objects.create(specialist_id=self.specialist, start_time=time(9),
+                                                    end_time=time(12))
+        self.day = timezone.localdate() + timedelta(days=1)
+
+    def at(self, day, hour, minute=0):
+        return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+
+    def test_interval_arithmetic(self):
+        self.assertEqual(merge([(5, 8), (0, 3), (3, 4), (7, 9)]), [(0, 4), (5, 9)])
+        self.assertEqual(subtract([(0, 10), (20, 30)], [(2, 4), (8, 22), (25, 40)]), [(0, 2), (4, 8), (22, 25)])
+
+    def test_bookings_and_time_offs_are_subtracted(self):
+        Appointment.objects.create(specialist_id=self.specialist, client_id=make_user(),
+                                   service_id=self.offer.sub_service_id.service_id,
+                                   status=Appointment.Status.APPROVED,
+                                   start_time=self.at(self.day, 10), end_time=self.at(self.day, 10, 45))
+        Appointment.objects.create(specialist_id=self.specialist, client_id=make_user(),
+                                   service_id=self.offer.sub_service_id.service_id,
+                                   status=Appointment.Status.CANCELED,
+                                   start_time=self.at(self.day, 9), end_time=self.at(self.day, 10))
+        TimeOff.objects.create(specialist_id=self.specialist, work_schedule_id=self.schedule,
+                               date=self.day + timedelta(days=1))
+
+        with self.assertNumQueries(4):
+            duration, slots = free_slots(self.specialist.pk, self.offer.sub_service_id.pk,
+                                         self.day, self.day + timedelta(days=1), step=30)
+        self.assertEqual(duration, 30)
+        self.assertEqual([start for start, end in slots],
+                         [self.at(self.day, 9), self.at(self.day, 9, 30), self.at(self.day, 11), self.at(self.day, 11, 30)])
+
+    def test_endpoint(self):
+        url = (f'/api/v1/availability/?specialist={self.specialist.pk}&sub_service={self.offer.sub_service_id.pk}'
+               f'&start={self.day}')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['slots']), (180 - 30) // 15 + 1)
+        self.assertEqual(self.client.get(url.replace(f'specialist={self.specialist.pk}', 'specialist=0')).status_code,
+                         404)
+
+    def test_earliest_slots_across_specialists(self):
+        sub_service = self.offer.sub_service_id
+        business = sub_service.service_id.business_id
+        other = make_user(User.RoleType.SPECIALIST)
+        BusinessWorker.objects.create(specialist_id=other, service_id=sub_service.service_id, position='Master')
+        ServiceBySpecialist.objects.create(specialist_id=other, sub_service_id=sub_service, price=1, duration=60)
+        WorkSchedule.objects.create(specialist_id=other, start_time=time(8), end_time=time(10))
+        retired = make_user(User.RoleType.SPECIALIST)
+        BusinessWorker.objects.create(specialist_id=retired, service_id=sub_service.service_id, position='Master',
+                                      is_active=False)
+        ServiceBySpecialist.objects.create(specialist_id=retired, sub_service_id=sub_service, price=1, duration=15)
+        WorkSchedule.objects.create(specialist_id=retired, start_time=time(0), end_time=time(23))
+        Appointment.objects.create(specialist_id=self.specialist, client_id=make_user(),
+                                   service_id=sub_service.service_id, status=Appointment.Status.PENDING,
+                                   start_time=self.at(self.day, 9), end_time=self.at(self.day, 9, 40))
+
+        with self.assertNumQueries(4):
+            slots = earliest_slots(business.pk, sub_service.pk, self.day, self.day + timedelta(days=3), 4,
+                                   step=30)
+        self.assertEqual(slots, [
+            (other.pk, self.at(self.day, 8), self.at(self.day, 9)),
+            (other.pk, self.at(self.day, 8, 30), self.at(self.day, 9, 30)),
+            (other.pk, self.at(self.day, 9), self.at(self.day, 10)),
+            (self.specialist.pk, self.at(self.day, 10), self.at(self.day, 10, 30)),
+        ])
+        self.assertEqual(earliest_slots(0, sub_service.pk, self.day, self.day, 4), [])
+
+        response = self.client.get(f'/api/v1/earliest-availability/?business={business.pk}'
+                                   f'&sub_service={sub_service.pk}&start={self.day}&limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([slot['specialist_id'] for slot in response.data['slots']], [other.pk, other.pk])
+
+
+@override_settings(QUERY_BUDGET={'HEADERS': True, 'ON_EXCEED': 'raise', 'DEFAULT': None})
+class BookingConflictTest(BookingTestCase):
+    url = '/api/v1/admin/appointments/'
+
+    def setUp(self):
+        super().setUp()
+        seed(1)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(make_user()).access_token}")
+        self.offer = ServiceBySpecialist.objects.select_related('sub_service_id').first()
+        self.day = timezone.localdate() + timedelta(days=1)
+
+    def book(self, hour, minute=0):
+        start = timezone.make_aware(datetime.combine(self.day, time(hour, minute)))
+        return self.client.post(self.url, {
+            'specialist_id': self.offer.specialist_id_id, 'client_id': make_user().pk,
+            'service_id': self.offer.sub_service_id.service_id_id, 'sub_service_id': self.offer.sub_service_id_id,
+            'start_time': start.isoformat(),
+        }, format='json')
+
+    def test_overlapping_bookings_are_rejected(self):
+        first = self.book(10)
+        self.assertEqual(first.status_code, 201)
+        conflict = self.book(10, 15)
+        self.assertEqual(conflict.status_code, 409)
+        self.assertIn('error', conflict.data)
+        self.assertEqual(self.book(10, 30).status_code, 201)
+
+        response = self.client.patch(f"{self.url}{first.data['id']}/", {'status': Appointment.Status.CANCELED})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.book(10, 15).status_code, 409)
+        self.assertEqual(self.book(9, 45).status_code, 201)
+
+    def test_adjacent_bookings_off_the_slot_grid(self):
+        self.assertEqual(self.book(10, 5).status_code, 201)
+        self.assertEqual(self.book(10, 35).status_code, 201)
+        self.assertEqual(self.book(9, 35).status_code, 201)
+        self.assertEqual(self.book(11, 4).status_code, 409)
+        self.assertEqual(self.book(9, 6).status_code, 409)
+        self.assertEqual(BookingLock.objects.get().writes, 3)
+
+    def test_a_held_lock_is_a_conflict_not_a_wait(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('the exclusion constraint takes no BookingLock')
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            default = cursor.fetchone()[0]
+        with patch('django.db.models.query.QuerySet.update', side_effect=OperationalError('database is locked')):
+            self.assertEqual(self.book(10).status_code, 409)
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], default)
+        self.assertEqual(self.book(10).status_code, 201)
+
+    def test_appointments_written_around_the_api_still_conflict(self):
+        start = timezone.make_aware(datetime.combine(self.day, time(12)))
+        Appointment.objects.bulk_create([Appointment(
+            specialist_id_id=self.offer.specialist_id_id, client_id=make_user(),
+            service_id_id=self.offer.sub_service_id.service_id_id, status=Appointment.Status.APPROVED,
+            start_time=start, end_time=start + timedelta(minutes=30))])
+        self.assertEqual(self.book(12, 15).status_code, 409)
+
+
+class AuthUserCacheTest(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user(User.RoleType.SPECIALIST)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def test_users_are_cached_until_they_change(self):
+        self.assertEqual(self.client.get('/api/v1/get-me/').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/v1/get-me/').data['role'], User.RoleType.SPECIALIST)
+
+        self.user.role = User.RoleType.ADMIN
+        self.user.save()
+        self.assertEqual(self.client.get('/api/v1/get-me/').data['role'], User.RoleType.ADMIN)
+
+        # writes authenticate against the current row, not the snapshot
+        User.objects.filter(pk=self.user.pk).update(last_name='Updated')
+        response = self.client.patch('/api/v1/user-update/', {'first_name': 'New'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.first_name, self.user.last_name), ('New', 'Updated'))
+
+        self.user.delete()
+        self.assertEqual(self.client.get('/api/v1/get-me/').status_code, 401)
+
+    def test_bounded_and_expiring(self):
+        other = APIClient()
+        other.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(make_user()).access_token}")
+        with override_settings(AUTH_USER_CACHE={'MAX_SIZE': 1}):
+            self.client.get('/api/v1/get-me/')
+            other.get('/api/v1/get-me/')
+            with self.assertNumQueries(1):
+                self.client.get('/api/v1/get-me/')
+        user_cache.invalidate()
+        with override_settings(AUTH_USER_CACHE={'TIMEOUT': 0}):
+            self.client.get('/api/v1/get-me/')
+            with self.assertNumQueries(1):
+                self.client.get('/api/v1/get-me/')
+
+    @override_settings(AUTH_USER_CACHE={'STATELESS': True})
+    def test_stateless_mode_reads_the_token(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        # no user lookup; the fields that are not claims are loaded together when the serializer reads them
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/v1/get-me/')
+        self.assertEqual(response.data, UserModelSerializer(self.user).data)
+
+
+class TokenBlacklistTest(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.client = APIClient()
+
+    def refresh(self, token):
+        return self.client.post('/api/v1/token/refresh/', {'refresh': str(token)}, format='json').status_code
+
+    def test_blacklist_checks_use_the_snapshot(self):
+        token = tokens.RefreshToken.for_user(self.user)
+        self.assertEqual(self.refresh(token), 200)
+        # the user only, the snapshot was synced by the first refresh
+        with self.assertNumQueries(1):
+            self.assertEqual(self.refresh(token), 200)
+
+        self.client.post('/api/v1/token/blacklist/', {'refresh': str(token)}, format='json')
+        self.assertEqual(self.refresh(token), 401)
+
+        # blacklisted by another process: rejected once the snapshot syncs
+        other = tokens.RefreshToken.for_user(self.user)
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=other['jti']))
+        self.assertEqual(self.refresh(other), 200)
+        with override_settings(TOKEN_BLACKLIST={'SYNC_INTERVAL': 0}):
+            self.assertEqual(self.refresh(other), 401)
+
+    def test_compaction_deletes_only_expired_tokens(self):
+        issued = [tokens.RefreshToken.for_user(self.user) for _ in range(5)]
+        for token in issued[:2]:
+            token.blacklist()
+        OutstandingToken.objects.filter(jti__in=[token['jti'] for token in issued[1:4]]).update(
+            expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(tokens.compact_expired_tokens(batch_size=2), (3, 1))
+        self.assertEqual(sorted(OutstandingToken.objects.values_list('jti', flat=True)),
+                         sorted(token['jti'] for token in (issued[0], issued[4])))
+        self.assertEqual(BlacklistedToken.objects.get().token.jti, issued[0]['jti'])
+
+
+class OTPStoreTest(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.other = make_user(), make_user()
+
+    def check_store(self, store):
+        store.issue(self.user.pk, '+998901111111')
+        self.assertEqual(store.issue(self.other.pk, '+998901111111')[0], None)
+        self.assertGreater(store.issue(self.other.pk, '+998901111111')[1], 100)
+        # a code for another number replaces the user's pending one
+        newer, _ = store.issue(self.user.pk, '+998902222222')
+        with self.assertRaises(OTPError):
+            store.consume(self.user.pk, 'wrong')
+        self.assertEqual(store.consume(self.user.pk, newer), '+998902222222')
+        with self.assertRaises(OTPError) as raised:
+            store.consume(self.user.pk, newer)
+        self.assertEqual(raised.exception.status, 404)
+
+    def test_cache_store_makes_no_queries(self):
+        with self.assertNumQueries(0):
+            self.check_store(CacheOTPStore())
+
+    def test_database_store(self):
+        store = DatabaseOTPStore()
+        self.check_store(store)
+        self.assertFalse(PhoneOTP.objects.filter(user=self.user).exists())
+        code, _ = store.issue(self.other.pk, '+998903333333')
+        PhoneOTP.objects.update(created_at=timezone.now() - timedelta(minutes=6))
+        with self.assertRaisesMessage(OTPError, 'expired'):
+            store.consume(self.other.pk, code)
+        # expired rows are removed by the next request
+        store.issue(self.user.pk, '+998904444444')
+        self.assertEqual(PhoneOTP.objects.count(), 1)
+
+
+class ThrottleTest(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.user.set_password('secret1')
+        self.user.save()
+        self.client = APIClient()
+
+    def login(self, phone_number, ip='10.0.0.1'):
+        return self.client.post('/api/v1/token/', {'phone_number': phone_number, 'password': 'secret1'},
+                                REMOTE_ADDR=ip).status_code
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK,
+                                       'DEFAULT_THROTTLE_RATES': {'token.ip': '3/min', 'token.phone': '2/min'}})
+    def test_limits_are_keyed_by_ip_and_phone(self):
+        self.assertEqual([self.login(self.user.phone_number) for _ in range(3)], [200, 200, 429])
+        # another client is limited by the phone number only
+        self.assertEqual(self.login(self.user.phone_number, ip='10.0.0.2'), 429)
+        self.assertEqual(self.login('+998900000000', ip='10.0.0.2'), 401)
+
+        response = self.client.post('/api/v1/token/', {'phone_number': '+998900000001'}, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK,
+                                       'DEFAULT_THROTTLE_RATES': {'token.ip': '10/min'}})
+    def test_window_slides(self):
+        with patch('apps.throttling.SlidingWindowThrottle.timer', return_value=6000.0):
+            for _ in range(10):
+                self.login('+998900000000')
+        # half way through the next minute half of the previous one still counts
+        with patch('apps.throttling.SlidingWindowThrottle.timer', return_value=6090.0):
+            self.assertEqual([self.login('+998900000000') for _ in range(6)], [401] * 5 + [429])
+        with patch('apps.throttling.SlidingWindowThrottle.timer', return_value=6200.0):
+            self.assertEqual(self.login('+998900000000'), 401)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK,
+                                       'DEFAULT_THROTTLE_RATES': {'token.ip': '3/hour'}})
+    def test_counts_outlive_the_default_timeout_of_the_configured_cache(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        with override_settings(CACHES={'default': {**CONFIGURED_CACHES['default'], 'LOCATION': location}}):
+            now = time_module.time()
+            with patch('apps.throttling.SlidingWindowThrottle.timer', return_value=7200.0 * 1000):
+                self.assertEqual([self.login('+998900000000') for _ in range(3)], [401] * 3)
+            # past the backend's default 300 second timeout, in the same hour
+            with patch('apps.throttling.SlidingWindowThrottle.timer', return_value=7200.0 * 1000 + 600), \
+                    patch('time.time', return_value=now + 600):
+                self.assertEqual(self.login('+998900000000'), 429)
+
+
+class JobQueueTest(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        seed(1)
+        self.appointment = Appointment.objects.get()
+        Job.objects.all().delete()
+
+    def test_appointment_events_become_notifications(self):
+        self.appointment.status = Appointment.Status.CANCELED
+        self.appointment.save()
+        # saving without a status change enqueues nothing
+        self.appointment.save()
+        self.assertEqual(Job.objects.get().payload, {'appointment': self.appointment.pk, 'status': 'canceled',
+                                                     'created': False})
+
+        Appointment.objects.create(specialist_id=self.appointment.specialist_id, client_id=self.appointment.client_id,
+                                   service_id=self.appointment.service_id)
+        self.assertFalse(Notification.objects.exists())
+        # claim (3), then appointments, notifications, their unread counters and the job deletion in one savepoint
+        with self.assertNumQueries(12):
+            self.assertEqual(jobs.run(jobs.claim()), 2)
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(Notification.objects.filter(type=Notification.Status.CANCELLED).count(), 2)
+        self.assertEqual(Notification.objects.filter(type=Notification.Status.BOOKING).count(), 2)
+        self.assertEqual(inbox.unread_count(self.appointment.client_id_id), 2)
+
+    def test_claims_do_not_overlap_and_failures_retry(self):
+        for i in range(5):
+            jobs.enqueue('unknown', {'i': i})
+        first, second = jobs.claim(3), jobs.claim(3)
+        self.assertEqual((len(first), len(second)), (3, 2))
+        self.assertEqual(jobs.claim(), [])
+
+        with override_settings(JOBS={'MAX_ATTEMPTS': 2, 'RETRY_DELAY': 0}), self.assertLogs('apps.jobs'):
+            self.assertEqual(jobs.run(first), 0)
+            retried = jobs.claim()
+            self.assertEqual([job.attempts for job in retried], [2, 2, 2])
+            jobs.run(retried)
+        self.assertEqual(Job.objects.filter(failed=True).count(), 3)
+        self.assertIn('KeyError', Job.objects.filter(failed=True).first().last_error)
+
+
+@override_settings(REMINDERS={'OFFSETS': [120, 30], 'POLL_INTERVAL': 30})
+class ReminderSchedulerTest(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        seed(1)
+        self.start = timezone.now().replace(microsecond=0) + timedelta(hours=3)
+        self.clock = patch('django.utils.timezone.now', return_value=self.start - timedelta(hours=3))
+        self.clock.start()
+        self.addCleanup(self.clock.stop)
+        self.appointment = Appointment.objects.get()
+        self.appointment.status, self.appointment.start_time = Appointment.Status.APPROVED, self.start
+        self.appointment.save()
+        Job.objects.all().delete()
+
+    def at(self, minutes_before_start):
+        timezone.now.return_value = self.start - timedelta(minutes=minutes_before_start)
+        return timezone.now()
+
+    def test_reminders_follow_changes(self):
+        scheduler = ReminderScheduler()
+        self.assertEqual(scheduler.tick(self.at(180)), [])
+        # enters the horizon later, through the start_time range read
+        self.assertEqual(scheduler.tick(self.at(121)), [])
+        self.assertEqual(scheduler.tick(self.at(120)), [(self.appointment.pk, 120)])
+
+        # moved half an hour later, picked up through updated_at: both reminders are due again
+        self.at(100)
+        self.appointment.start_time = self.start + timedelta(minutes=30)
+        self.appointment.save()
+        self.assertEqual(scheduler.tick(self.at(95)), [])
+        self.assertEqual(scheduler.tick(self.at(90)), [(self.appointment.pk, 120)])
+        self.assertEqual(scheduler.tick(self.at(0)), [(self.appointment.pk, 30)])
+
+        self.appointment.status = Appointment.Status.CANCELED
+        self.appointment.save()
+        self.assertEqual(scheduler.tick(self.at(-30)), [])
+        self.assertEqual(scheduler.tracked, {})
+
+    def test_restart_sends_missed_reminders_once(self):
+        scheduler = ReminderScheduler()
+        scheduler.tick(self.at(125))
+        scheduler.send(scheduler.tick(self.at(120)))
+        # restarted after the scheduler was down when the second reminder fell due
+        restarted = ReminderScheduler()
+        self.assertEqual(restarted.tick(self.at(20)), [(self.appointment.pk, 30)])
+        restarted.send([(self.appointment.pk, 30)])
+        self.assertEqual(jobs.run(jobs.claim()), 2)
+        reminders = Notification.objects.filter(type=Notification.Status.REMINDER)
+        self.assertEqual([notification.message.split(' starts in ')[1].split(',')[0] for notification in reminders],
+                         ['2 hours', '30 minutes'])
+
+
+class NotificationInboxTest(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.other = make_user()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        self.notifications = inbox.create(
+            Notification(user_id=user, message=f'Message {i}', type=Notification.Status.BOOKING, is_read=i == 0)
+            for user in (self.user, self.other) for i in range(5)
+        )
+
+    def test_counter_follows_reads(self):
+        self.assertEqual(self.client.get('/api/v1/notifications/unread-count/').data, {'unread': 4})
+        mine = [notification.pk for notification in self.notifications if notification.user_id == self.user]
+        theirs = [notification.pk for notification in self.notifications if notification.user_id == self.other]
+
+        for _ in range(2):
+            # marking again, or someone else's notifications, changes nothing
+            response = self.client.post('/api/v1/notifications/read/', {'ids': mine[:3] + theirs}, format='json')
+            self.assertEqual(response.data, {'unread': 2})
+        response = self.client.post('/api/v1/notifications/read/', {}, format='json')
+        self.assertEqual(response.data, {'unread': 0})
+
+        self.assertEqual(inbox.unread_count(self.other.pk), 4)
+        inbox.recount()
+        self.assertEqual(dict(NotificationCounter.objects.values_list('user_id', 'unread')), {self.other.pk: 4})
+        self.assertEqual(inbox.unread_count(self.user.pk), 0)
+
+    def test_listing_pages_with_cursors_newest_first(self):
+        ids, url = [], '/api/v1/notifications/?limit=2'
+        while url:
+            response = self.client.get(url)
+            ids += [item['id'] for item in response.data['items']]
+            url = response.data['next']
+        mine = [notification.pk for notification in self.notifications if notification.user_id == self.user]
+        self.assertEqual(ids, sorted(mine, reverse=True))
+
+        response = self.client.get('/api/v1/notifications/?is_read=true')
+        self.assertEqual([item['id'] for item in response.data['items']], [mine[0]])
+
+    def test_compaction_deletes_old_read_notifications(self):
+        old = timezone.now() - timedelta(days=31)
+        Notification.objects.filter(user_id=self.user).update(created_at=old)
+        Notification.objects.filter(user_id=self.user, pk__in=[n.pk for n in self.notifications[1:3]]).update(
+            is_read=True)
+
+        self.assertEqual(inbox.compact(retention_days=30, batch_size=2), 3)
+        self.assertEqual(Notification.objects.filter(user_id=self.user).count(), 2)
+        self.assertEqual(Notification.objects.filter(user_id=self.other).count(), 5)
+
+
+def image_upload(name, image_format, size=(1200, 800)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'teal').save(buffer, image_format)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class AvatarThumbnailTest(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.user = make_user(User.RoleType.SPECIALIST)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        Job.objects.all().delete()
+
+    def test_uploads_are_sniffed_and_thumbnailed_in_the_background(self):
+        # a JPEG named .png is stored as what it is
+        response = self.client.patch('/api/v1/user-update/', {'avatar': image_upload('me.png', 'JPEG')},
+                                     format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.avatar.name.endswith('.jpg'))
+        self.assertEqual(SpecialistModelSerializer(self.user).data['avatar'], self.user.avatar.url)
+
+        self.assertEqual(jobs.run(jobs.claim()), 1)
+        self.user.refresh_from_db()
+        small = SpecialistModelSerializer(self.user).data['avatar']
+        self.assertRegex(small, r'_small\.[0-9a-f]{12}\.webp$')
+        with default_storage.open(self.user.avatar_thumbnails['small']) as file, Image.open(file) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (96, 96)))
+        self.assertRegex(UserModelSerializer(self.user).data['avatar_thumbnail'], r'_medium\.[0-9a-f]{12}\.webp$')
+
+        # saving the user again doesn't make them twice
+        self.user.save()
+        self.assertFalse(Job.objects.exists())
+
+    def upload(self):
+        response = self.client.patch('/api/v1/user-update/', {'avatar': image_upload('me.jpg', 'JPEG')},
+                                     format='multipart')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_rendered_outside_the_job_transaction_and_get_me_follows(self):
+        self.upload()
+        self.assertEqual(self.client.get('/api/v1/get-me/').data['avatar_thumbnail'],
+                         User.objects.get(pk=self.user.pk).avatar.url)
+        depth = len(connection.savepoint_ids)
+        render = avatars.render
+
+        def checked_render(*args):
+            self.assertEqual(len(connection.savepoint_ids), depth)
+            return render(*args)
+
+        with patch('apps.avatars.render', side_effect=checked_render) as rendered, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(jobs.run(jobs.claim()), 1)
+        self.assertEqual(rendered.call_count, 1)
+        self.assertFalse(Job.objects.exists())
+        self.assertRegex(self.client.get('/api/v1/get-me/').data['avatar_thumbnail'],
+                         r'_medium\.[0-9a-f]{12}\.webp$')
+
+    def test_thumbnails_of_a_replaced_avatar_are_discarded(self):
+        self.upload()
+        render = avatars.render
+        rendered = []
+
+        def replaced_while_rendering(*args):
+            thumbnails = render(*args)
+            rendered.extend(thumbnails.values())
+            User.objects.filter(pk=self.user.pk).update(avatar='users/other.jpg')
+            return thumbnails
+
+        with patch('apps.avatars.render', side_effect=replaced_while_rendering):
+            self.assertEqual(jobs.run(jobs.claim()), 1)
+        self.assertEqual(len(rendered), 2)
+        rendered = [name for name in rendered if default_storage.exists(name)]
+        self.assertEqual(User.objects.get(pk=self.user.pk).avatar_thumbnails, {})
+        self.assertEqual(rendered, [])
+
+    def test_other_files_are_rejected(self):
+        for upload in (image_upload('me.jpg', 'GIF'), SimpleUploadedFile('me.jpg', b'not an image')):
+            response = self.client.patch('/api/v1/user-update/', {'avatar': upload}, format='multipart')
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Job.objects.exists())
+
+
+class MediaServingTest(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        self.name = default_storage.save('docs/digits.txt', ContentFile(b'0123456789'))
+        self.url = default_storage.url(self.name)
+
+    def test_hashed_names_are_cached_forever_and_revalidated_by_etag(self):
+        self.assertRegex(self.name, r'^docs/digits\.[0-9a-f]{12}\.txt$')
+        response = self.client.get(self.url)
+        self.assertEqual((response.status_code, b''.join(response.streaming_content)), (200, b'0123456789'))
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get(self.url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('immutable', response['Cache-Control'])
+
+        with open(f'{self.media_root}/docs/legacy.txt', 'wb') as file:
+            file.write(b'old upload')
+        response = self.client.get(default_storage.url('docs/legacy.txt'))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        self.assertEqual(self.client.get(f'{settings.MEDIA_URL}../root/settings.py').status_code, 404)
+
+    def test_byte_ranges(self):
+        for header, status_code, body in (('bytes=2-5', 206, b'2345'), ('bytes=-3', 206, b'789'),
+                                          ('bytes=7-', 206, b'789'), ('bytes=0-1,4-5', 200, b'0123456789')):
+            with self.subTest(header):
+                response = self.client.get(self.url, headers={'Range': header})
+                self.assertEqual((response.status_code, b''.join(response.streaming_content)), (status_code, body))
+                self.assertEqual(int(response['Content-Length']), len(body))
+        response = self.client.get(self.url, headers={'Range': 'bytes=2-5'})
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(self.client.get(self.url, headers={'Range': 'bytes=10-'}).status_code, 416)
+        response = self.client.get(self.url, headers={'Range': 'bytes=2-5', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+
+class SparseFieldsetTest(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        seed(2)
+        self.client = APIClient()
+
+    def items(self, url, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data['items']
+
+    def test_fields_narrow_the_query(self):
+        default = self.items('/api/v1/admin/business/', 6)
+        self.assertIn('appointments', default[0]['services'][0])
+        self.assertIn('sub services', default[0]['services'][0])
+
+        with CaptureQueriesContext(connection) as queries:
+            items = self.items('/api/v1/admin/business/?fields=id,name', 2)
+        self.assertEqual(items, [{'id': item['id'], 'name': item['name']} for item in default])
+        self.assertNotIn('description', queries.captured_queries[-1]['sql'])
+
+        items = self.items('/api/v1/admin/appointments/?fields=id,service_name&exclude=id', 2)
+        self.assertEqual(set(items[0]), {'service_name'})
+
+    def test_expand_picks_the_nested_relations(self):
+        items = self.items('/api/v1/admin/business/?expand=services', 3)
+        self.assertEqual(set(items[0]['services'][0]) & {'appointments', 'specialists', 'sub services'}, set())
+
+        items = self.items('/api/v1/admin/business/?fields=id&expand=services.appointments', 4)
+        self.assertEqual(set(items[0]), {'id', 'services'})
+        self.assertIn('appointments', items[0]['services'][0])
+
+        items = self.items('/api/v1/admin/services/?exclude=appointments,specialists,description', 3)
+        self.assertEqual(set(items[0]) & {'appointments', 'specialists', 'description'}, set())
+        self.assertIn('sub services', items[0])
+
+
+class FullTextSearchTest(BookingTestCase):
+    url = '/api/v1/admin/business/'
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.barber = Business.objects.create(name='Barber Shop', type=Business.Type.BARBERSHOP, address='Tashkent',
+                                              description='<p><strong>Fast</strong> haircuts &amp; beard trims</p>')
+        self.clinic = Business.objects.create(name='City Clinic', type=Business.Type.CLINIC, address='Tashkent',
+                                              description='<p>Beard transplant and <em>hair</em> care</p>')
+
+    def search(self, terms, extra=''):
+        return [business['id'] for business in self.client.get(f'{self.url}?search={terms}{extra}').data['items']]
+
+    def test_documents_are_plain_text(self):
+        self.assertEqual(self.barber.search_document, 'Barber Shop barbershop Fast haircuts & beard trims')
+        self.assertEqual(self.search('strong'), [])
+        self.assertNotIn('search_document', self.client.get(f'{self.url}{self.barber.pk}/').data)
+
+    def test_ranked_prefix_search(self):
+        self.assertEqual(self.search('beard'), [self.barber.pk, self.clinic.pk])
+        self.assertEqual(self.search('BEARD barb'), [self.barber.pk])
+        self.assertEqual(self.search('bea', '&ordering=-created_at'), [self.clinic.pk, self.barber.pk])
+        self.assertEqual(self.search('clinic hair'), [self.clinic.pk])
+
+    def test_index_follows_writes(self):
+        self.clinic.name = 'Smile Dental'
+        self.clinic.save(update_fields=['name'])
+        self.assertEqual(self.search('smile'), [self.clinic.pk])
+        self.assertEqual(self.search('city'), [])
+        self.barber.delete()
+        self.assertEqual(self.search('beard'), [self.clinic.pk])
+
+    def test_cursor_pages_follow_the_ranking(self):
+        extra = [Business.objects.create(name=f'Beard Studio {i}', type=Business.Type.BARBERSHOP, address='Tashkent')
+                 for i in range(3)]
+        expected = self.search('beard', '&limit=10')
+        self.assertEqual(set(expected), {self.barber.pk, self.clinic.pk, *(business.pk for business in extra)})
+        pages, url = [], f'{self.url}?search=beard&pagination=cursor&limit=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([business['id'] for business in response.data['items']])
+            url = response.data['next']
+        # the studios rank equally; keyset pages break ties on the id, in the ranking's direction
+        studios = sorted((business.pk for business in extra), reverse=True)
+        self.assertEqual(sum(pages, []), studios + [pk for pk in expected if pk not in studios])
+        self.assertEqual(len(pages), 3)
+
+        for payload in ({'v': [1], 'id': 1, 'r': False}, {'v': 1.0, 'id': 'x', 'r': False}):
+            token = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+            self.assertEqual(self.client.get(f'{self.url}?search=beard&cursor={token}').status_code, 404)
+
+
+class NearbyBusinessTest(BookingTestCase):
+    url = '/api/v1/nearby/?latitude=41.3111&longitude=69.2797'
+
+    def business(self, name, latitude, longitude, business_type=Business.Type.CLINIC, is_active=True):
+        return Business.objects.create(name=name, type=business_type, address='Tashkent', latitude=latitude,
+                                       longitude=longitude, is_active=is_active)
+
+    def test_geohash(self):
+        self.assertEqual(geohash.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(geohash.prefix_ranges(['tx34y', 'tx34w', 'tx34x', 'tx35n']),
+                         [('tx34w', 'tx34y{'), ('tx35n', 'tx35n{')])
+        self.assertAlmostEqual(geohash.haversine_km(48.8566, 2.3522, 51.5074, -0.1278), 343.5, delta=0.5)
+        cells = geohash.covering_cells(0, 179.999, 5)
+        self.assertIn(geohash.encode(0, -179.999, len(cells[0])), cells)
+
+    def test_nearest_first_within_radius(self):
+        near = self.business('Near', '41.312000', '69.280000')
+        nearer = self.business('Nearer', '41.311200', '69.279800')
+        barber = self.business('Barber', '41.320000', '69.290000', Business.Type.BARBERSHOP)
+        self.business('Closed', '41.311100', '69.279700', is_active=False)
+        self.business('Samarkand', '39.654200', '66.959700')
+        Business.objects.create(name='Nowhere', type=Business.Type.CLINIC, address='?', is_active=True)
+
+        response = self.client.get(f'{self.url}&radius=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([business['id'] for business in response.data], [nearer.pk, near.pk, barber.pk])
+        self.assertLess(response.data[0]['distance'], 0.02)
+        self.assertEqual([business['id'] for business in self.client.get(f'{self.url}&type=barbershop').data],
+                         [barber.pk])
+        self.assertEqual(len(self.client.get(f'{self.url}&radius=0.5&limit=1').data), 1)
+        self.assertEqual(self.client.get(f'{self.url}&radius=500').status_code, 400)
+
+        near.latitude, near.longitude = '39.654300', '66.959800'
+        near.save(update_fields=['latitude', 'longitude'])
+        self.assertEqual([business['id'] for business in self.client.get(self.url).data], [nearer.pk, barber.pk])
+
+
+@override_settings(QUERY_BUDGET={'HEADERS': True, 'ON_EXCEED': 'raise', 'DEFAULT': None})
+class OpeningHoursTest(BookingTestCase):
+    url = '/api/v1/admin/business/'
+    # a Monday
+    monday = date(2026, 10, 19)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.office = Business.objects.create(name='Office', type=Business.Type.CLINIC, address='Tashkent',
+                                              opening_hours={'mon': ['09:00-13:00', '14:00-18:00']})
+        self.bar = Business.objects.create(name='Bar', type=Business.Type.SPORT, address='Tashkent',
+                                           opening_hours={'sunday': [['20:00', '02:00']]})
+        Business.objects.create(name='Unknown hours', type=Business.Type.CLINIC, address='Tashkent')
+
+    def open_at(self, day, hour, minute=0):
+        moment = datetime.combine(day, time(hour, minute)).isoformat()
+        response = self.client.get(self.url, {'open_at': moment})
+        self.assertEqual(response.status_code, 200)
+        return {business['id'] for business in response.data['items']}
+
+    def test_canonical_schema(self):
+        self.assertEqual(self.office.opening_hours, {'monday': [['09:00', '13:00'], ['14:00', '18:00']]})
+        self.assertEqual(week_intervals(self.bar.opening_hours), [(0, 120), (9840, 10080)])
+        self.assertEqual(canonical({'Fri': [['10:00', '24:00']]}), {'friday': [['10:00', '24:00']]})
+        response = self.client.post(self.url, {'name': 'Late', 'type': Business.Type.CLINIC, 'address': 'Tashkent',
+                                               'opening_hours': {'monday': [['09:00', '13:00'], ['12:00', '14:00']]}},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('opening_hours', response.data)
+
+    def test_open_at(self):
+        self.assertEqual(self.open_at(self.monday, 9), {self.office.pk})
+        self.assertEqual(self.open_at(self.monday, 13, 30), set())
+        self.assertEqual(self.open_at(self.monday, 1, 59), {self.bar.pk})
+        self.assertEqual(self.open_at(self.monday - timedelta(days=1), 23), {self.bar.pk})
+        self.assertEqual(self.open_at(self.monday + timedelta(days=7), 17, 59), {self.office.pk})
+
+        closed_now = self.client.get(self.url, {'open_now': 'false'}).data['items']
+        self.assertIn(Business.objects.get(name='Unknown hours').pk, {business['id'] for business in closed_now})
+
+    def test_intervals_follow_updates(self):
+        response = self.client.patch(f'{self.url}{self.office.pk}/', {'opening_hours': {'tue': ['08:00-12:00']}},
+                                     format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['opening_hours'], {'tuesday': [['08:00', '12:00']]})
+        self.assertEqual(self.open_at(self.monday, 9), set())
+        self.assertEqual(self.open_at(self.monday + timedelta(days=1), 9), {self.office.pk})
+
+        self.office.refresh_from_db()
+        self.office.opening_hours['tuesday'].append(['13:00', '15:00'])
+        self.office.save()
+        self.assertEqual(OpeningInterval.objects.filter(business_id=self.office).count(), 2)
+        with self.assertNumQueries(1):
+            self.office.save(update_fields=['name'])
+
+    def test_invalid_legacy_hours_do_not_block_other_changes(self):
+        # migration 0013 leaves hours it can't read as they are
+        Business.objects.filter(pk=self.office.pk).update(opening_hours={'mon': 'all day'})
+        response = self.client.patch(f'{self.url}{self.office.pk}/', {'name': 'Head office'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.office.refresh_from_db()
+        self.assertEqual((self.office.name, self.office.opening_hours), ('Head office', {'mon': 'all day'}))
+        self.office.save(update_fields=['name'])
+        self.office.save()
+
+
+@override_settings(QUERY_BUDGET={'HEADERS': True, 'ON_EXCEED': 'raise', 'DEFAULT': None})
+class AsyncViewsTest(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        seed(2)
+        self.user = make_user(User.RoleType.ADMIN)
+        self.headers = {'Authorization': f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    def paths(self):
+        business = Business.objects.first()
+        service = Service.objects.first()
+        offer = ServiceBySpecialist.objects.select_related('sub_service_id__service_id').first()
+        today = timezone.localdate()
+        return [
+            'business/?search=Business&ordering=-created_at',
+            f'business/{business.pk}/',
+            'services/?limit=1&page=2',
+            f'services/{service.pk}/',
+            f'statistics/?start={today}',
+            'top-services/',
+            'top-clients/',
+            'top-businesses/',
+            'top-specialists/',
+            f'availability/?specialist={offer.specialist_id_id}&sub_service={offer.sub_service_id_id}&start={today}',
+            f'earliest-availability/?business={offer.sub_service_id.service_id.business_id_id}'
+            f'&sub_service={offer.sub_service_id_id}',
+            'get-me/',
+        ]
+
+    async def test_async_views_answer_like_sync_views(self):
+        paths = await sync_to_async(self.paths)()
+        for path in paths:
+            sync_response = await sync_to_async(self.client.get)(f'/api/v1/{self.sync_path(path)}',
+                                                                 headers=self.headers)
+            async_response = await self.async_client.get(f'/api/v1/async/{path}', headers=self.headers)
+            self.assertEqual(async_response.status_code, 200, path)
+            self.assertEqual(async_response.json(), sync_response.json(), path)
+            self.assertLessEqual(int(async_response['X-Query-Count']), int(async_response['X-Query-Budget']), path)
+
+    async def test_errors(self):
+        self.assertEqual((await self.async_client.get('/api/v1/async/get-me/')).status_code, 401)
+        self.assertEqual((await self.async_client.get('/api/v1/async/business/0/')).status_code, 404)
+        self.assertEqual((await self.async_client.get('/api/v1/async/statistics/')).status_code, 400)
+        response = await self.async_client.get('/api/v1/async/availability/?specialist=x')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sub_service', response.json())
+        self.assertEqual((await self.async_client.get('/api/v1/async/services/?cursor=garbage')).status_code, 404)
+
+    async def test_cursor_pages_like_sync_views(self):
+        path = 'services/?pagination=cursor&limit=3&ordering=-created_at'
+        pages = {}
+        for prefix in ('/api/v1/admin/', '/api/v1/async/'):
+            url, pages[prefix] = f'{prefix}{path}', []
+            while url:
+                if prefix == '/api/v1/admin/':
+                    response = await sync_to_async(self.client.get)(url, headers=self.headers)
+                else:
+                    response = await self.async_client.get(url, headers=self.headers)
+                self.assertEqual(response.status_code, 200)
+                data = response.json()
+                self.assertNotIn('totalCount', data)
+                pages[prefix].append(data['items'])
+                url = data['next']
+        self.assertEqual(pages['/api/v1/async/'], pages['/api/v1/admin/'])
+        self.assertEqual(len(pages['/api/v1/admin/']), 2)
+
+    @staticmethod
+    def sync_path(path):
+        return f'admin/{path}' if path.startswith(('business', 'services')) else path
@@ -0,0 +1,127 @@
+"""
+Sliding-window rate limits shared by all workers through the cache.
+
+A view names its `throttle_scope` and lists the throttles keying it by client
+IP, by user or by the phone number in the request body. Each throttle reads
+the rate of "<scope>.<kind>" from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']
+(e.g. "token.ip": "20/min") and doesn't limit scopes without one.
+
+The count over the last window is estimated from two fixed windows, the way a
+sliding-window counter does: previous * (1 - elapsed share of the current
+window) + current. Both live in one integer per client and window, the
+previous window's final count in the high bits, so a request is a single
+cache.incr(); only the first request of a window reads the previous one and
+add()s the counter.
+
+Throttling needs the Redis or Memcached backend (CACHE_BACKEND) to count
+exactly: there incr() is atomic and keeps the key's timeout. Other backends
+implement incr() as get() and set(), which loses concurrent increments and
+resets the timeout to the default one, so their counters are touch()ed back
+to their own timeout after every increment.
+
+Every attempt counts, including rejected ones: a client that keeps retrying
+stays limited.
+"""
+import re
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+from django.utils.connection import ConnectionProxy
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+COUNT_BITS = 32
+COUNT_MASK = (1 << COUNT_BITS) - 1
+NON_DIGIT = re.compile(r'\D')
+# backends whose incr() leaves the key's timeout alone
+KEEPS_TIMEOUT = (RedisCache, BaseMemcachedCache, LocMemCache)
+
+
+def keeps_timeout(cache):
+    if isinstance(cache, ConnectionProxy):
+        cache = caches[DEFAULT_CACHE_ALIAS]
+    return isinstance(cache, KEEPS_TIMEOUT)
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    kind = None
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def __init__(self):
+        # the rate depends on the view's scope, see allow_request
+        pass
+
+    def get_identity(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        self.rate = api_settings.DEFAULT_THROTTLE_RATES.get(f'{scope}.{self.kind}') if scope else None
+        if self.rate is None:
+            return True
+        ident = self.get_identity(request, view)
+        if ident is None:
+            return True
+        self.scope = f'{scope}.{self.kind}'
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.key = self.cache_format % {'scope': self.scope, 'ident': ident}
+
+        window, elapsed = divmod(self.timer(), self.duration)
+        self.previous, self.current = self.hit(int(window))
+        self.elapsed = elapsed
+        return self.previous * (1 - elapsed / self.duration) + self.current <= self.num_requests
+
+    def hit(self, window):
+        """Counts the request in `window` and returns (previous window's count, this window's count)."""
+        key = f'{self.key}:{window}'
+        # kept while it is the previous window of the next one
+        timeout = 2 * self.duration + 1
+        try:
+            value = self.incr(key, timeout)
+        except ValueError:
+            previous = (self.cache.get(f'{self.key}:{window - 1}') or 0) & COUNT_MASK
+            value = previous << COUNT_BITS | 1
+            if not self.cache.add(key, value, timeout=timeout):
+                value = self.incr(key, timeout)
+        return value >> COUNT_BITS, value & COUNT_MASK
+
+    def incr(self, key, timeout):
+        value = self.cache.incr(key)
+        if not keeps_timeout(self.cache):
+            self.cache.touch(key, timeout)
+        return value
+
+    def wait(self):
+        """Seconds until the estimate drops back to the limit, if no more requests come."""
+        limit, duration = self.num_requests, self.duration
+        if self.current <= limit:
+            # the previous window's weight has to shrink enough
+            return max(duration * (1 - (limit - self.current) / self.previous) - self.elapsed, 0)
+        # only the next window helps, where this one is the previous
+        return duration - self.elapsed + duration * (1 - limit / self.current)
+
+
+class IPRateThrottle(SlidingWindowThrottle):
+    kind = 'ip'
+
+    def get_identity(self, request, view):
+        return self.get_ident(request)
+
+
+class UserRateThrottle(SlidingWindowThrottle):
+    kind = 'user'
+
+    def get_identity(self, request, view):
+        return request.user.pk if request.user and request.user.is_authenticated else None
+
+
+class PhoneRateThrottle(SlidingWindowThrottle):
+    """Keyed by the digits of the body field named by the view's `throttle_phone_field` ("phone_number")."""
+    kind = 'phone'
+
+    def get_identity(self, request, view):
+        data = request.data if hasattr(request.data, 'get') else {}
+        digits = NON_DIGIT.sub('', str(data.get(getattr(view, 'throttle_phone_field', 'phone_number')) or ''))
+        return digits[-12:] or None
@@ -0,0 +1,122 @@
+"""
+Refresh tokens whose blacklist check rarely touches the database.
+
+simplejwt's token_blacklist app answers "is this refresh token blacklisted?"
+with a query on BlacklistedToken joined to OutstandingToken, on every refresh.
+`blacklist_snapshot` keeps the JTIs of the unexpired blacklisted tokens in
+memory as 64-bit hashes and syncs them incrementally: at most every
+TOKEN_BLACKLIST['SYNC_INTERVAL'] seconds it loads the rows added since the
+last sync (by id), and every RELOAD_INTERVAL seconds it reloads the whole set,
+which also forgets expired tokens and picks up rows whose id was committed out
+of order.
+
+A JTI missing from the snapshot passes without a query; a token blacklisted
+by another process may therefore be accepted for up to SYNC_INTERVAL seconds.
+A hit is confirmed with the usual query, so a hash collision never rejects a
+valid token. Tokens blacklisted by this process are added right away.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+DEFAULT_TOKEN_BLACKLIST = {
+    'SYNC_INTERVAL': 5,
+    'RELOAD_INTERVAL': 600,
+}
+
+
+def get_token_blacklist_settings():
+    return {**DEFAULT_TOKEN_BLACKLIST, **getattr(settings, 'TOKEN_BLACKLIST', {})}
+
+
+def jti_hash(jti):
+    return int.from_bytes(hashlib.blake2b(str(jti).encode(), digest_size=8).digest(), 'big')
+
+
+class BlacklistSnapshot:
+    """In-process set of the hashes of blacklisted JTIs."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.hashes = set()
+            # highest BlacklistedToken id loaded, None until the first load
+            self.last_id = None
+            self.synced_at = self.loaded_at = float('-inf')
+
+    def sync(self):
+        config = get_token_blacklist_settings()
+        if time.monotonic() - self.synced_at < config['SYNC_INTERVAL']:
+            return
+        with self.lock:
+            now = time.monotonic()
+            if now - self.synced_at < config['SYNC_INTERVAL']:
+                return
+            reload = self.last_id is None or now - self.loaded_at >= config['RELOAD_INTERVAL']
+            rows = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+            if reload:
+                hashes, last_id = set(), 0
+            else:
+                # readers only test membership, so new hashes can go into the live set
+                hashes, last_id = self.hashes, self.last_id
+                rows = rows.filter(id__gt=last_id)
+            for pk, jti in rows.values_list('id', 'token__jti').iterator():
+                hashes.add(jti_hash(jti))
+                last_id = max(last_id, pk)
+            if reload:
+                self.hashes, self.loaded_at = hashes, now
+            self.last_id, self.synced_at = last_id, now
+
+    def add(self, jti):
+        self.hashes.add(jti_hash(jti))
+
+    def might_contain(self, jti):
+        self.sync()
+        return jti_hash(jti) in self.hashes
+
+
+blacklist_snapshot = BlacklistSnapshot()
+
+
+class RefreshToken(tokens.RefreshToken):
+    def check_blacklist(self):
+        if blacklist_snapshot.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+    def blacklist(self):
+        blacklisted = super().blacklist()
+        blacklist_snapshot.add(self.payload[api_settings.JTI_CLAIM])
+        return blacklisted
+
+
+def compact_expired_tokens(batch_size=1000, pause=0.0):
+    """
+    Deletes expired OutstandingTokens and their BlacklistedTokens, `batch_size`
+    tokens per transaction, so no lock is held for long. Returns the numbers of
+    (outstanding, blacklisted) rows deleted.
+    """
+    now = timezone.now()
+    outstanding = blacklisted = 0
+    last_id = 0
+    while True:
+        ids = list(OutstandingToken.objects.filter(id__gt=last_id, expires_at__lte=now)
+                   .order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return outstanding, blacklisted
+        with transaction.atomic():
+            _, deleted = OutstandingToken.objects.filter(id__in=ids).delete()
+        outstanding += deleted.get(OutstandingToken._meta.label, 0)
+        blacklisted += deleted.get(BlacklistedToken._meta.label, 0)
+        last_id = ids[-1]
+        if pause:
+            time.sleep(pause)
@@ -3,7 +3,15 @@ from rest_framework.routers import DefaultRouter
 
 from apps.views.adminViews import (AppointmentViewSet, ServiceViewSet, UserViewSet,
                                    BusinessViewSet,
-                                   GetMe, CustomTokenObtainPairView, BusinessWorkerViewSet, UserUpdateView)
+                                   GetMe, CustomTokenObtainPairView, CustomTokenRefreshView, CustomTokenBlacklistView,
+                                   BusinessWorkerViewSet, UserUpdateView)
+from apps.views.async_views import (AsyncBusinessView, AsyncServiceView, AsyncGetMe,
+                                    AsyncSpecialistAvailabilityView, AsyncEarliestAvailabilityView,
+                                    AsyncAppointmentStatisticView, AsyncTopServicesView, AsyncTopClientsView,
+                                    AsyncTopBusinessesView, AsyncTopSpecialistView)
+from apps.views.availability_views import SpecialistAvailabilityView, EarliestAvailabilityView
+from apps.views.nearby_views import NearbyBusinessView
+from apps.views.notification_views import NotificationListView, NotificationReadView, UnreadCountView
 from apps.views.otp_views import RequestPhoneChangeView, VerifyPhoneOTPView
 from apps.views.statisticviews import AppointmentStatisticView, TopServicesView, TopClientsView, TopBusinessesView, \
     TopSpecialistView
@@ -15,18 +23,42 @@ router.register('appointments', AppointmentViewSet),
 router.register('services', ServiceViewSet),
 router.register('business-workers', BusinessWorkerViewSet),
 
+# async versions of the read endpoints, for ASGI deployments
+async_urlpatterns = [
+    path('business/', AsyncBusinessView.as_view()),
+    path('business/<pk>/', AsyncBusinessView.as_view()),
+    path('services/', AsyncServiceView.as_view()),
+    path('services/<pk>/', AsyncServiceView.as_view()),
+    path('statistics/', AsyncAppointmentStatisticView.as_view()),
+    path('top-services/', AsyncTopServicesView.as_view()),
+    path('top-clients/', AsyncTopClientsView.as_view()),
+    path('top-businesses/', AsyncTopBusinessesView.as_view()),
+    path('top-specialists/', AsyncTopSpecialistView.as_view()),
+    path('availability/', AsyncSpecialistAvailabilityView.as_view()),
+    path('earliest-availability/', AsyncEarliestAvailabilityView.as_view()),
+    path('get-me/', AsyncGetMe.as_view()),
+]
+
 urlpatterns = [
     path('admin/', include(router.urls)),
+    path('async/', include(async_urlpatterns)),
     path('statistics/', AppointmentStatisticView.as_view()),
     path('top-services/', TopServicesView.as_view()),
     path('top-clients/', TopClientsView.as_view()),
     path('top-businesses/', TopBusinessesView.as_view()),
     path('top-specialists/', TopSpecialistView.as_view()),
+    path('availability/', SpecialistAvailabilityView.as_view()),
+    path('earliest-availability/', EarliestAvailabilityView.as_view()),
+    path('nearby/', NearbyBusinessView.as_view()),
     path('get-me/', GetMe.as_view()),
     path('token/', CustomTokenObtainPairView.as_view()),
     path('user-update/', UserUpdateView.as_view()),
     path('change-phone/', RequestPhoneChangeView.as_view()),
     path('verify-phone/', VerifyPhoneOTPView.as_view()),
-    # path('token/refresh/', CustomTokenRefreshView.as_view()),
+    path('token/refresh/', CustomTokenRefreshView.as_view()),
+    path('token/blacklist/', CustomTokenBlacklistView.as_view()),
+    path('notifications/', NotificationListView.as_view()),
+    path('notifications/read/', NotificationReadView.as_view()),
+    path('notifications/unread-count/', UnreadCountView.as_view()),
 
 ]
@@ -1,25 +1,33 @@
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema
+from rest_framework import status
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.generics import RetrieveAPIView, UpdateAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenBlacklistView
 
+from apps import booking
+from apps.fieldsets import SparseFieldsViewMixin, fieldset_schema
+from apps.filters import BusinessFilter
+from apps.search import FullTextSearchFilter
+from apps.throttling import IPRateThrottle, PhoneRateThrottle
 from apps.models import User, Business, Appointment, Service, BusinessWorker
 from apps.serializers import UserModelSerializer, BusinessModelSerializer, AppointmentModelSerializer, \
-    ServiceModelSerializer, CustomTokenObtainPairSerializer, \
-    BusinessWorkerModelSerializer, UserUpdateSerializer
+    ServiceModelSerializer, CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer, \
+    CustomTokenBlacklistSerializer, BusinessWorkerModelSerializer, UserUpdateSerializer
 
 
 # Create your views here.
 
 @extend_schema(tags=['Users'])
-class UserViewSet(ModelViewSet):
+@fieldset_schema
+class UserViewSet(SparseFieldsViewMixin, ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserModelSerializer
+    query_budget = 3
     filter_backends = (DjangoFilterBackend, SearchFilter, OrderingFilter,)
     filterset_fields = ('role',)
     search_fields = ['first_name', 'last_name', 'phone_number']
@@ -28,38 +36,60 @@ class UserViewSet(ModelViewSet):
     # permission_classes = [IsAdminUser]
 
 @extend_schema(tags=['Business'])
-class BusinessViewSet(ModelViewSet):
-    queryset = Business.objects.all().prefetch_related('services')
-    filter_backends = (DjangoFilterBackend,SearchFilter, OrderingFilter )
+@fieldset_schema
+class BusinessViewSet(SparseFieldsViewMixin, ModelViewSet):
+    queryset = BusinessModelSerializer.setup_eager_loading(Business.objects.all())
+    # ?search= matches Business.SEARCH_DOCUMENT, ranked, see apps/search.py
+    filter_backends = (DjangoFilterBackend, OrderingFilter, FullTextSearchFilter)
     serializer_class = BusinessModelSerializer
-    filterset_fields = ('type', 'is_active')
-    search_fields = ['name', 'description', 'type']
+    query_budget = 7
+    filterset_class = BusinessFilter
     ordering_fields = ('created_at',)
     ordering = ['created_at']
     # permission_classes = [IsAdminUser]
 
 @extend_schema(tags=['BusinessWorkers'])
-class BusinessWorkerViewSet(ModelViewSet):
+@fieldset_schema
+class BusinessWorkerViewSet(SparseFieldsViewMixin, ModelViewSet):
     queryset = BusinessWorker.objects.all()
     serializer_class = BusinessWorkerModelSerializer
+    query_budget = 3
 
 @extend_schema(tags=['Appointments'])
-class AppointmentViewSet(ModelViewSet):
-    queryset = Appointment.objects.all()
+@fieldset_schema
+class AppointmentViewSet(SparseFieldsViewMixin, ModelViewSet):
+    queryset = AppointmentModelSerializer.setup_eager_loading(Appointment.objects.all())
     serializer_class = AppointmentModelSerializer
+    # the first booking of a day also creates its rollup rows, see apps/rollups.py; one more enqueues
+    # the notification job (apps/notifications.py); on SQLite five bound the lock wait, take the
+    # specialist's BookingLock and check again under it (apps/booking.py)
+    query_budget = {'GET': 3, '*': 35}
     filter_backends = (DjangoFilterBackend, OrderingFilter)
     filterset_fields = ('status',)
     ordering_fields = ('created_at',)
     ordering = ['created_at']
     # permission_classes = [IsAdminUser]
 
+    def perform_create(self, serializer):
+        booking.save(serializer)
+
+    def perform_update(self, serializer):
+        booking.save(serializer)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, booking.SlotTaken):
+            return Response({'error': 'The specialist is already booked at this time'},
+                            status=status.HTTP_409_CONFLICT)
+        return super().handle_exception(exc)
+
 @extend_schema(tags=['Services'])
-class ServiceViewSet(ModelViewSet):
-    queryset = Service.objects.all()
+@fieldset_schema
+class ServiceViewSet(SparseFieldsViewMixin, ModelViewSet):
+    queryset = ServiceModelSerializer.setup_eager_loading(Service.objects.all())
     serializer_class = ServiceModelSerializer
-    filter_backends = (DjangoFilterBackend, SearchFilter, OrderingFilter)
+    query_budget = 6
+    filter_backends = (DjangoFilterBackend, OrderingFilter, FullTextSearchFilter)
     filterset_fields = ('is_active',)
-    search_fields = ['name', 'description']
     ordering_fields = ('created_at',)
     ordering = ['created_at']
     # permission_classes = [IsAdminUser]
@@ -67,6 +97,7 @@ class ServiceViewSet(ModelViewSet):
 @extend_schema(tags=["Users",], responses={200: UserModelSerializer})
 class GetMe(APIView):
     permission_classes = (IsAuthenticated,)
+    query_budget = 1
     def get(self, request):
         user = request.user
         serializer = UserModelSerializer(user)
@@ -76,12 +107,24 @@ class GetMe(APIView):
 class UserUpdateView(UpdateAPIView):
     serializer_class = UserUpdateSerializer
     permission_classes = (IsAuthenticated,)
+    query_budget = 3
 
     def get_object(self):
         return self.request.user
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    # password hashing is slow on purpose, so guesses are limited per client and per account
+    throttle_classes = (IPRateThrottle, PhoneRateThrottle)
+    throttle_scope = 'token'
+    query_budget = 3
+
+class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer
+    # the user; the blacklist check is answered by apps.tokens.blacklist_snapshot
+    query_budget = 2
+
 
-# class CustomTokenRefreshView(TokenRefreshView):
-#     serializer_class = CustomTokenRefreshSerializer
+class CustomTokenBlacklistView(TokenBlacklistView):
+    serializer_class = CustomTokenBlacklistSerializer
+    query_budget = 6
@@ -0,0 +1,232 @@
+"""
+Async versions of the read-heavy endpoints, served under /api/v1/async/.
+
+They answer exactly like their sync counterparts (and share their querysets,
+filters, serializers and caches) but run on the async ORM, so under an ASGI
+server a request waiting on the database does not hold a worker thread.
+"""
+import math
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from django.http import HttpResponse
+from django.utils import timezone
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from apps.authentication import AsyncJWTAuthentication
+from apps.availability import free_slots, earliest_slots
+from apps.cache import aget_or_compute
+from apps.models import ServiceBySpecialist
+from apps.pagination import CountingPaginator, KeysetPagination
+from apps.serializers import (UserModelSerializer, AvailabilityQuerySerializer, AvailabilitySerializer,
+                              EarliestAvailabilityQuerySerializer, EarliestAvailabilitySerializer)
+from apps.views.adminViews import BusinessViewSet, ServiceViewSet, GetMe
+from apps.views.availability_views import SpecialistAvailabilityView, EarliestAvailabilityView
+from apps.views.statisticviews import (AppointmentStatisticView, TopServicesView, TopClientsView,
+                                       TopBusinessesView, TopSpecialistView, parse_period)
+
+
+class AsyncAPIView(View):
+    """
+    The async part of APIView the read endpoints need: JWT authentication,
+    DRF exceptions turned into their usual responses, and JSON rendering.
+    """
+    http_method_names = ['get', 'head', 'options']
+    authentication_required = False
+    query_budget = None
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            request.user = await AsyncJWTAuthentication().aauthenticate(request)
+            if self.authentication_required and not request.user.is_authenticated:
+                return self.render({'detail': 'Authentication credentials were not provided.'},
+                                   status.HTTP_401_UNAUTHORIZED)
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc, ValidationError) else {'detail': exc.detail}
+            return self.render(detail, exc.status_code)
+
+    @staticmethod
+    def render(data, status_code=status.HTTP_200_OK):
+        return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+class AsyncModelView(AsyncAPIView):
+    """
+    List and detail of a sync ModelViewSet (`source`): same queryset, filter
+    backends, pagination (page numbers or, with ?pagination=cursor or ?cursor=,
+    keyset pages) and serializer.
+    """
+    source = None
+
+    def get_source(self, request, action):
+        view = self.source(request=Request(request), format_kwarg=None, action=action, kwargs=self.kwargs)
+        return view, view.request
+
+    async def get(self, request, pk=None):
+        if pk is not None:
+            return await self.retrieve(request, pk)
+        return await self.list(request)
+
+    async def list(self, request):
+        view, drf_request = self.get_source(request, 'list')
+        queryset = view.filter_queryset(view.get_queryset())
+        pagination = view.paginator
+        page_size = pagination.get_page_size(drf_request)
+        if pagination.use_cursor(drf_request, view):
+            keyset = KeysetPagination(page_size)
+            page = keyset.page_queryset(queryset, drf_request)
+            objects = keyset.paginate_results([instance async for instance in page])
+            return self.render(keyset.get_paginated_response(view.get_serializer(objects, many=True).data).data)
+
+        paginator = CountingPaginator(queryset, page_size)
+        try:
+            page_number = await sync_to_async(paginator.validate_number)(
+                drf_request.query_params.get(pagination.page_query_param, 1))
+        except InvalidPage:
+            return self.render({'detail': 'Invalid page.'}, status.HTTP_404_NOT_FOUND)
+
+        bottom = (page_number - 1) * page_size
+        objects = [instance async for instance in queryset[bottom:bottom + page_size]]
+        if not objects and page_number > 1:
+            return self.render({'detail': 'Invalid page.'}, status.HTTP_404_NOT_FOUND)
+        total_count = paginator.count
+        return self.render({
+            "items": view.get_serializer(objects, many=True).data,
+            "pageNumber": page_number,
+            "pageSize": page_size,
+            "totalCount": total_count,
+            "totalPages": math.ceil(total_count / page_size) if page_size else 0,
+            "total": total_count,
+            "totalCountExact": paginator.count_is_exact,
+        })
+
+    async def retrieve(self, request, pk):
+        view, drf_request = self.get_source(request, 'retrieve')
+        queryset = view.get_queryset()
+        try:
+            instance = await queryset.aget(pk=pk)
+        except (queryset.model.DoesNotExist, ValueError):
+            return self.render({'detail': f'No {queryset.model._meta.object_name} matches the given query.'},
+                               status.HTTP_404_NOT_FOUND)
+        return self.render(view.get_serializer(instance).data)
+
+
+class AsyncBusinessView(AsyncModelView):
+    source = BusinessViewSet
+    query_budget = BusinessViewSet.query_budget
+
+
+class AsyncServiceView(AsyncModelView):
+    source = ServiceViewSet
+    query_budget = ServiceViewSet.query_budget
+
+
+class AsyncGetMe(AsyncAPIView):
+    authentication_required = True
+    query_budget = GetMe.query_budget
+
+    async def get(self, request):
+        return self.render(UserModelSerializer(request.user, context={'request': request}).data)
+
+
+class AsyncSpecialistAvailabilityView(AsyncAPIView):
+    query_budget = SpecialistAvailabilityView.query_budget
+
+    async def get(self, request):
+        query = AvailabilityQuerySerializer(data=request.GET)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        try:
+            # the slot engine is batch ORM and CPU work, run it off the event loop in one go
+            duration, slots = await sync_to_async(free_slots)(params['specialist'], params['sub_service'],
+                                                              params['start'], params['end'])
+        except ServiceBySpecialist.DoesNotExist:
+            return self.render({'error': 'Specialist does not provide this sub service'}, status.HTTP_404_NOT_FOUND)
+
+        return self.render(AvailabilitySerializer({
+            'specialist_id': params['specialist'],
+            'sub_service_id': params['sub_service'],
+            'duration': duration,
+            'slots': [{'start': start, 'end': end} for start, end in slots],
+        }).data)
+
+
+class AsyncEarliestAvailabilityView(AsyncAPIView):
+    query_budget = EarliestAvailabilityView.query_budget
+
+    async def get(self, request):
+        query = EarliestAvailabilityQuerySerializer(data=request.GET)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        first_day = params.get('start') or timezone.localdate()
+        last_day = first_day + timedelta(days=params['days'] - 1)
+        slots = await sync_to_async(earliest_slots)(params['business'], params['sub_service'], first_day,
+                                                    last_day, params['limit'])
+
+        return self.render(EarliestAvailabilitySerializer({
+            'business_id': params['business'],
+            'sub_service_id': params['sub_service'],
+            'slots': [{'specialist_id': specialist_id, 'start': start, 'end': end}
+                      for specialist_id, start, end in slots],
+        }).data)
+
+
+class AsyncAppointmentStatisticView(AsyncAPIView):
+    query_budget = AppointmentStatisticView.query_budget
+
+    async def get(self, request):
+        start_str = request.GET.get('start')
+        end_str = request.GET.get('end')
+
+        if not start_str:
+            return self.render({'error': 'Start date is required'}, status.HTTP_400_BAD_REQUEST)
+        try:
+            start, end = parse_period(start_str, end_str)
+        except ValueError:
+            return self.render({'error': 'Invalid date format. Use YYYY-MM-DD.'}, status.HTTP_400_BAD_REQUEST)
+
+        queryset = AppointmentStatisticView.get_queryset(start, end)
+        return self.render({
+            'start': start_str,
+            'end': end_str,
+            'statistics': [AppointmentStatisticView.to_result(stat) async for stat in queryset],
+        })
+
+
+class AsyncTopView(AsyncAPIView):
+    """A Top* statistics view (`source`), cached in the same entries as the sync view."""
+    source = None
+
+    async def get(self, request):
+        async def compute():
+            return [self.source.to_result(row) async for row in self.source.get_queryset()]
+
+        return self.render(await aget_or_compute(self.source.__name__, request.GET, compute))
+
+
+class AsyncTopServicesView(AsyncTopView):
+    source = TopServicesView
+    query_budget = TopServicesView.query_budget
+
+
+class AsyncTopClientsView(AsyncTopView):
+    source = TopClientsView
+    query_budget = TopClientsView.query_budget
+
+
+class AsyncTopBusinessesView(AsyncTopView):
+    source = TopBusinessesView
+    query_budget = TopBusinessesView.query_budget
+
+
+class AsyncTopSpecialistView(AsyncTopView):
+    source = TopSpecialistView
+    query_budget = TopSpecialistView.query_budget
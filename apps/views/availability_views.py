@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from drf_spectacular.utils import extend_schema
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apps.availability import free_slots, earliest_slots
+from apps.models import ServiceBySpecialist
+from apps.serializers import (AvailabilityQuerySerializer, AvailabilitySerializer,
+                              EarliestAvailabilityQuerySerializer, EarliestAvailabilitySerializer)
+
+
+@extend_schema(tags=['Availability'], parameters=[AvailabilityQuerySerializer],
+               responses={200: AvailabilitySerializer})
+class SpecialistAvailabilityView(APIView):
+    query_budget = 5
+
+    def get(self, request):
+        query = AvailabilityQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        try:
+            duration, slots = free_slots(params['specialist'], params['sub_service'], params['start'], params['end'])
+        except ServiceBySpecialist.DoesNotExist:
+            return Response({'error': 'Specialist does not provide this sub service'},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        serializer = AvailabilitySerializer({
+            'specialist_id': params['specialist'],
+            'sub_service_id': params['sub_service'],
+            'duration': duration,
+            'slots': [{'start': start, 'end': end} for start, end in slots],
+        })
+        return Response(serializer.data)
+
+
+@extend_schema(tags=['Availability'], parameters=[EarliestAvailabilityQuerySerializer],
+               responses={200: EarliestAvailabilitySerializer})
+class EarliestAvailabilityView(APIView):
+    # one candidate query plus three per chunk of 1, 2, 4, ... 32 days
+    query_budget = 19
+
+    def get(self, request):
+        query = EarliestAvailabilityQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        first_day = params.get('start') or timezone.localdate()
+        last_day = first_day + timedelta(days=params['days'] - 1)
+        slots = earliest_slots(params['business'], params['sub_service'], first_day, last_day, params['limit'])
+
+        serializer = EarliestAvailabilitySerializer({
+            'business_id': params['business'],
+            'sub_service_id': params['sub_service'],
+            'slots': [{'specialist_id': specialist_id, 'start': start, 'end': end}
+                      for specialist_id, start, end in slots],
+        })
+        return Response(serializer.data)
@@ -0,0 +1,134 @@
+"""
+Serving MEDIA_ROOT: avatars, their thumbnails and CKEditor uploads.
+
+Files are streamed with FileResponse, which WSGI servers hand to their file
+wrapper (sendfile() under gunicorn), so the bytes never pass through Python.
+Every response carries an ETag and Last-Modified, and conditional requests
+are answered with 304 by Django's get_conditional_response. A single byte
+range (`Range: bytes=a-b`, honouring If-Range) is answered with 206; other
+Range headers get the whole file.
+
+Names made by apps.storage.HashedFileSystemStorage never change content, so
+they are cached for MEDIA_SERVING['IMMUTABLE_MAX_AGE'] and marked immutable;
+the content hash is their ETag, the same on every server. Files stored
+before that are revalidated after MEDIA_SERVING['MAX_AGE'] seconds.
+"""
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from apps.storage import content_hash
+
+DEFAULT_MEDIA_SERVING = {
+    'MAX_AGE': 60 * 60,
+    'IMMUTABLE_MAX_AGE': 365 * 24 * 60 * 60,
+}
+
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_media_serving_settings():
+    return {**DEFAULT_MEDIA_SERVING, **getattr(settings, 'MEDIA_SERVING', {})}
+
+
+class FileRange:
+    """
+    `length` bytes of `file` from its current position. Reads stop at the end
+    of the range; fileno() and tell() let a file wrapper sendfile() it, up to
+    the response's Content-Length.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def requested_range(request, etag, last_modified, size):
+    """(first, last) byte of a satisfiable single range, False for an unsatisfiable one, None for the whole file."""
+    match = BYTE_RANGE.match(request.headers.get('Range', '').replace(' ', ''))
+    if not match or not any(match.groups()):
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range not in (etag, http_date(last_modified)):
+        return None
+    first, last = match.groups()
+    if not first:
+        first, last = max(size - int(last), 0), size - 1
+    elif last and int(last) < int(first):
+        return None
+    else:
+        first, last = int(first), min(int(last), size - 1) if last else size - 1
+    if first > last or first >= size:
+        return False
+    return first, last
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        status = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404
+    if not stat.S_ISREG(status.st_mode):
+        raise Http404
+
+    config = get_media_serving_settings()
+    digest = content_hash(path)
+    last_modified = int(status.st_mtime)
+    etag = f'"{digest}"' if digest else f'"{status.st_size:x}-{status.st_mtime_ns:x}"'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': (f"public, max-age={config['IMMUTABLE_MAX_AGE']}, immutable" if digest
+                          else f"public, max-age={config['MAX_AGE']}"),
+        # uploads are data, never pages or scripts running on the API's origin
+        'Content-Security-Policy': "default-src 'none'; sandbox",
+    }
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        byte_range = requested_range(request, etag, last_modified, status.st_size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{status.st_size}"
+        elif byte_range is None:
+            response = FileResponse(open(full_path, 'rb'))
+        else:
+            first, last = byte_range
+            file = open(full_path, 'rb')
+            file.seek(first)
+            response = FileResponse(FileRange(file, last - first + 1), status=206)
+            response['Content-Length'] = last - first + 1
+            response['Content-Range'] = f"bytes {first}-{last}/{status.st_size}"
+        # FileResponse's 4 KiB blocks are for the rare server without a file wrapper
+        response.block_size = 64 * 1024
+    for header, value in headers.items():
+        response[header] = value
+    return response
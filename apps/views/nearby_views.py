@@ -0,0 +1,22 @@
+from drf_spectacular.utils import extend_schema
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apps.nearby import nearby_businesses
+from apps.serializers import NearbyQuerySerializer, NearbyBusinessSerializer
+
+
+@extend_schema(tags=['Business'], parameters=[NearbyQuerySerializer],
+               responses={200: NearbyBusinessSerializer(many=True)})
+class NearbyBusinessView(APIView):
+    # the authenticated user and the search
+    query_budget = 2
+
+    def get(self, request):
+        query = NearbyQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        businesses = nearby_businesses(params['latitude'], params['longitude'], params['radius'],
+                                       params.get('type'), params['limit'])
+        return Response(NearbyBusinessSerializer(businesses, many=True).data)
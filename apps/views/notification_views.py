@@ -0,0 +1,48 @@
+from django_filters.rest_framework import DjangoFilterBackend
+from drf_spectacular.utils import extend_schema
+from rest_framework.generics import ListAPIView
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apps import inbox
+from apps.models import Notification
+from apps.serializers import NotificationModelSerializer, NotificationReadSerializer, UnreadCountSerializer
+
+
+@extend_schema(tags=['Notifications'])
+class NotificationListView(ListAPIView):
+    queryset = Notification.objects.order_by('-created_at', '-id')
+    serializer_class = NotificationModelSerializer
+    permission_classes = (IsAuthenticated,)
+    # newest first, on notification_inbox_idx; users with long histories never pay for OFFSET or COUNT
+    pagination_mode = 'cursor'
+    filter_backends = (DjangoFilterBackend,)
+    filterset_fields = ('is_read', 'type')
+    query_budget = 2
+
+    def get_queryset(self):
+        return super().get_queryset().filter(user_id=self.request.user)
+
+
+@extend_schema(tags=['Notifications'], request=NotificationReadSerializer,
+               responses={200: UnreadCountSerializer})
+class NotificationReadView(APIView):
+    permission_classes = (IsAuthenticated,)
+    # the user, the update and the counter's in a transaction, and the counter's new value
+    query_budget = 6
+
+    def post(self, request):
+        serializer = NotificationReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        inbox.mark_read(request.user.pk, serializer.validated_data.get('ids'))
+        return Response({'unread': inbox.unread_count(request.user.pk)})
+
+
+@extend_schema(tags=['Notifications'], responses={200: UnreadCountSerializer})
+class UnreadCountView(APIView):
+    permission_classes = (IsAuthenticated,)
+    query_budget = 2
+
+    def get(self, request):
+        return Response({'unread': inbox.unread_count(request.user.pk)})
@@ -1,20 +1,21 @@
-from datetime import timedelta
-from django.utils import timezone
-
 from drf_spectacular.utils import extend_schema
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from apps.models import PhoneOTP
 from apps.serializers import PhoneNumberUpdateSerializer, OtpTokenSerializer
-from utils.otp_service import generate_otp
+from apps.throttling import IPRateThrottle, UserRateThrottle, PhoneRateThrottle
+from utils.otp_service import get_otp_store, OTPError
 
 
 @extend_schema(tags=['Users'], request= PhoneNumberUpdateSerializer)
 class RequestPhoneChangeView(APIView):
     permission_classes = (IsAuthenticated,)
+    throttle_classes = (IPRateThrottle, UserRateThrottle, PhoneRateThrottle)
+    throttle_scope = 'change_phone'
+    throttle_phone_field = 'new_phone_number'
+    query_budget = 2
 
     def post(self, request):
         serializer = PhoneNumberUpdateSerializer(data=request.data)
@@ -31,28 +32,13 @@ class RequestPhoneChangeView(APIView):
         if not re.match(pattern, new_phone_number):
             return Response({"error": "Invalid Uzbekistan number"}, status=400)
 
-        last_code = PhoneOTP.objects.filter(new_phone_number=new_phone_number).order_by("-created_at").first()
-        if last_code and not last_code.can_send_new():
-            remaining_seconds = int(
-                (last_code.created_at + timedelta(minutes=2) - timezone.now()).total_seconds()
-            )
+        otp_code, remaining_seconds = get_otp_store().issue(request.user.pk, new_phone_number)
+        if otp_code is None:
             return Response({
                 'error': "Please wait before sending a new code",
                 'remain_seconds': remaining_seconds
             })
-
-
-        # generate OTP
-        otp_code = generate_otp()
-
-        PhoneOTP.objects.filter(new_phone_number=new_phone_number).delete()
-
-        otp_code = PhoneOTP.objects.create(
-            user=request.user,
-            new_phone_number=new_phone_number,
-            code=otp_code
-        )
-        serializer = OtpTokenSerializer(instance=otp_code)
+        serializer = OtpTokenSerializer(instance={'code': otp_code})
 
 # return OTP for testing (no SMS service)
         return Response({
@@ -63,6 +49,9 @@ class RequestPhoneChangeView(APIView):
 @extend_schema(tags=["Users"], request= OtpTokenSerializer)
 class VerifyPhoneOTPView(APIView):
     permission_classes = (IsAuthenticated,)
+    throttle_classes = (IPRateThrottle, UserRateThrottle)
+    throttle_scope = 'verify_phone'
+    query_budget = 2
 
     def post(self, request):
         code = request.data.get("code")
@@ -71,26 +60,15 @@ class VerifyPhoneOTPView(APIView):
             return Response({"error": "code is required"}, status=400)
 
         try:
-            phone_otp = PhoneOTP.objects.get(user=request.user)
-        except PhoneOTP.DoesNotExist:
-            return Response({"error": "No code request found"}, status=404)
-
-        # expired?
-        if phone_otp.is_expired():
-            return Response({"error": "code expired. Request a new one."}, status=400)
-
-        # wrong?
-        if phone_otp.code != code:
-            return Response({"error": "Invalid code"}, status=400)
+            new_phone_number = get_otp_store().consume(request.user.pk, code)
+        except OTPError as e:
+            return Response({"error": e.message}, status=e.status)
 
         # correct OTP → update phone
         user = request.user
-        user.phone_number = phone_otp.new_phone_number
+        user.phone_number = new_phone_number
         user.save()
 
-        # delete OTP entry
-        phone_otp.delete()
-
         return Response({
             "message": "Phone number updated successfully",
             "new_phone_number": user.phone_number,
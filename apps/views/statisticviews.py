@@ -1,18 +1,31 @@
 from datetime import datetime, timedelta
 
-from django.db.models.aggregates import Count
+from django.db.models.aggregates import Sum
 from drf_spectacular.utils import extend_schema
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from apps.models import Appointment
+from apps.cache import versioned_cache
+from apps.models import Appointment, DailyServiceStat, DailyClientStat, DailySpecialistStat, DailyBusinessStat
 from apps.serializers import TopServicesSerializer, AppointmentStatsSerializer, TopClientSerializer, \
     TopSpecialistSerializer
 
 
+def parse_period(start_str, end_str):
+    """The first and last moment of the YYYY-MM-DD period; raises ValueError on bad dates."""
+    start = datetime.strptime(start_str, "%Y-%m-%d")
+    if end_str:
+        end = datetime.strptime(end_str, "%Y-%m-%d") + timedelta(days=1) - timedelta(microseconds=1)
+    else:
+        end = start + timedelta(days=1) - timedelta(microseconds=1)
+    return start, end
+
+
 @extend_schema(tags=['Statistics'], responses=AppointmentStatsSerializer)
 class AppointmentStatisticView(APIView):
+    query_budget = 2
+
     def get(self, request):
         start_str = request.query_params.get('start')
         end_str = request.query_params.get('end')
@@ -21,31 +34,11 @@ class AppointmentStatisticView(APIView):
             return Response({'error': 'Start date is required'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            start = datetime.strptime(start_str, "%Y-%m-%d")
-            if end_str:
-                end = datetime.strptime(end_str, "%Y-%m-%d") + timedelta(days=1) - timedelta(microseconds=1)
-            else:
-                end = start + timedelta(days=1) - timedelta(microseconds=1)
+            start, end = parse_period(start_str, end_str)
         except ValueError:
             return Response({'error': 'Invalid date format. Use YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        appointments = Appointment.objects.filter(created_at__gte=start, created_at__lte=end)
-
-        statistics = (
-            appointments
-            .values('service_id', 'service_id__name')
-            .annotate(total=Count('id'))
-            .order_by('-total')
-        )
-
-        results = [
-            {
-                'service_id': stat['service_id'],
-                'service_name': stat['service_id__name'],
-                'total_appointments': stat['total']
-            }
-            for stat in statistics
-        ]
+        results = [self.to_result(stat) for stat in self.get_queryset(start, end)]
 
         return (Response(
             {
@@ -55,19 +48,47 @@ class AppointmentStatisticView(APIView):
             },
             status=status.HTTP_200_OK
         ))
+
+    @staticmethod
+    def get_queryset(start, end):
+        return (
+            DailyServiceStat.objects
+            .filter(day__gte=start.date(), day__lte=end.date(), total__gt=0)
+            .values('service_id', 'service_id__name')
+            .annotate(total=Sum('total'))
+            .order_by('-total')
+        )
+
+    @staticmethod
+    def to_result(stat):
+        return {
+            'service_id': stat['service_id'],
+            'service_name': stat['service_id__name'],
+            'total_appointments': stat['total']
+        }
+
 @extend_schema(tags=['Statistics'],
                responses={200: TopServicesSerializer(many=True)})
 class TopServicesView(APIView):
+    query_budget = 2
 
+    @versioned_cache
     def get(self, request):
-        top_services = (
-            Appointment.objects
+        return Response([self.to_result(service) for service in self.get_queryset()])
+
+    @staticmethod
+    def get_queryset():
+        return (
+            DailyServiceStat.objects
+            .filter(total__gt=0)
             .values('service_id', 'service_id__name')
-            .annotate(total=Count('id'))
+            .annotate(total=Sum('total'))
             .order_by('-total')
         )
 
-        return Response(top_services)
+    @staticmethod
+    def to_result(service):
+        return service
 
 
 @extend_schema(
@@ -75,71 +96,81 @@ class TopServicesView(APIView):
     responses={200: TopClientSerializer(many=True)}
 )
 class TopClientsView(APIView):
+    query_budget = 2
 
+    @versioned_cache
     def get(self, request):
-        top_clients = (
-            Appointment.objects
+        return Response([self.to_result(client) for client in self.get_queryset()])
+
+    @staticmethod
+    def get_queryset():
+        return (
+            DailyClientStat.objects
+            .filter(total__gt=0)
             .values('client_id', 'client_id__first_name' , 'client_id__last_name')
-            .annotate(total_appointments=Count('id'))
+            .annotate(total_appointments=Sum('total'))
             .order_by('-total_appointments')[:10]
         )
 
-        results = [
-            {
-                'client_id': client['client_id'],
-                "client_name": f"{client['client_id__first_name']} {client['client_id__last_name']}".strip(),
-                'total_appointments': client['total_appointments']
-            }
-            for client in top_clients
-        ]
-
-        return Response(results)
+    @staticmethod
+    def to_result(client):
+        return {
+            'client_id': client['client_id'],
+            "client_name": f"{client['client_id__first_name']} {client['client_id__last_name']}".strip(),
+            'total_appointments': client['total_appointments']
+        }
 @extend_schema(
     tags=["Statistics"],
     responses={200: TopSpecialistSerializer(many=True)}
 )
 class TopSpecialistView(APIView):
+    query_budget = 2
 
+    @versioned_cache
     def get(self, request):
-        top_specialists = (
-            Appointment.objects
-            .filter(status=Appointment.Status.APPROVED)
+        return Response([self.to_result(specialist) for specialist in self.get_queryset()])
+
+    @staticmethod
+    def get_queryset():
+        return (
+            DailySpecialistStat.objects
+            .filter(status=Appointment.Status.APPROVED, total__gt=0)
             .values('specialist_id', 'specialist_id__first_name' , 'specialist_id__last_name')
-            .annotate(total_appointments=Count('id'))
+            .annotate(total_appointments=Sum('total'))
             .order_by('-total_appointments')[:10]
         )
 
-        results = [
-            {
-                'specialist_id': specialist['specialist_id'],
-                "specialist_name": f"{specialist['specialist_id__first_name']} {specialist['specialist_id__last_name']}"
-                .strip(),
-                'total_appointments': specialist['total_appointments']
-            }
-            for specialist in top_specialists
-        ]
-
-        return Response(results)
+    @staticmethod
+    def to_result(specialist):
+        return {
+            'specialist_id': specialist['specialist_id'],
+            "specialist_name": f"{specialist['specialist_id__first_name']} {specialist['specialist_id__last_name']}"
+            .strip(),
+            'total_appointments': specialist['total_appointments']
+        }
 
 @extend_schema(tags=["Statistics"],)
 class TopBusinessesView(APIView):
+    query_budget = 2
 
+    @versioned_cache
     def get(self, request):
-        top_businesses = (
-            Appointment.objects
-            .filter(status__in=[Appointment.Status.APPROVED, Appointment.Status.MOVED])
-            .values('service_id__business_id', 'service_id__business_id__name')
-            .annotate(total_appointments=Count('id'))
+        return Response([self.to_result(business) for business in self.get_queryset()])
+
+    @staticmethod
+    def get_queryset():
+        return (
+            DailyBusinessStat.objects
+            .filter(status__in=[Appointment.Status.APPROVED, Appointment.Status.MOVED], total__gt=0)
+            .values('business_id', 'business_id__name')
+            .annotate(total_appointments=Sum('total'))
             .order_by('-total_appointments')[:10]
         )
 
-        results = [
-            {
-                'business_id': business['service_id__business_id'],
-                "business_name": business['service_id__business_id__name'].strip(),
-                'total_appointments': business['total_appointments']
-            }
-            for business in top_businesses
-        ]
-
-        return Response(results)
+    @staticmethod
+    def to_result(business):
+        return {
+            'business_id': business['business_id'],
+            "business_name": business['business_id__name'].strip(),
+            'total_appointments': business['total_appointments']
+        }
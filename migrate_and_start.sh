@@ -4,5 +4,17 @@ set -o errexit
 # Run migrations
 uv run python manage.py migrate --noinput
 
-# Start Django app
-uv run gunicorn root.wsgi:application
+# ROLE=worker runs the background job workers (apps/jobs.py) instead of the web server,
+# ROLE=scheduler the appointment reminder scheduler (apps/reminders.py; run one)
+if [ "${ROLE:-web}" = "worker" ]; then
+  exec uv run python manage.py run_jobs --processes "${JOB_PROCESSES:-2}"
+elif [ "${ROLE:-web}" = "scheduler" ]; then
+  exec uv run python manage.py run_reminders
+fi
+
+# Start Django app (SERVER=asgi serves it with uvicorn workers, which the /api/v1/async/ views need)
+if [ "${SERVER:-wsgi}" = "asgi" ]; then
+  uv run gunicorn root.asgi:application --worker-class uvicorn_worker.UvicornWorker
+else
+  uv run gunicorn root.wsgi:application
+fi
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 from os.path import join
 from pathlib import Path
@@ -52,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.middleware.QueryBudgetMiddleware',
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -87,14 +89,32 @@ WSGI_APPLICATION = 'root.wsgi.application'
 #         'NAME': BASE_DIR / 'db.sqlite3',
 #     }
 # }
+DATABASE_URL = os.getenv('DATABASE_URL', '')
 DATABASES = {
     'default': dj_database_url.config(
-        default=os.getenv('DATABASE_URL'),
+        default=DATABASE_URL,
         conn_max_age=600,
-        ssl_require=True
+        ssl_require=not DATABASE_URL.startswith('sqlite')
     )
 }
 
+# Cache shared by the workers on this host; point CACHE_BACKEND/CACHE_LOCATION at
+# another backend to share it across hosts. Rate limits (apps/throttling.py) count
+# exactly only on django.core.cache.backends.redis.RedisCache or a Memcached backend.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', join(tempfile.gettempdir(), 'onlinebooking-cache')),
+    }
+}
+
+# Top-N statistics result cache, see apps/cache.py
+STATISTICS_CACHE = {
+    'TIMEOUT': 60,
+    'STALE_TIMEOUT': 600,
+    'LOCK_TIMEOUT': 30,
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -133,7 +153,19 @@ STATIC_ROOT = join(BASE_DIR, 'static')
 MEDIA_URL = 'media/'
 MEDIA_ROOT = join(BASE_DIR, 'media')
 
-MIDDLEWARE.insert(1, "whitenoise.middleware.WhiteNoiseMiddleware")
+STORAGES = {
+    # uploads get content-hashed names, which apps/views/media_views.py caches forever, see apps/storage.py
+    'default': {'BACKEND': 'apps.storage.HashedFileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# caching of MEDIA_ROOT files, see apps/views/media_views.py
+MEDIA_SERVING = {
+    'MAX_AGE': 60 * 60,  # files stored before names were hashed
+    'IMMUTABLE_MAX_AGE': 365 * 24 * 60 * 60,
+}
+
+MIDDLEWARE.insert(1, "apps.middleware.WhiteNoiseMiddleware")
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -147,13 +179,87 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend',
                                 'rest_framework.filters.SearchFilter',
                                 'rest_framework.filters.OrderingFilter', ],
     'DEFAULT_PAGINATION_CLASS': 'apps.pagination.GlobalCustomPagination',
-    'PAGE_SIZE': 10
+    'PAGE_SIZE': 10,
+    # "<throttle_scope>.<ip|user|phone>", see apps/throttling.py
+    'DEFAULT_THROTTLE_RATES': {
+        'token.ip': '20/min',
+        'token.phone': '10/min',
+        'change_phone.ip': '20/hour',
+        'change_phone.user': '5/hour',
+        'change_phone.phone': '5/hour',
+        'verify_phone.ip': '30/hour',
+        'verify_phone.user': '10/hour',
+    },
+}
+
+
+# totalCount of paginated lists is exact up to EXACT_THRESHOLD rows, see apps/pagination.py
+PAGINATION_COUNT = {
+    'EXACT_THRESHOLD': 10000,
+    'CACHE_TIMEOUT': 300,
+}
+
+# how long a booking waits for a concurrent one of the same specialist before it is a 409, see apps/booking.py
+BOOKING = {
+    'LOCK_TIMEOUT_MS': 200,
+}
+
+# authenticated users are remembered per process, see apps/authentication.py
+AUTH_USER_CACHE = {
+    'MAX_SIZE': 10000,
+    'TIMEOUT': 60,
+    'STATELESS': False,
+}
+
+# background jobs run by `manage.py run_jobs`, see apps/jobs.py
+JOBS = {
+    'BATCH_SIZE': 100,
+    'POLL_INTERVAL': 1.0,
+    'LEASE': 300,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY': 30,
+}
+
+# reminders before approved appointments, sent by `manage.py run_reminders`, see apps/reminders.py
+REMINDERS = {
+    'OFFSETS': [24 * 60, 60],  # minutes before the start
+    'POLL_INTERVAL': 30,
+    'CHANGE_OVERLAP': 5,
+    'BATCH_SIZE': 500,
+}
+
+# avatar thumbnails, made by the `manage.py run_jobs` workers, see apps/avatars.py
+AVATARS = {
+    'SIZES': {'small': 96, 'medium': 320},  # square, in pixels
+    'FORMAT': 'WEBP',  # or 'JPEG'
+    'QUALITY': 80,
+    'MAX_PIXELS': 40_000_000,  # larger uploads keep no thumbnails
+}
+
+# unread counters and retention of notifications, see apps/inbox.py
+INBOX = {
+    'RETENTION_DAYS': 90,  # read notifications older than this go with `manage.py compact_notifications`
+    'BATCH_SIZE': 1000,
+}
+
+# phone change codes, see utils/otp_service.py
+OTP = {
+    'STORE': 'utils.otp_service.CacheOTPStore',
+    'CACHE': 'default',
+    'RESEND_INTERVAL': 120,
+    'TIMEOUT': 300,
+}
+
+# blacklisted refresh tokens are checked against an in-process snapshot, see apps/tokens.py
+TOKEN_BLACKLIST = {
+    'SYNC_INTERVAL': 5,
+    'RELOAD_INTERVAL': 600,
 }
 
 
@@ -260,6 +366,13 @@ CKEDITOR_5_CONFIGS = {
 }
 
 
+# SQL queries per request, see apps/middleware.py
+QUERY_BUDGET = {
+    'HEADERS': DEBUG,
+    'ON_EXCEED': 'log',  # 'log', 'raise' or None
+    'DEFAULT': None,
+}
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=20),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=30),
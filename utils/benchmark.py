@@ -0,0 +1,89 @@
+import json
+import math
+import platform
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an unsorted list of numbers."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples):
+    """Latency summary (in milliseconds) of a list of durations in seconds."""
+    millis = [sample * 1000 for sample in samples]
+    return {
+        'runs': len(millis),
+        'mean_ms': round(sum(millis) / len(millis), 3) if millis else None,
+        'p50_ms': _round(percentile(millis, 50)),
+        'p95_ms': _round(percentile(millis, 95)),
+        'p99_ms': _round(percentile(millis, 99)),
+        'max_ms': _round(max(millis, default=None)),
+    }
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+@contextmanager
+def stopwatch():
+    """Yields a dict whose 'seconds' key is filled in when the block exits."""
+    result = {}
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result['seconds'] = time.perf_counter() - started
+
+
+@contextmanager
+def peak_memory():
+    """Yields a dict whose 'peak_kb' key holds the peak traced allocation of the block."""
+    result = {}
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        yield result
+    finally:
+        result['peak_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        if not already_tracing:
+            tracemalloc.stop()
+
+
+def environment():
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+def write_report(path, report):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True, default=str)
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(previous, current, metric='p95_ms'):
+    """Yields (name, before, after, change in %) for every result present in both reports."""
+    before_results = previous.get('results', {})
+    for name, after in current.get('results', {}).items():
+        before = before_results.get(name)
+        if not before or before.get(metric) in (None, 0) or after.get(metric) is None:
+            continue
+        change = (after[metric] - before[metric]) / before[metric] * 100
+        yield name, before[metric], after[metric], round(change, 1)
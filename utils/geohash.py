@@ -0,0 +1,106 @@
+"""
+Geohash encoding and the helpers a radius search needs.
+
+A geohash interleaves longitude and latitude bits (longitude first) and
+writes them five at a time in base 32, so every prefix is a grid cell that
+contains the cells of its longer hashes. A btree index on the hash turns
+"points in cell X" into the range scan hash >= X AND hash < X + '{'.
+"""
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# sorts after every BASE32 character, so [prefix, prefix + PREFIX_END) holds all hashes starting with prefix
+PREFIX_END = '{'
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode(latitude, longitude, precision=9):
+    latitude, longitude = float(latitude), float(longitude)
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        if coordinate >= middle:
+            value = value << 1 | 1
+            interval[0] = middle
+        else:
+            value <<= 1
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(latitude, longitude) extent in degrees of a cell of `precision` characters."""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 - lon_bits
+    return 180 / 2 ** lat_bits, 360 / 2 ** lon_bits
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(min_lat, max_lat, min_lon, max_lon) around the circle; longitudes may pass ±180."""
+    latitude, longitude = float(latitude), float(longitude)
+    lat_delta = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(latitude))
+    lon_delta = 180.0 if cos_lat < 1e-9 else min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+    return latitude - lat_delta, latitude + lat_delta, longitude - lon_delta, longitude + lon_delta
+
+
+def covering_cells(latitude, longitude, radius_km, max_precision=9):
+    """
+    The cell containing the point and its neighbours, at the finest precision
+    (up to `max_precision`) whose cells are at least as large as the radius,
+    so together they cover the whole circle.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+    lat_delta, lon_delta = max_lat - float(latitude), max_lon - float(longitude)
+    precision = 1
+    while precision < max_precision:
+        lat_size, lon_size = cell_size(precision + 1)
+        if lat_size < lat_delta or lon_size < lon_delta:
+            break
+        precision += 1
+    lat_size, lon_size = cell_size(precision)
+    if lat_size < lat_delta or lon_size < lon_delta:
+        return ['']
+
+    cells = set()
+    for lat_step in (-1, 0, 1):
+        cell_lat = min(max(float(latitude) + lat_step * lat_size, -90.0), 90.0)
+        for lon_step in (-1, 0, 1):
+            cell_lon = (float(longitude) + lon_step * lon_size + 180.0) % 360.0 - 180.0
+            cells.add(encode(cell_lat, cell_lon, precision))
+    return sorted(cells)
+
+
+def _next_cell(cell):
+    """The cell right after `cell` in sort order, None after the last one."""
+    for position in range(len(cell) - 1, -1, -1):
+        index = BASE32.index(cell[position])
+        if index + 1 < len(BASE32):
+            return cell[:position] + BASE32[index + 1] + BASE32[0] * (len(cell) - position - 1)
+    return None
+
+
+def prefix_ranges(cells):
+    """[low, high) hash ranges holding the points of `cells`, adjacent cells merged into one range."""
+    ranges = []
+    for cell in sorted(cells):
+        if ranges and _next_cell(ranges[-1][1]) == cell:
+            ranges[-1][1] = cell
+        else:
+            ranges.append([cell, cell])
+    return [(low, last + PREFIX_END) for low, last in ranges]
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (float(lat1), float(lon1), float(lat2), float(lon2)))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
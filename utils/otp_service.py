@@ -1,4 +1,138 @@
+"""
+One-time codes confirming a phone number change.
+
+A user has at most one pending code, for the number they asked to switch to.
+A number can get a new code once every OTP['RESEND_INTERVAL'] seconds and a
+code is valid for OTP['TIMEOUT'] seconds. Using a code deletes it, and of two
+concurrent attempts with the right code only one succeeds.
+
+OTP['STORE'] picks the storage:
+
+- CacheOTPStore (default) keeps codes in the OTP['CACHE'] cache with the
+  timeouts as TTLs, so requesting and verifying a code make no queries. The
+  resend interval is taken with cache.add() and a code is used up by the
+  cache.delete() that reports having removed it; both are atomic on the
+  Redis and Memcached backends.
+- DatabaseOTPStore keeps them in PhoneOTP rows, for deployments without a
+  shared cache.
+"""
 import random
+import time
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+DEFAULT_OTP = {
+    'STORE': 'utils.otp_service.CacheOTPStore',
+    'CACHE': 'default',
+    'RESEND_INTERVAL': 120,
+    'TIMEOUT': 300,
+}
+
+
+def get_otp_settings():
+    return {**DEFAULT_OTP, **getattr(settings, 'OTP', {})}
+
 
 def generate_otp():
     return str(random.randint(1000, 9999))
+
+
+class OTPError(Exception):
+    """The code can't be used; `message` and `status` are what the API answers."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class OTPStore:
+    def issue(self, user_id, new_phone_number):
+        """
+        Stores a new code for `user_id`, replacing their pending one, and
+        returns (code, 0). While `new_phone_number` is within its resend
+        interval nothing is stored and (None, seconds left) is returned.
+        """
+        raise NotImplementedError
+
+    def consume(self, user_id, code):
+        """The new phone number of the user's pending code when it is `code`, which is used up; else OTPError."""
+        raise NotImplementedError
+
+
+class CacheOTPStore(OTPStore):
+    @property
+    def cache(self):
+        return caches[get_otp_settings()['CACHE']]
+
+    def issue(self, user_id, new_phone_number):
+        config = get_otp_settings()
+        resend_key = f"otp:resend:{new_phone_number}"
+        resend_at = time.time() + config['RESEND_INTERVAL']
+        if not self.cache.add(resend_key, resend_at, timeout=config['RESEND_INTERVAL']):
+            remaining = (self.cache.get(resend_key) or resend_at) - time.time()
+            return None, max(int(remaining), 1)
+        code = generate_otp()
+        self.cache.set(f"otp:code:{user_id}", (new_phone_number, code), timeout=config['TIMEOUT'])
+        return code, 0
+
+    def consume(self, user_id, code):
+        key = f"otp:code:{user_id}"
+        pending = self.cache.get(key)
+        if pending is None:
+            raise OTPError("No code request found", status=404)
+        new_phone_number, expected = pending
+        if expected != code:
+            raise OTPError("Invalid code")
+        # only the request whose delete removed the entry gets to use it
+        if not self.cache.delete(key):
+            raise OTPError("No code request found", status=404)
+        return new_phone_number
+
+
+class DatabaseOTPStore(OTPStore):
+    def issue(self, user_id, new_phone_number):
+        from apps.models import PhoneOTP
+
+        config = get_otp_settings()
+        now = timezone.now()
+        last_code = PhoneOTP.objects.filter(new_phone_number=new_phone_number).order_by('-created_at').first()
+        if last_code:
+            remaining = (last_code.created_at + timedelta(seconds=config['RESEND_INTERVAL']) - now).total_seconds()
+            if remaining > 0:
+                return None, max(int(remaining), 1)
+        # the user's and the number's previous codes go, and expired ones with them
+        PhoneOTP.objects.filter(Q(user_id=user_id) | Q(new_phone_number=new_phone_number)
+                                | Q(created_at__lt=now - timedelta(seconds=config['TIMEOUT']))).delete()
+        code = generate_otp()
+        PhoneOTP.objects.create(user_id=user_id, new_phone_number=new_phone_number, code=code)
+        return code, 0
+
+    def consume(self, user_id, code):
+        from apps.models import PhoneOTP
+
+        phone_otp = PhoneOTP.objects.filter(user_id=user_id).order_by('-created_at').first()
+        if phone_otp is None:
+            raise OTPError("No code request found", status=404)
+        if phone_otp.created_at + timedelta(seconds=get_otp_settings()['TIMEOUT']) < timezone.now():
+            raise OTPError("code expired. Request a new one.")
+        if phone_otp.code != code:
+            raise OTPError("Invalid code")
+        if not PhoneOTP.objects.filter(pk=phone_otp.pk, code=code).delete()[0]:
+            raise OTPError("No code request found", status=404)
+        return phone_otp.new_phone_number
+
+
+@lru_cache
+def _store(path):
+    return import_string(path)()
+
+
+def get_otp_store():
+    return _store(get_otp_settings()['STORE'])